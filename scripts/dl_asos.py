@@ -1,76 +1,169 @@
 import time
-import subprocess
+import random
+import argparse
+import urllib.error
+import urllib.request
 
 from tqdm import tqdm
 from glob import glob
 from pathlib import Path
 from datetime import datetime, timedelta
+from typing import Dict, List, Tuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from urllib.parse import urlparse, parse_qs, urlencode, urlunparse
 
 EVENTS_DIR = "data/events"
 BASE_CMD = "https://mesonet.agron.iastate.edu/cgi-bin/request/asos.py?network=NV_ASOS&station=05U&station=10U&station=9BB&station=AWH&station=B23&station=BAM&station=BJN&station=BVU&station=CXP&station=DRA&station=EKO&station=ELY&station=HND&station=HTH&station=INS&station=LAS&station=LOL&station=LSV&station=MEV&station=NFL&station=P38&station=P68&station=RNO&station=RTS&station=TMT&station=TPH&station=U31&station=VGT&station=WMC&data=all&year1=2023&month1=1&day1=1&year2=2023&month2=1&day2=2&tz=Etc%2FUTC&format=onlycomma&latlon=yes&elev=yes&missing=M&trace=T&direct=no&report_type=3&report_type=4"
 
-CURL_BIN   = "curl"
-CURL_FLAGS = ["-fLsS"]
-MAX_RETRIES = 3
-RETRY_SLEEP = 3
+MAX_CONCURRENCY = 4
+MAX_SPAN_DAYS   = 31
+MAX_RETRIES     = 5
+BACKOFF_BASE    = 2.0
+BACKOFF_MAX     = 60.0
+TIMEOUT         = 300
 
+# retry on throttling/server errors only; other HTTP errors are permanent
+RETRY_STATUS = {429, 500, 502, 503, 504}
 
-def build_url_for_day(base_url: str, day: datetime) -> str:
-    """Replace the date fields in BASE_CMD with a single day's window."""
-    next_day = day + timedelta(days=1)
+
+def build_url_for_range(base_url: str, start_day: datetime, end_day: datetime) -> str:
+    """Replace the date fields in BASE_CMD with the window [start_day, end_day)."""
 
     parsed = urlparse(base_url)
     qs = parse_qs(parsed.query)
 
     # Update date params (parse_qs gives lists)
-    qs["year1"]  = [str(day.year)]
-    qs["month1"] = [str(day.month)]
-    qs["day1"]   = [str(day.day)]
+    qs["year1"]  = [str(start_day.year)]
+    qs["month1"] = [str(start_day.month)]
+    qs["day1"]   = [str(start_day.day)]
 
-    qs["year2"]  = [str(next_day.year)]
-    qs["month2"] = [str(next_day.month)]
-    qs["day2"]   = [str(next_day.day)]
+    qs["year2"]  = [str(end_day.year)]
+    qs["month2"] = [str(end_day.month)]
+    qs["day2"]   = [str(end_day.day)]
 
     new_query = urlencode(qs, doseq=True)
     return urlunparse(parsed._replace(query=new_query))
 
 
-def fetch_day(day: datetime, out_fp: Path):
-    """Download one day's CSV using curl, with retries."""
-    
-    url = build_url_for_day(BASE_CMD, day)
+def build_url_for_day(base_url: str, day: datetime) -> str:
+    """Replace the date fields in BASE_CMD with a single day's window."""
+    return build_url_for_range(base_url, day, day + timedelta(days=1))
+
+
+def with_endpoint(base_url: str, endpoint: str) -> str:
+    """Point BASE_CMD's query at another endpoint (e.g., a local stand-in: http://localhost:8000/asos.py)."""
+    parsed   = urlparse(base_url)
+    endpoint = urlparse(endpoint)
+    return urlunparse(parsed._replace(scheme=endpoint.scheme, netloc=endpoint.netloc, path=endpoint.path))
+
+
+def coalesce_days(days: List[datetime], max_span_days: int = MAX_SPAN_DAYS) -> List[Tuple[datetime, datetime]]:
+    """
+    Group sorted, unique days into runs of consecutive days (at most ``max_span_days`` long).
+
+    Returns
+    ---
+    - ``[(start_day, end_day), ...]``, ``end_day`` exclusive
+    """
+
+    ranges = []
+    for day in sorted(set(days)):
+        if ranges and day == ranges[-1][1] and (day - ranges[-1][0]).days < max_span_days:
+            ranges[-1] = (ranges[-1][0], day + timedelta(days=1))
+        else:
+            ranges.append((day, day + timedelta(days=1)))
+    return ranges
+
+
+def fetch_url(url: str, max_retries: int = MAX_RETRIES, timeout: float = TIMEOUT) -> bytes:
+    """GET ``url`` with exponential backoff (plus jitter) on network errors, throttling, and 5xx responses."""
+
+    for attempt in range(1, max_retries + 1):
+        try:
+            with urllib.request.urlopen(url, timeout=timeout) as resp:
+                body = resp.read()
+            if not body:
+                raise RuntimeError("Empty response.")
+            return body
+        except urllib.error.HTTPError as e:
+            if e.code not in RETRY_STATUS or attempt == max_retries:
+                raise
+            err = e
+        except (urllib.error.URLError, TimeoutError, ConnectionError, RuntimeError) as e:
+            if attempt == max_retries:
+                raise
+            err = e
+
+        sleep = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (attempt - 1)) * random.uniform(0.5, 1.0)
+        print(f"[ERR]  attempt {attempt}/{max_retries}: {err}; retrying in {sleep:.1f}s")
+        time.sleep(sleep)
+
+
+def split_by_day(body: bytes) -> Tuple[Dict[str, bytes], str]:
+    """
+    Split one range response into per-day CSVs (keyed ``YYYY-MM-DD`` by the ``valid`` column), each with the header.
+
+    Returns
+    ---
+    - (``{day: csv bytes}``, header)
+    """
+
+    lines  = body.decode("utf-8").splitlines()
+    header = lines[0]
+    col    = header.split(",").index("valid")
+
+    days = {}
+    for line in lines[1:]:
+        if not line: continue
+        day = line.split(",", col + 1)[col][:10]
+        days.setdefault(day, []).append(line)
+
+    return {day: "\n".join([header, *rows, ""]).encode("utf-8") for day, rows in days.items()}, header
+
+
+def fetch_range(base_url: str, start_day: datetime, end_day: datetime, out_fps: Dict[datetime, List[Path]]) -> int:
+    """
+    Download [start_day, end_day) in one request and write each day's rows to its event file(s).
+    Days without any reports get a header-only file, so they are not requested again.
+
+    Returns
+    ---
+    - Number of files written
+    """
+
+    body         = fetch_url(build_url_for_range(base_url, start_day, end_day))
+    days, header = split_by_day(body)
+    empty        = f"{header}\n".encode("utf-8")
+
+    n_written = 0
+    for day, fps in out_fps.items():
+        if not (start_day <= day < end_day): continue
+        for out_fp in fps:
+            # atomic: a partial file is never mistaken for a finished download
+            tmp_fp = out_fp.with_name(out_fp.name + ".tmp")
+            tmp_fp.write_bytes(days.get(day.strftime("%Y-%m-%d"), empty))
+            tmp_fp.replace(out_fp)
+            n_written += 1
+
+    return n_written
+
+
+def fetch_day(day: datetime, out_fp: Path, base_url: str = BASE_CMD):
+    """Download one day's CSV."""
 
     if out_fp.exists() and out_fp.stat().st_size > 0:
         print(f"[SKIP] {out_fp.name} already exists.")
         return
 
-    for attempt in range(1, MAX_RETRIES + 1):
-        
-        try:
-            cmd = [CURL_BIN, *CURL_FLAGS, "-o", str(out_fp), url]
-            subprocess.run(cmd, check=True)
-            
-            # quick sanity check (file not empty)
-            if out_fp.stat().st_size == 0:
-                raise RuntimeError("Empty file downloaded.")
-            print(f"[OK]   {out_fp.name}")
-            return
-        except Exception as e:
-            print(f"[ERR]  {out_fp.name} attempt {attempt}/{MAX_RETRIES}: {e}")
-            if attempt < MAX_RETRIES:
-                time.sleep(RETRY_SLEEP)
-            else:
-                # Optionally remove the zero-byte (or partial) file.
-                if out_fp.exists():
-                    out_fp.unlink()
-                print(f"[FAIL] Giving up on {out_fp.name}")
+    fetch_range(base_url, day, day + timedelta(days=1), {day: [out_fp]})
+    print(f"[OK]   {out_fp.name}")
 
 
-def main():
-    
-    all_events = glob(f"{EVENTS_DIR}/*")
-    for edir in tqdm(all_events, total=len(all_events)):
+def get_pending(events_dir: str = EVENTS_DIR) -> Dict[datetime, List[Path]]:
+    """Event days (UTC) without an ASOS file yet, mapped to the file(s) to write."""
+
+    pending = {}
+    for edir in glob(f"{events_dir}/*"):
 
         try:
             dt_str   = edir.split("/")[-1]
@@ -85,10 +178,34 @@ def main():
             continue
 
         if out_fp.is_file(): continue
+        pending.setdefault(dt, []).append(out_fp)
+
+    return pending
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Download ASOS reports for every event day, coalescing adjacent days into range requests.")
+    parser.add_argument("--events-dir", default=EVENTS_DIR)
+    parser.add_argument("--endpoint", default=None, help="Override the IEM endpoint, e.g. a local stand-in (tests/asos_standin.py).")
+    parser.add_argument("--max-concurrency", type=int, default=MAX_CONCURRENCY)
+    parser.add_argument("--max-span-days", type=int, default=MAX_SPAN_DAYS)
+    args = parser.parse_args()
 
-        fetch_day(dt, out_fp)
+    base_url = BASE_CMD if args.endpoint is None else with_endpoint(BASE_CMD, args.endpoint)
+    pending  = get_pending(args.events_dir)
+    ranges   = coalesce_days(list(pending), args.max_span_days)
+    print(f"{len(pending)} event days -> {len(ranges)} requests")
 
+    with ThreadPoolExecutor(max_workers=args.max_concurrency) as executor:
+        futures = {executor.submit(fetch_range, base_url, start, end, pending): (start, end) for start, end in ranges}
+        for future in tqdm(as_completed(futures), total=len(futures)):
+            start, end = futures[future]
+            try:
+                future.result()
+            except Exception as e:
+                print(f"[FAIL] {start:%Y-%m-%d} - {end:%Y-%m-%d}: {e}")
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
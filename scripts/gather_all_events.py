@@ -1,19 +1,31 @@
 import os
+import time
 import pstats
+import shutil
+import socket
+import argparse
 import xarray
 import cProfile
+import numpy as np
+import pandas as pd
 
 from io import StringIO
 from glob import glob
 from tqdm import tqdm
 from pathlib import Path
+from functools import lru_cache
 from datetime import datetime, timedelta
 
-from src.mrms_qpe.fetch_mrms_qpe import MRMSQPEClient
+from src.mrms_qpe.rain_day_screen import RainDayScreen
+from src.events.gauge_events import detect_gauge_events, get_event_days
+from src.pipeline.work_queue import WorkQueue
+from src.pipeline.dag import PipelineRunner, RunReport, SkipKey, Stage, StageStatus
 from src.stats.mrms_ccrfcd_stats_client import StatsClient, MRMSProductsEnum
 
-TEMP_DIR   = "__temp"
-EVENTS_DIR = "data/events"
+TEMP_DIR      = "__temp"
+EVENTS_DIR    = "data/events"
+ARTIFACTS_DIR = "data/cache/pipeline"
+REPORTS_DIR   = "data/cache/pipeline/reports"
 
 JUNE = 6
 SEPTEMBER = 8
@@ -24,6 +36,12 @@ SEP_DAYS = [1, 2, 3, 4, 5, 6, 7]
 
 MIN_PRECIP_THRESH = 0.25
 
+# how candidate days are selected
+# - "radar": regional MRMS 24H-QPE max >= MIN_PRECIP_THRESH
+# - "gauge": day overlaps a gauge-detected event (no MRMS downloads)
+# - "union": either of the above
+CANDIDATE_SOURCE = "radar"
+
 # lat/lon coords of the Las Vegas valley region
 LAT_MIN = 35.8
 LAT_MAX = 36.4
@@ -31,8 +49,15 @@ LON_MIN = -115.4
 LON_MAX = -114.8
 
 
-stats_client = StatsClient()
-mrms_qpe_client = MRMSQPEClient()
+# built lazily (on first use), so importing this module has no side effects
+@lru_cache(maxsize=None)
+def get_stats_client() -> StatsClient:
+    return StatsClient()
+
+
+@lru_cache(maxsize=None)
+def get_rain_day_screen() -> RainDayScreen:
+    return RainDayScreen(bounds=(LAT_MIN, LAT_MAX, LON_MIN, LON_MAX))
 
 
 def is_valid_date(dt: datetime) -> bool:
@@ -47,88 +72,238 @@ def is_valid_date(dt: datetime) -> bool:
 
 
 def is_min_rain_day(dt: datetime) -> bool:
+    """
+    Looked up in the persistent rain-day index (see ``src.mrms_qpe.rain_day_screen``);
+    days missing from the index are screened on demand.
+    """
+    return get_rain_day_screen().is_min_rain_day(dt, MIN_PRECIP_THRESH)
+
+
+@lru_cache(maxsize=None)
+def get_gauge_event_days() -> frozenset:
+    if CANDIDATE_SOURCE not in ("gauge", "union"):
+        return frozenset()
+    events = detect_gauge_events(get_stats_client().ccrfcd_client, start_time=DATERANGE[0], end_time=DATERANGE[-1])
+    return frozenset(get_event_days(events))
+
+
+def is_candidate_day(dt: datetime, gauge_event_days: frozenset) -> bool:
+
+    if CANDIDATE_SOURCE == "gauge":
+        return dt in gauge_event_days
+    elif CANDIDATE_SOURCE == "union":
+        return dt in gauge_event_days or is_min_rain_day(dt)
     
-    next_day = dt + timedelta(days=1)
-    xarr: xarray.Dataset = mrms_qpe_client.fetch_radar_only_qpe_24hr(next_day)
-    
-    # no MRMS file @path
-    if xarr is None: 
-        return False
-    
-    qpe = xarr.unknown.sel(
-        latitude=slice(LAT_MAX, LAT_MIN),
-        longitude=slice(LON_MIN + 360, LON_MAX + 360)
-    )
-    
-    # mm -> inch
-    qpe_in = qpe / 25.4
+    return is_min_rain_day(dt)
 
-    return float(qpe_in.max()) > MIN_PRECIP_THRESH
 
+def clean_up(to_dir: str = TEMP_DIR) -> None:
+    shutil.rmtree(to_dir, ignore_errors=True)
 
-def clean_up() -> None:
-    temp_files = [f for f in glob(f"{TEMP_DIR}/*")]
-    for fp in temp_files:
-        os.remove(fp)
 
+def get_event_csv_fp(key: str) -> Path:
+    return Path(EVENTS_DIR) / key / f"ccrfcd_gauge_deltas_{key}.csv"
 
-def process_day(start_time: datetime) -> None:
 
-    next_day = start_time + timedelta(days=1)
-    event_out_dir = Path(EVENTS_DIR) / Path(str(start_time))
-    ccrfcd_gauge_deltas_fp = event_out_dir / Path(f"ccrfcd_gauge_deltas_{str(start_time)}.csv")
-    
-    if event_out_dir.is_dir(): 
-        print(f"skipping date: {str(start_time)} | already exists!")    
-        return None
-    
-    os.makedirs(event_out_dir)
-
-    df = stats_client.fetch_stats_for_range(
-        start_time,
-        next_day,
-        MRMSProductsEnum.RadarOnly_QPE_01H,
-        timezone="UTC",
-        fetch_full_day=True,
+def get_screen_fp(key: str) -> Path:
+    # keyed by candidate source, so changing ``CANDIDATE_SOURCE`` re-screens every day
+    return Path(ARTIFACTS_DIR) / "screen" / CANDIDATE_SOURCE / f"{key}.pkl"
+
+
+def screen_stage(key: str) -> bool:
+    """
+    Is this day worth processing?
+    """
+    if not is_candidate_day(datetime.fromisoformat(key), get_gauge_event_days()):
+        raise SkipKey(f"not a candidate day (source: {CANDIDATE_SOURCE})")
+    return True
+
+
+def fetch_stage(key: str, screen: bool) -> dict:
+    """
+    Download every 1H-QPE file valid on the day and crop it to the CCRFCD region.
+    """
+
+    day    = datetime.fromisoformat(key)
+    to_dir = str(Path(TEMP_DIR) / f"{socket.gethostname()}-{os.getpid()}-{day:%Y%m%d}")
+    client = get_stats_client()
+
+    try:
+        # accumulations ending on ``day`` (i.e., what ``fetch_radar_only_qpe_full_day_1hr`` intends)
+        regional = client.mrms_client.fetch_radar_only_qpe_regional_batch(
+            [MRMSProductsEnum.RadarOnly_QPE_01H],
+            day,
+            day + timedelta(days=1) - timedelta(seconds=1),
+            bounds=client._get_region_bounds(),
+            to_dir=to_dir,
+        )
+    finally:
+        clean_up(to_dir)
+
+    if MRMSProductsEnum.RadarOnly_QPE_01H not in regional:
+        raise SkipKey("no MRMS files")
+
+    valid_times, lats, lons, stack = regional[MRMSProductsEnum.RadarOnly_QPE_01H]
+    return {"valid_times": valid_times, "lats": lats, "lons": lons, "stack": stack}
+
+
+def align_stage(key: str, fetch: dict) -> pd.DataFrame:
+    return get_stats_client().align_regional_stack(
+        fetch["valid_times"],
+        fetch["lats"],
+        fetch["lons"],
+        fetch["stack"],
+        accumulation=MRMSProductsEnum.get_accumulation(MRMSProductsEnum.RadarOnly_QPE_01H),
     )
-    df.to_csv(str(ccrfcd_gauge_deltas_fp))
 
 
-def main():
+def write_stage(key: str, align: pd.DataFrame) -> pd.DataFrame:
+    """
+    The stage's artifact *is* the event csv (see ``_dump_csv``).
+    """
+    return align
+
+
+def _dump_npz(obj: dict, fp: Path) -> None:
+    # regional stacks are mostly zeros; compress well
+    with open(fp, "wb") as f:
+        np.savez_compressed(f, **obj)
+
+
+def _load_npz(fp: Path) -> dict:
+    with np.load(fp) as z:
+        return {name: z[name] for name in z.files}
+
+
+def _dump_csv(df: pd.DataFrame, fp: Path) -> None:
+    df.to_csv(str(fp))
+
+
+def _load_csv(fp: Path) -> pd.DataFrame:
+    return pd.read_csv(fp, index_col=0)
+
+
+def build_runner(max_workers: int = 4) -> PipelineRunner:
+    """
+    screen -> fetch -> align -> write
+
+    Every stage's output is kept per day, so e.g. ``align`` can be rerun without re-downloading.
+    The aligned csv is written to a temp file and renamed into place (see ``ArtifactStore.save``),
+    so its presence is an atomic completion marker.
+    """
+
+    stages = [
+        Stage("screen", screen_stage, output_type=bool, max_concurrency=4, path=get_screen_fp),
+        Stage("fetch", fetch_stage, inputs=["screen"], output_type=dict, max_concurrency=2, dump=_dump_npz, load=_load_npz, suffix=".npz"),
+        Stage("align", align_stage, inputs=["fetch"], output_type=pd.DataFrame, max_concurrency=2),
+        Stage("write", write_stage, inputs=["align"], output_type=pd.DataFrame, dump=_dump_csv, load=_load_csv, path=get_event_csv_fp),
+    ]
+    return PipelineRunner(stages, artifact_dir=ARTIFACTS_DIR, max_workers=max_workers)
+
+
+def print_failures(report: RunReport) -> None:
+    for record in report.records:
+        if record["status"] == StageStatus.FAILED:
+            print(f"Error: stage '{record['stage']}' failed for day: {record['key']}\n{record['error']}")
+
+
+def enqueue_candidate_days(queue: WorkQueue) -> int:
 
     curr_day   = DATERANGE[0]
     last_day   = DATERANGE[-1]
     total_days = (last_day - curr_day).days
-    
-    with tqdm(total=total_days, desc="Processing Days") as pbar:
+    all_days   = [curr_day + timedelta(days=i) for i in range(total_days)]
+
+    # gauge-detected events are cheap; no MRMS needed (empty unless CANDIDATE_SOURCE uses gauges)
+    gauge_event_days = get_gauge_event_days()
+
+    # screen every day up front, in parallel; later runs only read the index
+    radar_days = set()
+    if CANDIDATE_SOURCE in ("radar", "union"):
+        screen = get_rain_day_screen()
+        screen.build(all_days)
+
+        # read the index only: days `build` could not screen (e.g., S3 errors) are left out, and retried next run
+        radar_days = set(screen.days_exceeding(MIN_PRECIP_THRESH, curr_day, last_day))
+        unscreened = screen.get_unscreened(all_days)
+        if unscreened:
+            print(f"Warning: skipping {len(unscreened)} days that could not be screened (retried next run): {[f'{day:%Y-%m-%d}' for day in unscreened[:10]]}")
+
+    # determine if CC exceeded >= 0.25 in. precip.
+    # in a 24H period (as measured by MRMS-QPE), and/or the gauges saw an event
+    candidate_days = [day for day in all_days if day in gauge_event_days or day in radar_days]
+    return queue.enqueue(str(day) for day in candidate_days)
+
+
+def drain(queue: WorkQueue, runner: PipelineRunner, worker_id: str) -> RunReport:
+    """
+    Lease and process days until the queue is empty; safe to run from many processes/nodes at once.
+
+    Days are leased ``runner.max_workers`` at a time and run together, so the runner's per-stage
+    concurrency limits apply across them.
+    """
+
+    report = RunReport()
+    with tqdm(desc=f"Processing Days ({worker_id})") as pbar:
+        while tasks := queue.lease_batch(worker_id, runner.max_workers):
+
+            with queue.keep_alive(*tasks):
+                batch_report = runner.run([task.task_id for task in tasks])
+            report.extend(batch_report)
+
+            failed = set(batch_report.failed_keys())
+            if failed:
+                print_failures(batch_report)
+
+            for task in tasks:
+                if task.task_id in failed:
+                    print(f"Error processing day: {task.task_id} | attempt {task.attempts}/{queue.max_retries}")
+                    errors = [r["error"] for r in batch_report.records if r["key"] == task.task_id and r["status"] == StageStatus.FAILED]
+                    queue.fail(task, "\n".join(errors))
+                else:
+                    queue.complete(task)
+
+            pbar.update(len(tasks))
+
+    report.end = time.time()
+    print(f"Queue status: {queue.counts()}")
+    return report
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Align MRMS and CCRFCD gauge QPE for every candidate day.")
+    parser.add_argument("--queue-db", default=WorkQueue._DB_FP, help="shared SQLite queue file")
+    parser.add_argument("--worker-only", action="store_true", help="drain the queue without enqueueing days")
+    parser.add_argument("--reset-failed", action="store_true", help="retry days that exhausted their attempts")
+    parser.add_argument("--rerun", choices=["align", "write"], help="recompute this stage (and downstream) for every day with a cached fetch; no queue, no downloads")
+    parser.add_argument("--max-workers", type=int, default=4, help="days processed concurrently (and leased at once from the queue)")
+    args = parser.parse_args()
+
+    runner    = build_runner(max_workers=args.max_workers)
+    worker_id = f"{socket.gethostname()}-{os.getpid()}"
+
+    if args.rerun:
+        fetch_dir = Path(ARTIFACTS_DIR) / "fetch"
+        keys      = sorted(fp.name[:-len(".npz")] for fp in fetch_dir.glob("*.npz")) if fetch_dir.is_dir() else []
+        report    = runner.run(keys, force=[args.rerun])
+    else:
+        queue = WorkQueue(args.queue_db)
 
-        while curr_day < last_day:
-            
-            # HACK: process every day...
-            # if not is_valid_date(curr_day): 
-            #     curr_day += timedelta(days=1)
-            #     pbar.update(1)
-            #     continue
+        if args.reset_failed:
+            print(f"Reset {queue.reset_failed()} failed days.")
 
-            # determine if CC exceeded >= 0.25 in. precip.
-            # in a 24H period (as measured by MRMS-QPE)
-            if not is_min_rain_day(curr_day):
-                curr_day += timedelta(days=1)
-                clean_up()
-                pbar.update(1)
-                continue
+        if not args.worker_only:
+            print(f"Enqueued {enqueue_candidate_days(queue)} new days.")
 
-            try:
-                process_day(curr_day)
-            except:
-                print(f"Error processing day: {curr_day} | skipped!")
+        report = drain(queue, runner, worker_id=worker_id)
 
-            # clean up __temp dir
-            clean_up()
+    if args.rerun:
+        print_failures(report)
 
-            curr_day += timedelta(days=1)
-            pbar.update(1)
+    print(report.summary())
+    report.save(str(Path(REPORTS_DIR) / f"{worker_id}-{datetime.now():%Y%m%d-%H%M%S}.json"))
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
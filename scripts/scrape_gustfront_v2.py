@@ -1,26 +1,57 @@
 """
-# TODO: rewrite; fix early stop bugs
 # TODO: scrape 2016-2021
+# TODO: fix early stop bugs in --mode selenium
 
 Helper methods to scrape rain-gauge data from the Clark County Regional 
 Flood Control District's portal.
 URL: https://gustfront.ccrfcd.org/gagedatalist/
+
+Modes
+---
+- ``selenium`` (default): drive the ``uiGage`` dropdown in headless Chrome, one gauge at a time.
+- ``http``: issue the page's download request directly, for many gauges at once, from a pool of
+  cookie-carrying sessions. Each gauge resumes from the last date already on disk, and new rows are
+  merged into ``gagedata_<id>.csv``. ``DOWNLOAD_URL_TEMPLATE`` has NOT been checked against the live
+  portal yet; capture the request behind ``uiDownload`` (browser dev tools) and pass it as ``--url-template``.
+
+```
+python scripts/scrape_gustfront_v2.py                                    # selenium
+python scripts/scrape_gustfront_v2.py --mode http --url-template "https://.../download?gage={gauge_id}&startDate={start:%m/%d/%Y}&endDate={end:%m/%d/%Y}"
+python tests/gustfront_replay.py                                         # local replay of recorded csvs, for --mode http
+```
 """
 
+import io
+import os
+import csv
+import json
 import time
+import random
 import logging
+import argparse
+import threading
+import urllib.error
+import urllib.request
 import pandas as pd
 
 from tqdm import tqdm
 from pathlib import Path
-from datetime import datetime
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.common.by import By
-from selenium.webdriver.common.keys import Keys
-from selenium.webdriver.support.ui import Select, WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import TimeoutException, NoSuchElementException
+from http.cookiejar import CookieJar
+from datetime import datetime, timedelta
+from typing import Tuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+try:
+    from selenium import webdriver
+    from selenium.webdriver.chrome.options import Options
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.common.keys import Keys
+    from selenium.webdriver.support.ui import Select, WebDriverWait
+    from selenium.webdriver.support import expected_conditions as EC
+    from selenium.common.exceptions import TimeoutException, NoSuchElementException
+except ImportError:
+    # only needed for --mode selenium
+    webdriver = None
 
 
 _URL = "https://gustfront.ccrfcd.org/gagedatalist/"
@@ -28,16 +59,20 @@ DOWNLOAD_DIR = Path("data/7-23-25-scrape")
 START_DATE = datetime(2021, 1, 1)
 WEBDRIVER_WAIT_TIMEOUT = 120
 
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler("scraper.log"),
-        logging.StreamHandler()
-    ]
-)
+# a guess at the request behind the page's "Download" button (uiGage + startDate/endDate); unverified, override
+# with --url-template
+DOWNLOAD_URL_TEMPLATE = _URL + "download?gage={gauge_id}&startDate={start:%m/%d/%Y}&endDate={end:%m/%d/%Y}"
+METADATA_FP           = "data/clark-county-rain-gauges/ccrfcd_rain_gauge_metadata.csv"
+PROGRESS_FN           = "_progress.json"
+CSV_COLUMNS           = ["Date", "Time", "Value"]
+
+MAX_SESSIONS = 8
+MAX_RETRIES  = 4
+BACKOFF_BASE = 2.0
+TIMEOUT      = 120
 
-def get_chrome_driver(download_path: Path) -> webdriver.Chrome:
+
+def get_chrome_driver(download_path: Path) -> "webdriver.Chrome":
 
     logging.info(f"Setting up Chrome driver to download to: {download_path}")
     download_path.mkdir(exist_ok=True)
@@ -98,9 +133,176 @@ def wait_for_download_complete(csv_path: Path,
     raise TimeoutError(f"Download of {csv_path.name} didn’t finish within {timeout}s")
 
 
-def main():
+class Progress:
+    """
+    Per-gauge progress (``<download_dir>/_progress.json``), saved after every gauge so an interrupted
+    refresh resumes where it stopped.
+    """
+
+    def __init__(self, fp: Path):
+        self.fp    = fp
+        self.lock  = threading.Lock()
+        self.state = json.loads(fp.read_text()) if fp.is_file() else {}
+
+    def is_done(self, gauge_id: int, end_date: datetime) -> bool:
+        entry = self.state.get(str(gauge_id))
+        return entry is not None and entry["through"] >= end_date.strftime("%Y-%m-%d")
+
+    def update(self, gauge_id: int, end_date: datetime, n_new: int) -> None:
+        with self.lock:
+            self.state[str(gauge_id)] = {"through": end_date.strftime("%Y-%m-%d"), "fetched": datetime.now().isoformat(timespec="seconds"), "new_rows": n_new}
+            tmp_fp = self.fp.with_suffix(".tmp")
+            tmp_fp.write_text(json.dumps(self.state, indent=2, sort_keys=True))
+            os.replace(tmp_fp, self.fp)
+
+
+_sessions = threading.local()
+
+
+def get_session(warmup_url: str | None = _URL) -> urllib.request.OpenerDirector:
+    """
+    One cookie-carrying opener per (worker thread, ``warmup_url``); the first use loads ``warmup_url`` (like
+    the browser did) to pick up any session cookies.
+    """
+
+    if not hasattr(_sessions, "openers"):
+        _sessions.openers = {}
+
+    if warmup_url not in _sessions.openers:
+        opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(CookieJar()))
+        if warmup_url:
+            try:
+                opener.open(warmup_url, timeout=TIMEOUT).read()
+            except (urllib.error.URLError, TimeoutError) as e:
+                logging.warning(f"Warm-up request failed: {e}")
+        _sessions.openers[warmup_url] = opener
+    return _sessions.openers[warmup_url]
+
+
+def fetch_url(url: str, warmup_url: str | None = _URL) -> bytes:
+    """GET ``url`` on this thread's session, with exponential backoff."""
+
+    for attempt in range(1, MAX_RETRIES + 1):
+        try:
+            with get_session(warmup_url).open(url, timeout=TIMEOUT) as resp:
+                return resp.read()
+        except urllib.error.HTTPError as e:
+            if e.code < 500 and e.code != 429 or attempt == MAX_RETRIES:
+                raise
+            err = e
+        except (urllib.error.URLError, TimeoutError, ConnectionError) as e:
+            if attempt == MAX_RETRIES:
+                raise
+            err = e
+
+        sleep = BACKOFF_BASE * 2 ** (attempt - 1) * random.uniform(0.5, 1.0)
+        logging.warning(f"Attempt {attempt}/{MAX_RETRIES} failed ({err}); retrying in {sleep:.1f}s")
+        time.sleep(sleep)
+
+
+def read_gauge_csv(fp_or_buf) -> pd.DataFrame:
+    """
+    A portal csv (``"Date","Time","Value"``), all columns as text; raises ``ValueError`` for anything else
+    (e.g., an HTML error page).
+    """
+    df = pd.read_csv(fp_or_buf, dtype=str, keep_default_na=False)
+    if list(df.columns) != CSV_COLUMNS:
+        raise ValueError(f"Error: unexpected columns: {list(df.columns)[:5]}")
+    return df
+
+
+def get_incremental_start(fp: Path, default: datetime = START_DATE) -> datetime:
+    """
+    Date of the newest row already on disk (re-requested, then de-duplicated), or ``default``.
+    """
+    if not fp.is_file():
+        return default
+    df = read_gauge_csv(fp)
+    if len(df) == 0:
+        return default
+    latest = pd.to_datetime(df["Date"], format="%m/%d/%Y").max()
+    return max(default, latest.to_pydatetime())
+
+
+def merge_gauge_csv(fp: Path, new_rows: pd.DataFrame) -> int:
+    """
+    Merge ``new_rows`` into ``fp`` in the portal's format (newest first, all fields quoted, CRLF); atomic.
 
-    metadata_fp     = "data/clark-county-rain-gauges/ccrfcd_rain_gauge_metadata.csv"
+    Returns
+    ---
+    - Number of rows that were not already on disk
+    """
+
+    old    = read_gauge_csv(fp) if fp.is_file() else pd.DataFrame(columns=CSV_COLUMNS)
+    merged = pd.concat([new_rows, old], ignore_index=True).drop_duplicates(["Date", "Time"], keep="first")
+    n_new  = len(merged) - len(old)
+
+    times  = pd.to_datetime(merged["Date"] + " " + merged["Time"], format="%m/%d/%Y %H:%M:%S")
+    merged = merged.iloc[times.argsort(kind="stable")[::-1]]
+
+    tmp_fp = fp.with_suffix(".csv.tmp")
+    merged.to_csv(tmp_fp, index=False, quoting=csv.QUOTE_ALL, lineterminator="\r\n")
+    os.replace(tmp_fp, fp)
+    return n_new
+
+
+def fetch_gauge(gauge_id: int, download_dir: Path, end_date: datetime, url_template: str, warmup_url: str | None) -> Tuple[int, int]:
+    """
+    Download ``gauge_id`` from its newest on-disk date through ``end_date`` and merge it in.
+
+    Returns
+    ---
+    - (``gauge_id``, number of new rows)
+    """
+
+    fp    = download_dir / f"gagedata_{gauge_id}.csv"
+    start = get_incremental_start(fp)
+    body  = fetch_url(url_template.format(gauge_id=gauge_id, start=start, end=end_date), warmup_url)
+
+    # e.g., an error/login page; never merge it
+    if body.lstrip()[:1] == b"<":
+        raise ValueError(f"Error: got an HTML page, not a csv, for gauge {gauge_id}; check --url-template")
+
+    return gauge_id, merge_gauge_csv(fp, read_gauge_csv(io.BytesIO(body)))
+
+
+def get_gauge_ids(metadata_fp: str = METADATA_FP) -> list:
+    metadata = pd.read_csv(metadata_fp)
+    metadata = metadata[metadata["station_id"] > 0]
+    return sorted(list(set(metadata['station_id'].astype(int))))
+
+
+def main_http(args) -> None:
+
+    download_dir = Path(args.download_dir)
+    download_dir.mkdir(parents=True, exist_ok=True)
+
+    if args.url_template == DOWNLOAD_URL_TEMPLATE:
+        logging.warning("Using the unverified default download request; pass the portal's real request as --url-template")
+
+    end_date  = args.end_date
+    progress  = Progress(download_dir / PROGRESS_FN)
+    gauge_ids = [_id for _id in get_gauge_ids() if args.force or not progress.is_done(_id, end_date)]
+    logging.info(f"Refreshing {len(gauge_ids)} gauges through {end_date:%Y-%m-%d} with {args.max_sessions} sessions")
+
+    failed = []
+    with ThreadPoolExecutor(max_workers=args.max_sessions) as executor:
+        futures = {executor.submit(fetch_gauge, _id, download_dir, end_date, args.url_template, args.warmup_url or None): _id for _id in gauge_ids}
+        for future in tqdm(as_completed(futures), total=len(futures), desc="Downloading Gauge Data"):
+            _id = futures[future]
+            try:
+                _, n_new = future.result()
+                progress.update(_id, end_date, n_new)
+            except Exception as e:
+                logging.error(f"Failed to download data for gauge {_id}. Error: {e}")
+                failed.append(_id)
+
+    logging.info(f"Done; {len(gauge_ids) - len(failed)} refreshed, {len(failed)} failed: {failed}")
+
+
+def main_selenium():
+
+    metadata_fp     = METADATA_FP
     rain_gauge_dir  = "data/clark-county-rain-gauges/2021-"
     rain_gauge_csvs = [f for f in Path(rain_gauge_dir).glob("*.csv")]
     metadata        = pd.read_csv(metadata_fp)
@@ -187,5 +389,34 @@ def main():
     driver.quit()
 
 
+def main():
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.FileHandler("scraper.log"),
+            logging.StreamHandler()
+        ]
+    )
+
+    parser = argparse.ArgumentParser(description="Download CCRFCD rain-gauge csvs from the Gustfront portal.")
+    parser.add_argument("--mode", choices=["http", "selenium"], default="selenium")
+    parser.add_argument("--download-dir", default=str(DOWNLOAD_DIR))
+    parser.add_argument("--end-date", type=datetime.fromisoformat, default=datetime.now().replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1))
+    parser.add_argument("--url-template", default=DOWNLOAD_URL_TEMPLATE, help="Download request; {gauge_id}, {start}, {end} (datetimes) are substituted.")
+    parser.add_argument("--warmup-url", default=_URL, help="Page loaded once per session for cookies; '' to skip.")
+    parser.add_argument("--max-sessions", type=int, default=MAX_SESSIONS)
+    parser.add_argument("--force", action="store_true", help="Ignore saved progress.")
+    args = parser.parse_args()
+
+    if args.mode == "selenium":
+        if webdriver is None:
+            raise ImportError("Error: --mode selenium requires selenium")
+        main_selenium()
+    else:
+        main_http(args)
+
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,288 @@
+"""
+Columnar ASOS observation store.
+
+``scripts/dl_asos.py`` saves one ``*_ASOS.csv`` per event directory (~30 text columns, ``M``/``T``
+markers, full METAR strings). This module parses them once into a single compressed ``.npz``:
+
+- numeric fields: ``float32``, ``NaN`` for missing (``M``) and trace (``T``) reports
+- ``station``: categorical codes into ``stations``; per-station lat/lon/elevation kept once, not per row
+- ``time``: ``int64`` seconds since the epoch, UTC
+- text fields (sky cover, wx codes, METAR): categorical codes into per-field category arrays
+
+Rows are sorted by (station, time) and duplicates dropped, so each station is one contiguous,
+time-sorted slice and window/as-of lookups are ``np.searchsorted`` calls:
+
+```python
+store = ASOSStore.load()
+td    = store.get_windows(["LAS", "VGT", "HND"], "dwpf", event_times - timedelta(hours=6), event_times)
+```
+"""
+
+import argparse
+import numpy as np
+import pandas as pd
+
+from glob import glob
+from tqdm import tqdm
+from pathlib import Path
+from datetime import datetime, timedelta
+from typing import Dict, List, Sequence, Tuple
+
+from src.utils.ccrfcd.spatial_index import SpatialIndex
+
+
+NUMERIC_FIELDS = [
+    "tmpf", "dwpf", "relh", "drct", "sknt", "p01i", "alti", "mslp", "vsby", "gust",
+    "skyl1", "skyl2", "skyl3", "skyl4",
+    "ice_accretion_1hr", "ice_accretion_3hr", "ice_accretion_6hr",
+    "peak_wind_gust", "peak_wind_drct", "feel", "snowdepth",
+]
+TEXT_FIELDS = ["skyc1", "skyc2", "skyc3", "skyc4", "wxcodes", "peak_wind_time", "metar"]
+STATION_FIELDS = ["lat", "lon", "elevation"]
+
+MISSING_MARKERS = ["M", "T"]
+
+
+def _to_epoch(times) -> np.ndarray:
+    return np.asarray(times, dtype='datetime64[s]').astype(np.int64)
+
+
+class ASOSStore:
+
+    _STORE_FP   = "data/archive/asos.npz"
+    _EVENTS_DIR = "data/events"
+
+    def __init__(
+            self,
+            stations: np.ndarray,
+            station_meta: Dict[str, np.ndarray],
+            station_codes: np.ndarray,
+            times: np.ndarray,
+            numeric: Dict[str, np.ndarray],
+            text_codes: Dict[str, np.ndarray],
+            text_categories: Dict[str, np.ndarray],
+        ):
+        """
+        Use ``ASOSStore.from_csvs``/``ASOSStore.load``; rows must already be sorted by (station, time).
+        """
+        self.stations        = np.asarray(stations, dtype=str)
+        self.station_meta    = station_meta
+        self.station_codes   = station_codes
+        self.times           = times
+        self.numeric         = numeric
+        self.text_codes      = text_codes
+        self.text_categories = text_categories
+
+        # station i owns rows [offsets[i], offsets[i + 1])
+        self.offsets     = np.searchsorted(self.station_codes, np.arange(len(self.stations) + 1))
+        self._station_ix = {s: i for i, s in enumerate(self.stations)}
+
+    def __len__(self) -> int:
+        return len(self.times)
+
+    @property
+    def fields(self) -> List[str]:
+        return list(self.numeric) + list(self.text_codes)
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> "ASOSStore":
+        """
+        Args
+        ---
+        :df: raw IEM ``asos.py`` columns (``station``, ``valid`` (UTC), ...)
+        """
+
+        df = df.dropna(subset=["station", "valid"])
+        df = df.assign(time=_to_epoch(pd.to_datetime(df["valid"], format="%Y-%m-%d %H:%M")))
+        df = df.sort_values(["station", "time"], kind="stable").drop_duplicates(["station", "time"], keep="last")
+
+        station_cat = pd.Categorical(df["station"])
+        stations    = np.asarray(station_cat.categories, dtype=str)
+        codes       = station_cat.codes.astype(np.int16)
+
+        # first report per station
+        first        = np.searchsorted(codes, np.arange(len(stations)))
+        station_meta = {
+            k: pd.to_numeric(df[k], errors="coerce").to_numpy(np.float32)[first] if k in df else np.full(len(stations), np.nan, np.float32)
+            for k in STATION_FIELDS
+        }
+
+        numeric = {
+            k: pd.to_numeric(df[k], errors="coerce").to_numpy(np.float32) if k in df else np.full(len(df), np.nan, np.float32)
+            for k in NUMERIC_FIELDS
+        }
+
+        text_codes, text_categories = {}, {}
+        for k in TEXT_FIELDS:
+            cat = pd.Categorical(df[k] if k in df else pd.Series(np.nan, index=df.index))
+            text_codes[k]      = cat.codes.astype(np.int32)
+            text_categories[k] = np.asarray(cat.categories, dtype=str)
+
+        return cls(stations, station_meta, codes, df["time"].to_numpy(np.int64), numeric, text_codes, text_categories)
+
+    @classmethod
+    def from_csvs(cls, fps: Sequence[str]) -> "ASOSStore":
+        """
+        Parse and merge ``*_ASOS.csv`` files; unreadable/empty files are skipped.
+        """
+
+        dfs = []
+        for fp in tqdm(fps, desc="Parsing ASOS"):
+            try:
+                # every column as text first: M/T become NaN, text fields keep other values verbatim
+                dfs.append(pd.read_csv(fp, dtype=str, na_values=MISSING_MARKERS, keep_default_na=False))
+            except (pd.errors.EmptyDataError, pd.errors.ParserError, UnicodeDecodeError) as e:
+                print(f"[SKIP] {fp}: {e}")
+
+        if not dfs:
+            raise ValueError("Error: no readable ASOS files")
+        return cls.from_frame(pd.concat(dfs, ignore_index=True))
+
+    @classmethod
+    def build(cls, events_dir: str = _EVENTS_DIR, store_fp: str = _STORE_FP) -> "ASOSStore":
+        store = cls.from_csvs(sorted(glob(f"{events_dir}/*/*_ASOS.csv")))
+        store.save(store_fp)
+        return store
+
+    def save(self, fp: str = _STORE_FP) -> None:
+
+        arrays = {"stations": self.stations, "station_codes": self.station_codes, "time": self.times}
+        arrays.update({f"meta/{k}": v for k, v in self.station_meta.items()})
+        arrays.update({f"num/{k}": v for k, v in self.numeric.items()})
+        arrays.update({f"text/{k}": v for k, v in self.text_codes.items()})
+        arrays.update({f"cat/{k}": v for k, v in self.text_categories.items()})
+
+        Path(fp).parent.mkdir(parents=True, exist_ok=True)
+        with open(fp, "wb") as f:
+            np.savez_compressed(f, **arrays)
+
+    @classmethod
+    def load(cls, fp: str = _STORE_FP) -> "ASOSStore":
+
+        with np.load(fp) as npz:
+            arrays = {k: npz[k] for k in npz.files}
+
+        def group(prefix: str) -> Dict[str, np.ndarray]:
+            return {k[len(prefix):]: v for k, v in arrays.items() if k.startswith(prefix)}
+
+        return cls(
+            arrays["stations"], group("meta/"), arrays["station_codes"], arrays["time"],
+            group("num/"), group("text/"), group("cat/"),
+        )
+
+    def _get_slice(self, station: str) -> slice:
+        if station not in self._station_ix:
+            raise KeyError(f"Error: unknown station: {station}")
+        i = self._station_ix[station]
+        return slice(self.offsets[i], self.offsets[i + 1])
+
+    def _get_values(self, field: str, rows) -> np.ndarray:
+        """
+        ``field`` at ``rows`` (index array or slice); text fields are decoded for those rows only (``None`` if missing).
+        """
+        if field in self.numeric:
+            return self.numeric[field][rows]
+        if field in self.text_codes:
+            codes = self.text_codes[field][rows]
+            return np.where(codes >= 0, self.text_categories[field][np.maximum(codes, 0)], None)
+        raise KeyError(f"Error: unknown field: {field}")
+
+    def get_station_meta(self) -> pd.DataFrame:
+        return pd.DataFrame({"station": self.stations, **self.station_meta})
+
+    def get_spatial_index(self) -> SpatialIndex:
+        """
+        KD-tree over the stations, e.g. ``store.get_spatial_index().nearest_to(ccrfcd_client.get_spatial_index())``
+        for the nearest ASOS station to every gauge.
+        """
+        return SpatialIndex(self.stations, self.station_meta["lat"], self.station_meta["lon"])
+
+    def get_series(self, station: str, field: str, start_time: datetime | None = None, end_time: datetime | None = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        **Timezone**: ``UTC``
+
+        Returns
+        ---
+        - (``datetime64[s]`` times, values) for ``start_time <= t < end_time``
+        """
+
+        sl    = self._get_slice(station)
+        times = self.times[sl]
+        lo    = 0 if start_time is None else np.searchsorted(times, _to_epoch(start_time), side="left")
+        hi    = len(times) if end_time is None else np.searchsorted(times, _to_epoch(end_time), side="left")
+        return times[lo:hi].astype('datetime64[s]'), self._get_values(field, slice(sl.start + lo, sl.start + hi))
+
+    def get_windows(self, stations: Sequence[str], field: str, start_times, end_times) -> pd.DataFrame:
+        """
+        **Timezone**: ``UTC``
+        Every report of ``field`` at each station within each ``[start_times[i], end_times[i])`` window.
+
+        Returns
+        ---
+        - Long-form frame: ``window`` (index into the windows), ``station``, ``time``, ``<field>``
+        """
+
+        starts = _to_epoch(start_times).reshape(-1)
+        ends   = _to_epoch(end_times).reshape(-1)
+
+        parts = []
+        for station in stations:
+            sl     = self._get_slice(station)
+            times  = self.times[sl]
+            lo     = np.searchsorted(times, starts, side="left")
+            hi     = np.searchsorted(times, ends, side="left")
+            counts = np.maximum(hi - lo, 0)
+
+            # row indices for all windows at once
+            window = np.repeat(np.arange(len(starts)), counts)
+            rows   = sl.start + np.repeat(lo, counts) + (np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts))
+            parts.append(pd.DataFrame({
+                "window": window,
+                "station": station,
+                "time": self.times[rows].astype('datetime64[s]'),
+                field: self._get_values(field, rows),
+            }))
+
+        if not parts:
+            return pd.DataFrame(columns=["window", "station", "time", field])
+        return pd.concat(parts, ignore_index=True).sort_values(["window", "station", "time"], kind="stable", ignore_index=True)
+
+    def get_asof(self, stations: Sequence[str], field: str, times, tolerance: timedelta = timedelta(hours=1)) -> np.ndarray:
+        """
+        **Timezone**: ``UTC``
+        Latest non-missing report of ``field`` at or before each time, within ``tolerance``.
+
+        Returns
+        ---
+        - ``[len(stations), len(times)]`` float32 (numeric fields only); ``NaN`` where no report qualifies
+        """
+
+        if field not in self.numeric:
+            raise KeyError(f"Error: not a numeric field: {field}")
+
+        query = _to_epoch(times).reshape(-1)
+        out   = np.full((len(stations), len(query)), np.nan, dtype=np.float32)
+        for i, station in enumerate(stations):
+            sl     = self._get_slice(station)
+            values = self.numeric[field][sl]
+            valid  = ~np.isnan(values)
+            times_ = self.times[sl][valid]
+            values = values[valid]
+            if len(times_) == 0: continue
+
+            idx = np.searchsorted(times_, query, side="right") - 1
+            ok  = (idx >= 0) & (query - times_[np.maximum(idx, 0)] <= int(tolerance.total_seconds()))
+            out[i, ok] = values[idx[ok]]
+
+        return out
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Build the columnar ASOS store from per-event *_ASOS.csv files.")
+    parser.add_argument("--events-dir", default=ASOSStore._EVENTS_DIR)
+    parser.add_argument("--out", default=ASOSStore._STORE_FP)
+    args = parser.parse_args()
+
+    store = ASOSStore.build(args.events_dir, args.out)
+    print(f"Stored {len(store)} reports from {len(store.stations)} stations -> {args.out}")
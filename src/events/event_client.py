@@ -1,27 +1,149 @@
+import warnings
+import numpy as np
+import pandas as pd
+
 from datetime import datetime, timedelta
-from src.utils.ccrfcd.ccrfcd_client import CCRFCDClient
+from typing import Dict, Sequence
+
+from src.events.asos_store import ASOSStore
+from src.events.sounding_store import SoundingStore
+from src.events import thermo
+
+
+# Las Vegas Valley ASOS sites (CCRFCD area)
+SURFACE_STATIONS = ["LAS", "VGT", "HND", "LSV"]
+SOUNDING_STATION = "VEF"
+
+ELEVATED_LEVELS = (850, 700)
+THETA_E_LEVEL   = 750
+
+# a sounding is "pre-event" if launched at most this long before the event
+MAX_SOUNDING_AGE = timedelta(hours=12)
+MAX_SURFACE_AGE  = timedelta(hours=1)
+
+# heuristic tropical (monsoon/remnant-tropical) moisture: both thresholds must be met
+TROPICAL_PWAT_THRESH    = 1.0       # in.
+TROPICAL_THETA_E_THRESH = 335.0     # K, at 750 hPa
+
+COLUMNS = ["surface_dew_point", "dew_point_850", "dew_point_700", "theta_e", "pwat", "tropical", "sounding_time"]
+
+
+def _f_to_c(t_f: np.ndarray) -> np.ndarray:
+    return (t_f - 32.0) * 5.0 / 9.0
 
 
 class EventClient:
 
-    def __init__(self):
-        pass
+    def __init__(self, sounding_store: SoundingStore | None = None, asos_store: ASOSStore | None = None):
+        self.sounding_store = sounding_store if sounding_store is not None else SoundingStore()
+        self._asos_store    = asos_store
+
+        # per-event results: epoch seconds (UTC) -> row
+        self.cache: Dict[int, Dict] = {}
+
+    @property
+    def asos_store(self) -> ASOSStore:
+        if self._asos_store is None:
+            self._asos_store = ASOSStore.load()
+        return self._asos_store
+
+    def _compute_batch(self, event_times: np.ndarray) -> pd.DataFrame:
+        """
+        Diagnostics for every event in ``event_times`` (``datetime64[s]``, UTC) at once.
+        """
+
+        # pair each event with the latest sounding launched at or before it
+        sounding_times, profiles = self.sounding_store.get_padded(SOUNDING_STATION)
+        idx   = np.searchsorted(sounding_times, event_times, side="right") - 1
+        idx   = np.maximum(idx, 0)
+        if len(sounding_times):
+            ok = (np.searchsorted(sounding_times, event_times, side="right") > 0) & (event_times - sounding_times[idx] <= np.timedelta64(MAX_SOUNDING_AGE))
+        else:
+            ok = np.zeros(len(event_times), dtype=bool)
+
+        n = len(event_times)
+        if ok.any():
+            prof       = profiles[idx[ok]].astype(np.float64)
+            p, t, td   = prof[..., 0], prof[..., 2], prof[..., 3]
+            fields     = {
+                "dew_point_850": thermo.interp_to_pressure(p, td, ELEVATED_LEVELS[0]),
+                "dew_point_700": thermo.interp_to_pressure(p, td, ELEVATED_LEVELS[1]),
+                "theta_e": thermo.theta_e(THETA_E_LEVEL, thermo.interp_to_pressure(p, t, THETA_E_LEVEL), thermo.interp_to_pressure(p, td, THETA_E_LEVEL)),
+                "pwat": thermo.precipitable_water(p, td),
+            }
+        else:
+            fields = {k: np.zeros(0) for k in ["dew_point_850", "dew_point_700", "theta_e", "pwat"]}
+
+        df = pd.DataFrame(index=pd.DatetimeIndex(event_times, name="time"))
+        for k, v in fields.items():
+            col     = np.full(n, np.nan)
+            col[ok] = v
+            df[k]   = col
+        df["sounding_time"] = np.where(ok, sounding_times[idx] if len(sounding_times) else event_times, np.datetime64("NaT"))
+
+        # surface: network median of each station's latest report
+        stations = [s for s in SURFACE_STATIONS if s in self.asos_store._station_ix]
+        dwpf     = self.asos_store.get_asof(stations, "dwpf", event_times, MAX_SURFACE_AGE) if stations else np.full((1, n), np.nan)
+        with warnings.catch_warnings():
+            # all-NaN columns (no recent report anywhere) -> NaN
+            warnings.simplefilter("ignore", category=RuntimeWarning)
+            df["surface_dew_point"] = _f_to_c(np.nanmedian(dwpf, axis=0))
+
+        df["tropical"] = (df["pwat"] >= TROPICAL_PWAT_THRESH) & (df["theta_e"] >= TROPICAL_THETA_E_THRESH)
+        return df[COLUMNS]
+
+    def fetch_event_level_data_batch(self, event_times: Sequence[datetime]) -> pd.DataFrame:
+        """
+        **Timezone**: ``UTC``
+        Event-level predictors for many events at once; only events not already cached are computed.
+
+        Returns
+        ---
+        - One row per event (indexed by time): ``surface_dew_point`` (°C, ASOS network median),
+          ``dew_point_850``/``dew_point_700`` (°C), ``theta_e`` (K, 750 hPa), ``pwat`` (in.), ``tropical``,
+          ``sounding_time`` (the VEF sounding used; ``NaT`` if none within ``MAX_SOUNDING_AGE``)
+        """
+
+        times   = np.asarray(event_times, dtype='datetime64[s]').reshape(-1)
+        keys    = times.astype(np.int64)
+        missing = np.unique(keys[[k not in self.cache for k in keys]])
+
+        if len(missing):
+            computed = self._compute_batch(missing.astype('datetime64[s]'))
+            for k, row in zip(missing, computed.to_dict("records")):
+                self.cache[int(k)] = row
+
+        return pd.DataFrame([self.cache[int(k)] for k in keys], index=pd.DatetimeIndex(times, name="time"), columns=COLUMNS)
 
     def fetch_event_level_data(self, start_time: datetime, end_time: datetime, interval: timedelta, timezone="UTC") -> dict:
         """
         **Timezone**: ``UTC``
+        Event-level data at every ``interval`` in [``start_time``, ``end_time``); see ``fetch_event_level_data_batch``.
 
         Returns
         ---
         ```python
         {
-            "surface_dew_point": ...,
-            "elevated_dew_point": ...,
-            "theta_e": ...,
-            "pwat": ...
-            "tropical": bool
+            "time": [T] datetime64[s],
+            "surface_dew_point": [T] (°C),
+            "elevated_dew_point": {850: [T], 700: [T]} (°C),
+            "theta_e": [T] (K, 750 hPa),
+            "pwat": [T] (in.),
+            "tropical": [T] bool
         }
         ```
         """
 
-        pass
\ No newline at end of file
+        assert timezone == "UTC", f"Error: unsupported timezone: {timezone}"
+
+        times = np.arange(np.datetime64(start_time, 's'), np.datetime64(end_time, 's'), np.timedelta64(interval).astype('timedelta64[s]'))
+        df    = self.fetch_event_level_data_batch(times)
+
+        return {
+            "time": times,
+            "surface_dew_point": df["surface_dew_point"].values,
+            "elevated_dew_point": {level: df[f"dew_point_{level}"].values for level in ELEVATED_LEVELS},
+            "theta_e": df["theta_e"].values,
+            "pwat": df["pwat"].values,
+            "tropical": df["tropical"].values.astype(bool),
+        }
@@ -0,0 +1,191 @@
+"""
+Gauge-driven rain event detection.
+
+The local CCRFCD gauge records already show when rain fell, so candidate event windows can be
+found without touching MRMS. Every nonzero gauge increment is binned onto a regular time axis,
+bins where enough gauges report rain are marked wet, and wet bins are segmented into events by
+run-length encoding (runs closer than ``inter_event_gap`` are merged). All passes are vectorized
+over the full network; only the (rare) nonzero increments are ever materialized.
+"""
+
+import numpy as np
+import pandas as pd
+
+from datetime import datetime, timedelta
+from typing import List, Tuple
+
+from src.utils.ccrfcd.ccrfcd_client import CCRFCDClient
+
+
+DEFAULT_BIN_SIZE        = timedelta(minutes=15)
+DEFAULT_MIN_INCREMENT   = 0.01
+DEFAULT_MIN_GAUGES      = 2
+DEFAULT_INTER_EVENT_GAP = timedelta(hours=2)
+
+
+def _get_network_increments(ccrfcd_client: CCRFCDClient) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    **Time Zone: UTC**
+
+    Returns
+    ---
+    - ``station_ids``, ``times`` (``datetime64[s]``), ``increments`` (in.) for every nonzero gauge increment in the network
+    """
+
+    station_ids, times, increments = [], [], []
+    for _id in ccrfcd_client.valid_station_ids:
+
+        prefix_sums = ccrfcd_client._get_gauge_prefix_sums(_id)
+        if prefix_sums is None: continue
+
+        _times, cum = prefix_sums
+        deltas      = np.diff(cum)
+        nonzero     = deltas > 0
+
+        station_ids.append(np.full(nonzero.sum(), _id))
+        times.append(_times[nonzero])
+        increments.append(deltas[nonzero])
+
+    if not times:
+        return np.array([], dtype=int), np.array([], dtype='datetime64[s]'), np.array([])
+
+    return np.concatenate(station_ids), np.concatenate(times), np.concatenate(increments)
+
+
+def detect_gauge_events(
+        ccrfcd_client: CCRFCDClient,
+        start_time: datetime | None = None,
+        end_time: datetime | None = None,
+        bin_size: timedelta = DEFAULT_BIN_SIZE,
+        min_increment: float = DEFAULT_MIN_INCREMENT,
+        min_gauges: int = DEFAULT_MIN_GAUGES,
+        inter_event_gap: timedelta = DEFAULT_INTER_EVENT_GAP,
+    ) -> pd.DataFrame:
+    """
+    **Time Zone: UTC**
+    Segment the gauge network's record into candidate rain events.
+
+    Args
+    ---
+    :bin_size: width of the regular time bins
+    :min_increment: a gauge is "hit" in a bin if it records >= ``min_increment`` in. within the bin
+    :min_gauges: a bin is wet if >= ``min_gauges`` gauges are hit
+    :inter_event_gap: wet runs separated by <= ``inter_event_gap`` are merged into one event
+
+    Returns
+    ---
+    - A ``pd.DataFrame`` with one row per event:
+        - ``start_time``/``end_time``: bounds of the event's wet bins
+        - ``peak_time``: start of the bin with the most network-wide precip.
+        - ``peak_in``: largest single-gauge accumulation over the event (in.)
+        - ``peak_station_id``: gauge recording ``peak_in``
+        - ``gauges_hit``: number of gauges hit at least once during the event
+    """
+
+    columns = ["start_time", "end_time", "peak_time", "peak_in", "peak_station_id", "gauges_hit"]
+
+    station_ids, times, increments = _get_network_increments(ccrfcd_client)
+
+    mask = np.ones(len(times), dtype=bool)
+    if start_time is not None:
+        mask &= times >= np.datetime64(start_time, 's')
+    if end_time is not None:
+        mask &= times < np.datetime64(end_time, 's')
+    station_ids, times, increments = station_ids[mask], times[mask], increments[mask]
+
+    if len(times) == 0:
+        return pd.DataFrame({col: [] for col in columns})
+
+    # regular bins
+    bin_secs = int(bin_size.total_seconds())
+    t0       = times.min().astype('datetime64[D]').astype('datetime64[s]')
+    bins     = ((times - t0).astype(np.int64) // bin_secs)
+
+    # per-(bin, gauge) sums; only nonzero entries exist
+    uniq_ids, gauge_idx = np.unique(station_ids, return_inverse=True)
+    keys                = bins * len(uniq_ids) + gauge_idx
+    cell_keys, inverse  = np.unique(keys, return_inverse=True)
+    cell_sums           = np.bincount(inverse, weights=increments)
+    cell_bins           = cell_keys // len(uniq_ids)
+    cell_gauges         = cell_keys %  len(uniq_ids)
+
+    # wet bins: enough gauges hit
+    hit                  = cell_sums >= min_increment
+    hit_bins, hit_counts = np.unique(cell_bins[hit], return_counts=True)
+    wet_bins             = hit_bins[hit_counts >= min_gauges]
+
+    if len(wet_bins) == 0:
+        return pd.DataFrame({col: [] for col in columns})
+
+    # run-length segmentation with gap merging
+    gap_bins     = max(int(inter_event_gap.total_seconds() // bin_secs), 0)
+    breaks       = np.flatnonzero(np.diff(wet_bins) > gap_bins + 1)
+    event_starts = wet_bins[np.r_[0, breaks + 1]]
+    event_ends   = wet_bins[np.r_[breaks, len(wet_bins) - 1]]
+
+    # assign every (bin, gauge) cell to an event (or none)
+    event_idx = np.searchsorted(event_starts, cell_bins, side="right") - 1
+    in_event  = (event_idx >= 0) & (cell_bins <= event_ends[np.clip(event_idx, 0, None)])
+    event_idx = event_idx[in_event]
+    e_bins    = cell_bins[in_event]
+    e_gauges  = cell_gauges[in_event]
+    e_sums    = cell_sums[in_event]
+    e_hit     = hit[in_event]
+    E, G      = len(event_starts), len(uniq_ids)
+
+    # gauges hit per event
+    hit_pairs  = np.unique(event_idx[e_hit] * G + e_gauges[e_hit])
+    gauges_hit = np.bincount(hit_pairs // G, minlength=E)
+
+    # peak single-gauge event total
+    pair_keys, pair_inv = np.unique(event_idx * G + e_gauges, return_inverse=True)
+    pair_tots           = np.bincount(pair_inv, weights=e_sums)
+    pair_events         = pair_keys // G
+    order               = np.lexsort((-pair_tots, pair_events))
+    first               = order[np.r_[0, np.flatnonzero(np.diff(pair_events[order])) + 1]]
+    peak_in             = np.zeros(E)
+    peak_station        = np.zeros(E, dtype=uniq_ids.dtype)
+    peak_in[pair_events[first]]      = pair_tots[first]
+    peak_station[pair_events[first]] = uniq_ids[pair_keys[first] % G]
+
+    # peak bin: most network-wide precip.
+    bin_keys, bin_inv = np.unique(e_bins, return_inverse=True)
+    bin_tots          = np.bincount(bin_inv, weights=e_sums)
+    bin_events        = np.searchsorted(event_starts, bin_keys, side="right") - 1
+    order             = np.lexsort((-bin_tots, bin_events))
+    first             = order[np.r_[0, np.flatnonzero(np.diff(bin_events[order])) + 1]]
+    peak_bins         = event_starts.copy()
+    peak_bins[bin_events[first]] = bin_keys[first]
+
+    step = np.timedelta64(bin_secs, 's')
+    return pd.DataFrame({
+        "start_time": t0 + event_starts * step,
+        "end_time": t0 + (event_ends + 1) * step,
+        "peak_time": t0 + peak_bins * step,
+        "peak_in": peak_in,
+        "peak_station_id": peak_station,
+        "gauges_hit": gauges_hit,
+    })
+
+
+def get_event_days(events: pd.DataFrame) -> List[datetime]:
+    """
+    **Time Zone: UTC**
+
+    Returns
+    ---
+    - Every UTC day touched by at least one event window, ascending.
+    """
+
+    days = set()
+    for start, end in zip(pd.to_datetime(events["start_time"]), pd.to_datetime(events["end_time"])):
+        for day in pd.date_range(start.floor("D"), (end - pd.Timedelta(seconds=1)).floor("D"), freq="D"):
+            days.add(day.to_pydatetime())
+    return sorted(days)
+
+
+if __name__ == "__main__":
+
+    events = detect_gauge_events(CCRFCDClient(), start_time=datetime(2021, 1, 1))
+    print(events)
+    print(f"# candidate days: {len(get_event_days(events))}")
@@ -0,0 +1,271 @@
+"""
+Compact, appendable sounding archive.
+
+One record per (station, valid time); every record's levels are rows of one flat ``float32`` file,
+memory-mapped on read:
+
+```
+data/archive/soundings/
+    levels.f32      # [n_levels_total, 6] little-endian float32: p, z, T, Td, u, v (append-only)
+    records.npy     # one row per sounding: station, valid_time (epoch s, UTC), offset, n_levels
+    meta.json       # fields, units, stations (+ site info)
+```
+
+Units are metadata (``FIELD_UNITS``), not per-value objects. Levels are appended before the
+(small) record index is atomically rewritten, so an interrupted append leaves the archive readable.
+
+```python
+store = SoundingStore()
+times, profiles = store.get_padded("VEF")   # [N, max_levels, 6], NaN-padded
+```
+"""
+
+import os
+import json
+import argparse
+import numpy as np
+
+from glob import glob
+from tqdm import tqdm
+from pathlib import Path
+from datetime import datetime
+from typing import Dict, List, Tuple
+
+
+FIELDS      = ["p", "z", "T", "Td", "u", "v"]
+FIELD_UNITS = {"p": "hectopascal", "z": "meter", "T": "degree_Celsius", "Td": "degree_Celsius", "u": "knot", "v": "knot"}
+
+LEVEL_DTYPE  = np.dtype("<f4")
+RECORD_DTYPE = np.dtype([("station", np.int16), ("valid_time", np.int64), ("offset", np.int64), ("n_levels", np.int32)])
+
+
+class SoundingStore:
+
+    _STORE_DIR = "data/archive/soundings"
+
+    def __init__(self, store_dir: str = _STORE_DIR):
+        self.store_dir = Path(store_dir)
+        self._levels   = None
+        self._load_index()
+
+    @property
+    def levels_fp(self) -> Path:
+        return self.store_dir / "levels.f32"
+
+    @property
+    def records_fp(self) -> Path:
+        return self.store_dir / "records.npy"
+
+    @property
+    def meta_fp(self) -> Path:
+        return self.store_dir / "meta.json"
+
+    def _load_index(self) -> None:
+
+        if self.meta_fp.is_file():
+            with open(self.meta_fp, "r") as f:
+                self.meta = json.load(f)
+        else:
+            self.meta = {"fields": FIELDS, "units": FIELD_UNITS, "stations": [], "sites": {}}
+
+        self.records  = np.load(self.records_fp) if self.records_fp.is_file() else np.zeros(0, dtype=RECORD_DTYPE)
+        self._keys    = {(int(r["station"]), int(r["valid_time"])): i for i, r in enumerate(self.records)}
+        self._levels  = None
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    @property
+    def stations(self) -> List[str]:
+        return self.meta["stations"]
+
+    @property
+    def units(self) -> Dict[str, str]:
+        return self.meta["units"]
+
+    def _get_levels(self) -> np.ndarray:
+        """
+        ``[n_levels_total, n_fields]`` read-only memmap, limited to levels referenced by the index.
+        """
+        if self._levels is None:
+            n_rows = int((self.records["offset"] + self.records["n_levels"]).max()) if len(self.records) else 0
+            if n_rows == 0:
+                self._levels = np.zeros((0, len(FIELDS)), dtype=np.float32)
+            else:
+                self._levels = np.memmap(self.levels_fp, dtype=LEVEL_DTYPE, mode="r", shape=(n_rows, len(FIELDS)))
+        return self._levels
+
+    def has(self, station: str, valid_time: datetime) -> bool:
+        if station not in self.stations:
+            return False
+        return (self.stations.index(station), int(np.datetime64(valid_time, 's').astype(np.int64))) in self._keys
+
+    def append(self, soundings: List[Tuple[str, datetime, Dict[str, np.ndarray]]], units: Dict[str, str] = FIELD_UNITS, sites: Dict[str, Dict] | None = None) -> int:
+        """
+        Args
+        ---
+        :soundings: ``[(station, valid_time (UTC), {field: [n_levels] array}), ...]``; soundings already stored are skipped
+        :units: units of the given arrays; must match the archive's
+        :sites: optional site info per station (e.g., lat/lon/elevation), kept in ``meta.json``
+
+        Returns
+        ---
+        - Number of soundings appended
+        """
+
+        if dict(units) != self.units:
+            raise ValueError(f"Error: units {units} do not match the archive's {self.units}")
+
+        self.store_dir.mkdir(parents=True, exist_ok=True)
+        stations = list(self.stations)
+
+        # drop any levels left behind by an interrupted append
+        end = int((self.records["offset"] + self.records["n_levels"]).max()) if len(self.records) else 0
+        if self.levels_fp.is_file() and self.levels_fp.stat().st_size != end * len(FIELDS) * LEVEL_DTYPE.itemsize:
+            os.truncate(self.levels_fp, end * len(FIELDS) * LEVEL_DTYPE.itemsize)
+
+        new_records, seen = [], set(self._keys)
+        with open(self.levels_fp, "ab") as f:
+            for station, valid_time, profile in soundings:
+
+                if station not in stations:
+                    stations.append(station)
+                key = (stations.index(station), int(np.datetime64(valid_time, 's').astype(np.int64)))
+                if key in seen: continue
+                seen.add(key)
+
+                levels = np.stack([np.asarray(profile[k], dtype=LEVEL_DTYPE) for k in FIELDS], axis=1)
+                f.write(np.ascontiguousarray(levels).tobytes())
+                new_records.append((key[0], key[1], end, len(levels)))
+                end += len(levels)
+
+        if not new_records:
+            return 0
+
+        records = np.concatenate([self.records, np.array(new_records, dtype=RECORD_DTYPE)])
+        meta    = dict(self.meta, stations=stations, sites={**self.meta["sites"], **(sites or {})})
+
+        # the index is what makes appended levels visible; swap it in atomically
+        with open(self.records_fp.with_name("records.tmp.npy"), "wb") as f:
+            np.save(f, records)
+        with open(self.meta_fp.with_suffix(".tmp"), "w") as f:
+            json.dump(meta, f, indent=2)
+        os.replace(self.meta_fp.with_suffix(".tmp"), self.meta_fp)
+        os.replace(self.records_fp.with_name("records.tmp.npy"), self.records_fp)
+
+        self._load_index()
+        return len(new_records)
+
+    def get(self, station: str, valid_time: datetime) -> Dict[str, np.ndarray] | None:
+        """
+        **Timezone**: ``UTC``
+
+        Returns
+        ---
+        - ``{field: [n_levels] float32}`` (read-only views into the archive), or ``None`` if not stored
+        """
+
+        if not self.has(station, valid_time):
+            return None
+        rec    = self.records[self._keys[(self.stations.index(station), int(np.datetime64(valid_time, 's').astype(np.int64)))]]
+        levels = self._get_levels()[rec["offset"]:rec["offset"] + rec["n_levels"]]
+        return {k: levels[:, i] for i, k in enumerate(FIELDS)}
+
+    def get_padded(self, station: str, start_time: datetime | None = None, end_time: datetime | None = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        **Timezone**: ``UTC``
+        Every stored sounding from ``station`` with ``start_time <= valid_time < end_time``, as one array.
+
+        Returns
+        ---
+        - (``[N]`` ``datetime64[s]`` valid times (sorted), ``[N, max_levels, len(FIELDS)]`` float32, NaN-padded)
+        """
+
+        if station not in self.stations:
+            return np.array([], dtype='datetime64[s]'), np.zeros((0, 0, len(FIELDS)), dtype=np.float32)
+
+        mask = self.records["station"] == self.stations.index(station)
+        if start_time is not None:
+            mask &= self.records["valid_time"] >= np.datetime64(start_time, 's').astype(np.int64)
+        if end_time is not None:
+            mask &= self.records["valid_time"] < np.datetime64(end_time, 's').astype(np.int64)
+
+        recs = self.records[mask]
+        recs = recs[np.argsort(recs["valid_time"], kind="stable")]
+        n    = recs["n_levels"].astype(np.int64)
+        out  = np.full((len(recs), int(n.max()) if len(recs) else 0, len(FIELDS)), np.nan, dtype=np.float32)
+
+        # one gather: (record, level) -> row in the flat level array
+        rec_ix   = np.repeat(np.arange(len(recs)), n)
+        level_ix = np.arange(n.sum()) - np.repeat(np.cumsum(n) - n, n)
+        out[rec_ix, level_ix] = self._get_levels()[np.repeat(recs["offset"], n) + level_ix]
+
+        return recs["valid_time"].astype('datetime64[s]'), out
+
+
+def _get_site_info(site: Dict) -> Dict:
+    """
+    The parts of a sounderpy ``site_info`` dict kept in ``meta.json``.
+    """
+    return {"site-id": site["site-id"], "lat": site["site-latlon"][0], "lon": site["site-latlon"][1], "elevation": site["site-elv"]}
+
+
+def from_sounderpy(clean_data: Dict) -> Tuple[Dict[str, np.ndarray], Dict[str, str], Dict]:
+    """
+    ``(profile, units, site info)`` from a sounderpy ``get_obs_data`` dict (pint ``Quantity`` fields).
+    """
+    profile = {k: np.asarray(clean_data[k].magnitude, dtype=np.float32) for k in FIELDS}
+    units   = {k: str(clean_data[k].units) for k in FIELDS}
+    return profile, units, _get_site_info(clean_data["site_info"])
+
+
+def from_json(fp: str) -> Tuple[datetime, Dict[str, np.ndarray], Dict[str, str], Dict]:
+    """
+    Read a legacy ``*_sounding.json`` dump (``{"value": [...], "unit": ...}`` per field).
+
+    Returns
+    ---
+    - (valid_time (UTC), profile, units, site info)
+    """
+
+    with open(fp, "r") as f:
+        data = json.load(f)
+
+    site       = data["site_info"]
+    valid_time = datetime(*site["valid-time"])
+    profile    = {k: np.asarray(data[k]["value"], dtype=np.float64).astype(np.float32) for k in FIELDS}
+    units      = {k: data[k]["unit"] for k in FIELDS}
+    return valid_time, profile, units, _get_site_info(site)
+
+
+def ingest_json(store: SoundingStore, events_dir: str = "data/events") -> int:
+    """
+    Append every ``<events_dir>/*/*_<STATION>_<HH>Z_sounding.json`` not yet in ``store``.
+    """
+
+    soundings, sites = [], {}
+    for fp in tqdm(sorted(glob(f"{events_dir}/*/*_sounding.json")), desc="Reading soundings"):
+        station = Path(fp).name.split("_")[-3]
+        try:
+            valid_time, profile, units, site_info = from_json(fp)
+        except (KeyError, TypeError, ValueError, json.JSONDecodeError) as e:
+            print(f"[SKIP] {fp}: {e}")
+            continue
+        if units != store.units:
+            print(f"[SKIP] {fp}: unexpected units {units}")
+            continue
+        soundings.append((station, valid_time, profile))
+        sites[station] = site_info
+
+    return store.append(soundings, sites=sites)
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Convert per-event *_sounding.json dumps into the binary sounding archive.")
+    parser.add_argument("--events-dir", default="data/events")
+    parser.add_argument("--store-dir", default=SoundingStore._STORE_DIR)
+    args = parser.parse_args()
+
+    store = SoundingStore(args.store_dir)
+    print(f"Appended {ingest_json(store, args.events_dir)} soundings ({len(store)} total) -> {args.store_dir}")
@@ -0,0 +1,111 @@
+"""
+Vectorized sounding diagnostics.
+
+Every function takes NaN-padded ``[N, L]`` profiles (``SoundingStore.get_padded``), levels ordered
+from the surface up (pressure decreasing), and computes all ``N`` soundings at once. Padding and
+missing levels are NaN and never contribute.
+
+Formulas follow Bolton (1980), as MetPy does: saturation vapor pressure, mixing ratio, and
+equivalent potential temperature; PWAT integrates specific humidity over pressure.
+"""
+
+import numpy as np
+
+
+G   = 9.80665       # m s^-2
+RHO = 1000.0        # kg m^-3 (liquid water)
+EPS = 0.622         # Rd / Rv
+
+MM_PER_INCH = 25.4
+
+
+def saturation_vapor_pressure(t_c: np.ndarray) -> np.ndarray:
+    """
+    hPa, from temperature (°C); with dew point, this is the (actual) vapor pressure.
+    """
+    return 6.112 * np.exp(17.67 * t_c / (t_c + 243.5))
+
+
+def mixing_ratio(p_hpa: np.ndarray, td_c: np.ndarray) -> np.ndarray:
+    """
+    kg/kg, from pressure (hPa) and dew point (°C).
+    """
+    e = saturation_vapor_pressure(td_c)
+    return EPS * e / (p_hpa - e)
+
+
+def specific_humidity(p_hpa: np.ndarray, td_c: np.ndarray) -> np.ndarray:
+    """
+    kg/kg, from pressure (hPa) and dew point (°C).
+    """
+    e = saturation_vapor_pressure(td_c)
+    return EPS * e / (p_hpa - (1 - EPS) * e)
+
+
+def theta_e(p_hpa: np.ndarray, t_c: np.ndarray, td_c: np.ndarray) -> np.ndarray:
+    """
+    Equivalent potential temperature (K), Bolton (1980) eq. 39.
+    """
+    t_k  = t_c + 273.15
+    td_k = td_c + 273.15
+    r    = mixing_ratio(p_hpa, td_c)
+    t_l  = 1.0 / (1.0 / (td_k - 56.0) + np.log(t_k / td_k) / 800.0) + 56.0
+    th_l = t_k * (1000.0 / (p_hpa - saturation_vapor_pressure(td_c))) ** 0.2854 * (t_k / t_l) ** (0.28 * r)
+    return th_l * np.exp((3036.0 / t_l - 1.78) * r * (1.0 + 0.448 * r))
+
+
+def interp_to_pressure(p_hpa: np.ndarray, values: np.ndarray, target_hpa: float) -> np.ndarray:
+    """
+    ``values`` at ``target_hpa``, linear in ln(p), for every profile at once.
+
+    Args
+    ---
+    :p_hpa: ``[N, L]`` pressure, decreasing with level; NaN-padded
+    :values: ``[N, L]``; NaN where missing
+
+    Returns
+    ---
+    - ``[N]``; NaN where ``target_hpa`` is outside the profile or a bracketing level is missing
+    """
+
+    valid = ~np.isnan(p_hpa) & ~np.isnan(values)
+    rows  = np.arange(len(p_hpa))
+
+    # first valid level at or above (in altitude) the target, and the last valid level before it
+    above = valid & (p_hpa <= target_hpa)
+    hi    = np.argmax(above, axis=1)
+    prior = valid & (np.arange(p_hpa.shape[1]) < hi[:, None])
+    lo    = np.where(prior.any(axis=1), p_hpa.shape[1] - 1 - np.argmax(prior[:, ::-1], axis=1), hi)
+
+    exact = above.any(axis=1) & (p_hpa[rows, hi] == target_hpa)
+    found = exact | (above.any(axis=1) & prior.any(axis=1))
+
+    p_lo, p_hi = p_hpa[rows, lo], p_hpa[rows, hi]
+    v_lo, v_hi = values[rows, lo], values[rows, hi]
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        w = np.where(exact, 1.0, np.log(target_hpa / p_lo) / np.log(p_hi / p_lo))
+        return np.where(found, v_lo + w * (v_hi - v_lo), np.nan)
+
+
+def precipitable_water(p_hpa: np.ndarray, td_c: np.ndarray, top_hpa: float = 300.0) -> np.ndarray:
+    """
+    Precipitable water (in.) from the surface to ``top_hpa``: ``1 / (g rho) * integral(q dp)``, trapezoidal
+    between consecutive valid levels.
+
+    Returns
+    ---
+    - ``[N]``; NaN for profiles with fewer than two valid levels
+    """
+
+    q     = specific_humidity(p_hpa, td_c)
+    valid = ~np.isnan(p_hpa) & ~np.isnan(q) & (p_hpa >= top_hpa)
+
+    # compact each profile's valid levels to the front, so consecutive columns are consecutive valid levels
+    order = np.argsort(~valid, axis=1, kind="stable")
+    p     = np.take_along_axis(np.where(valid, p_hpa, np.nan), order, axis=1)
+    q     = np.take_along_axis(np.where(valid, q, np.nan), order, axis=1)
+
+    layers = 0.5 * (q[:, 1:] + q[:, :-1]) * (p[:, :-1] - p[:, 1:]) * 100.0      # hPa -> Pa
+    pw_mm  = np.nansum(layers, axis=1) / (G * RHO) * 1000.0                     # m -> mm
+    return np.where(valid.sum(axis=1) >= 2, pw_mm / MM_PER_INCH, np.nan)
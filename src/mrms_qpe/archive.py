@@ -0,0 +1,197 @@
+"""
+Regional MRMS time-cube archive.
+
+Each decoded MRMS file is cropped to the CCRFCD window and appended to one chunked, compressed
+``(time, latitude, longitude)`` Zarr store per product, so re-analyses slice the archive instead of
+re-downloading and re-decoding CONUS ``.grib2.gz`` files:
+
+```python
+archive = MRMSArchive()
+archive.build(MRMSProductsEnum.RadarOnly_QPE_01H, datetime(2021, 1, 1), datetime(2025, 7, 25))
+qpe     = archive.load(MRMSProductsEnum.RadarOnly_QPE_01H, datetime(2023, 8, 20), datetime(2023, 8, 21))
+```
+
+Regional grids are mostly zeros, so they compress well; stores are opened lazily and only the
+chunks overlapping a time slice are ever read.
+"""
+
+import shutil
+import argparse
+import numpy as np
+import xarray as xr
+
+from tqdm import tqdm
+from pathlib import Path
+from datetime import datetime, timedelta
+from typing import Tuple
+
+from src.utils.ccrfcd.ccrfcd_client import CCRFCDClient
+from src.utils.mrms.products import MRMSProductsEnum
+from src.mrms_qpe.fetch_mrms_qpe import MRMSQPEClient
+
+
+# (lat_min, lat_max, lon_min, lon_max) of the CCRFCD region
+DEFAULT_BOUNDS = (CCRFCDClient._LAT_MIN, CCRFCDClient._LAT_MAX, CCRFCDClient._LON_MIN, CCRFCDClient._LON_MAX)
+
+# 2-min products: 360 timesteps = 12 hours per chunk
+DEFAULT_TIME_CHUNK = 360
+
+QPE_VAR = "qpe"
+
+
+class MRMSArchive:
+
+    _ARCHIVE_DIR = "data/archive/mrms"
+
+    def __init__(
+            self,
+            archive_dir: str = _ARCHIVE_DIR,
+            bounds: Tuple[float, float, float, float] = DEFAULT_BOUNDS,
+            time_chunk: int = DEFAULT_TIME_CHUNK,
+        ):
+        self.archive_dir = Path(archive_dir)
+        self.bounds      = bounds
+        self.time_chunk  = time_chunk
+
+    def get_path(self, product: str) -> Path:
+        return self.archive_dir / f"{product}.zarr"
+
+    def exists(self, product: str) -> bool:
+        return self.get_path(product).is_dir()
+
+    def open(self, product: str) -> xr.Dataset:
+        """
+        Lazily open ``product``'s cube; nothing but coordinates is read until values are accessed.
+        """
+        assert self.exists(product), f"Error: no archive for product: {product}"
+        return xr.open_zarr(str(self.get_path(product)), chunks=None)
+
+    def get_valid_times(self, product: str) -> np.ndarray:
+        """
+        **Timezone**: ``UTC``
+
+        Returns
+        ---
+        - Every archived valid time (``datetime64[s]``), ascending.
+        """
+        if not self.exists(product):
+            return np.array([], dtype='datetime64[s]')
+        return self.open(product)["time"].values.astype('datetime64[s]')
+
+    def load(self, product: str, start_time: datetime, end_time: datetime) -> xr.DataArray:
+        """
+        **Timezone**: ``UTC``
+
+        Returns
+        ---
+        - ``[T, H, W]`` regional QPE (mm) valid in ``[start_time, end_time]``; lazy until ``.values`` is accessed
+        """
+        return self.open(product)[QPE_VAR].sel(time=slice(np.datetime64(start_time), np.datetime64(end_time)))
+
+    def append(self, product: str, valid_times: np.ndarray, lats: np.ndarray, lons: np.ndarray, stack: np.ndarray) -> int:
+        """
+        Append regional grids (e.g., from ``MRMSQPEClient.fetch_radar_only_qpe_regional_batch``) to ``product``'s cube.
+        The time axis only grows forward; valid times at or before the last archived one are dropped.
+
+        Returns
+        ---
+        - Number of appended timesteps.
+        """
+
+        valid_times = np.asarray(valid_times, dtype='datetime64[s]')
+        order       = np.argsort(valid_times, kind="stable")
+        valid_times = valid_times[order]
+        stack       = np.asarray(stack, dtype=np.float32)[order]
+
+        archived = self.get_valid_times(product)
+        if len(archived):
+            keep        = valid_times > archived[-1]
+            valid_times = valid_times[keep]
+            stack       = stack[keep]
+
+            # every append must share the first write's grid
+            grid = self.open(product)
+            assert np.allclose(grid["latitude"].values, lats) and np.allclose(grid["longitude"].values, lons), \
+                f"Error: grid mismatch while appending to: {self.get_path(product)}"
+
+        if len(valid_times) == 0:
+            return 0
+
+        ds = xr.Dataset(
+            {QPE_VAR: (("time", "latitude", "longitude"), stack, {"units": "mm", "product": product})},
+            coords={"time": valid_times.astype('datetime64[ns]'), "latitude": lats, "longitude": lons},
+        )
+
+        if len(archived) == 0:
+            self.archive_dir.mkdir(parents=True, exist_ok=True)
+            encoding = {
+                QPE_VAR: {"chunks": (self.time_chunk, len(lats), len(lons))},
+                "time": {"units": "seconds since 1970-01-01", "dtype": "int64"},
+            }
+            ds.to_zarr(str(self.get_path(product)), mode="w", encoding=encoding)
+        else:
+            ds.to_zarr(str(self.get_path(product)), append_dim="time")
+
+        return len(valid_times)
+
+    def build(
+            self,
+            product: str,
+            start_time: datetime,
+            end_time: datetime,
+            mrms_client: MRMSQPEClient | None = None,
+            to_dir: str = "__temp/archive",
+        ) -> int:
+        """
+        **Timezone**: ``UTC``
+        Archive every ``product`` file valid in ``[start_time, end_time)``, one UTC day at a time.
+        Resumable: days before the last archived valid time are skipped.
+
+        The time axis only grows forward (see ``append``), so a day that fails to list or download stops the run before
+        any later day is appended; rerunning resumes at that day. Days without any files are skipped.
+
+        Returns
+        ---
+        - Number of appended timesteps.
+        """
+
+        mrms_client = mrms_client or MRMSQPEClient()
+        archived    = self.get_valid_times(product)
+        if len(archived):
+            start_time = max(start_time, archived[-1].astype(datetime))
+
+        days = []
+        day  = datetime(start_time.year, start_time.month, start_time.day)
+        while day < end_time:
+            days.append(day)
+            day += timedelta(days=1)
+
+        n_appended = 0
+        for day in tqdm(days, desc=f"Archiving {product}"):
+            try:
+                regional = mrms_client.fetch_radar_only_qpe_regional_batch(
+                    [product],
+                    max(day, start_time),
+                    min(day + timedelta(days=1), end_time) - timedelta(seconds=1),
+                    bounds=self.bounds,
+                    to_dir=to_dir,
+                )
+            finally:
+                shutil.rmtree(to_dir, ignore_errors=True)
+
+            if product in regional:
+                n_appended += self.append(product, *regional[product])
+
+        return n_appended
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Append regional MRMS grids to the time-cube archive.")
+    parser.add_argument("--product", default=MRMSProductsEnum.RadarOnly_QPE_01H)
+    parser.add_argument("--start", type=datetime.fromisoformat, default=datetime(2021, 1, 1))
+    parser.add_argument("--end", type=datetime.fromisoformat, default=datetime(2025, 7, 25))
+    args = parser.parse_args()
+
+    archive = MRMSArchive()
+    print(f"Appended {archive.build(args.product, args.start, args.end)} timesteps.")
@@ -0,0 +1,219 @@
+"""
+Per-cell MRMS climatology from the regional archive (see ``src.mrms_qpe.archive``).
+
+One streaming pass over the archive, one Zarr chunk at a time, accumulates:
+
+- ``valid_hours``/``wet_hours``: hours with data / with >= ``wet_thresh`` in.
+- ``seasonal_total``: total precip. (in.) per season (DJF, MAM, JJA, SON)
+- ``exceed_freq``: fraction of valid hours with >= 0.1/0.25/0.5 in/hr
+- ``wet_percentile``: percentiles of wet-hour precip. from a fixed log-spaced histogram per cell
+
+Only non-overlapping accumulations are used (e.g., top-of-the-hour ``RadarOnly_QPE_01H`` files),
+so each hour counts once. The histogram sketch is mergeable and bounded in memory; percentiles are
+accurate to within one bin (about 5% relative error with the default 128 bins).
+"""
+
+import numpy as np
+import xarray as xr
+import pandas as pd
+
+from tqdm import tqdm
+from datetime import datetime
+from typing import Sequence
+
+from src.utils.mrms.products import MRMSProductsEnum
+from src.mrms_qpe.archive import QPE_VAR, MRMSArchive
+
+
+DEFAULT_WET_THRESH         = 0.01
+DEFAULT_EXCEED_THRESHOLDS  = (0.1, 0.25, 0.5)
+DEFAULT_PERCENTILES        = (50, 90, 95, 99)
+
+SEASONS = ["DJF", "MAM", "JJA", "SON"]
+
+# histogram sketch: log-spaced bins (in.) between the wet threshold and ~10 in/hr; the last bin catches anything larger
+_SKETCH_N_BINS = 128
+_SKETCH_MAX    = 10.0
+
+
+class ClimatologyAccumulator:
+
+    def __init__(
+            self,
+            lats: np.ndarray,
+            lons: np.ndarray,
+            wet_thresh: float = DEFAULT_WET_THRESH,
+            exceed_thresholds: Sequence[float] = DEFAULT_EXCEED_THRESHOLDS,
+            n_bins: int = _SKETCH_N_BINS,
+        ):
+
+        self.lats              = np.asarray(lats)
+        self.lons              = np.asarray(lons)
+        self.wet_thresh        = wet_thresh
+        self.exceed_thresholds = np.asarray(exceed_thresholds, dtype=float)
+        self.edges             = np.geomspace(wet_thresh, _SKETCH_MAX, n_bins)
+
+        H, W = len(self.lats), len(self.lons)
+        self.valid_hours    = np.zeros((H, W), dtype=np.int64)
+        self.wet_hours      = np.zeros((H, W), dtype=np.int64)
+        self.exceed_counts  = np.zeros((len(self.exceed_thresholds), H, W), dtype=np.int64)
+        self.seasonal_total = np.zeros((len(SEASONS), H, W), dtype=np.float64)
+        self.sketch         = np.zeros((H * W, n_bins), dtype=np.int64)
+
+    def update(self, valid_times: np.ndarray, block: np.ndarray) -> None:
+        """
+        Args
+        ---
+        :valid_times: ``[T]`` ``datetime64``
+        :block: ``[T, H, W]`` QPE (mm); negative values (MRMS missing/no-coverage flags) are ignored
+        """
+
+        valid  = block >= 0
+        qpe_in = np.where(valid, block / np.float32(25.4), 0.0).astype(np.float32)
+
+        self.valid_hours += valid.sum(axis=0)
+        wet               = qpe_in >= self.wet_thresh
+        self.wet_hours   += wet.sum(axis=0)
+        self.exceed_counts += (qpe_in[None] >= self.exceed_thresholds[:, None, None, None].astype(np.float32)).sum(axis=1)
+
+        months  = np.asarray(valid_times, dtype='datetime64[M]').astype(int) % 12 + 1
+        seasons = (months % 12) // 3
+        for s in np.unique(seasons):
+            self.seasonal_total[s] += qpe_in[seasons == s].sum(axis=0, dtype=np.float64)
+
+        # wet values only; one bincount per block
+        t_idx, cells = np.nonzero(wet.reshape(len(qpe_in), -1))
+        values       = qpe_in.reshape(len(qpe_in), -1)[t_idx, cells]
+        bins         = np.clip(np.searchsorted(self.edges, values, side="right") - 1, 0, len(self.edges) - 1)
+        n_bins       = self.sketch.shape[1]
+        self.sketch += np.bincount(cells * n_bins + bins, minlength=self.sketch.size).reshape(self.sketch.shape)
+
+    def merge(self, other: "ClimatologyAccumulator") -> "ClimatologyAccumulator":
+        self.valid_hours    += other.valid_hours
+        self.wet_hours      += other.wet_hours
+        self.exceed_counts  += other.exceed_counts
+        self.seasonal_total += other.seasonal_total
+        self.sketch         += other.sketch
+        return self
+
+    def get_percentiles(self, percentiles: Sequence[float]) -> np.ndarray:
+        """
+        Returns
+        ---
+        - ``[P, H, W]`` wet-hour percentiles (in.), interpolated (in log space) within the matching bin; ``NaN`` where no hour was wet
+        """
+
+        counts = self.sketch
+        total  = counts.sum(axis=1)
+        cum    = np.cumsum(counts, axis=1)
+        log_lo = np.log(self.edges)
+        log_hi = np.r_[log_lo[1:], np.log(_SKETCH_MAX * (self.edges[1] / self.edges[0]))]
+
+        out = np.full((len(percentiles), counts.shape[0]), np.nan)
+        for i, p in enumerate(percentiles):
+            rank  = p / 100.0 * total
+            b     = np.minimum((cum < rank[:, None]).sum(axis=1), counts.shape[1] - 1)
+            rows  = np.arange(counts.shape[0])
+            below = np.where(b > 0, cum[rows, np.maximum(b - 1, 0)], 0)
+            n_in  = counts[rows, b]
+            with np.errstate(invalid="ignore", divide="ignore"):
+                frac = np.clip((rank - below) / n_in, 0.0, 1.0)
+            frac = np.nan_to_num(frac)
+            out[i] = np.where(total > 0, np.exp(log_lo[b] + frac * (log_hi[b] - log_lo[b])), np.nan)
+
+        return out.reshape(len(percentiles), len(self.lats), len(self.lons))
+
+    def finalize(self, percentiles: Sequence[float] = DEFAULT_PERCENTILES) -> xr.Dataset:
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            exceed_freq = self.exceed_counts / self.valid_hours
+            wet_frac    = self.wet_hours / self.valid_hours
+
+        dims = ("latitude", "longitude")
+        return xr.Dataset(
+            {
+                "valid_hours": (dims, self.valid_hours),
+                "wet_hours": (dims, self.wet_hours),
+                "wet_frac": (dims, wet_frac),
+                "exceed_freq": (("threshold",) + dims, exceed_freq, {"units": "in/hr"}),
+                "seasonal_total": (("season",) + dims, self.seasonal_total, {"units": "in"}),
+                "wet_percentile": (("percentile",) + dims, self.get_percentiles(percentiles), {"units": "in"}),
+            },
+            coords={
+                "latitude": self.lats,
+                "longitude": self.lons,
+                "threshold": self.exceed_thresholds,
+                "season": SEASONS,
+                "percentile": np.asarray(percentiles, dtype=float),
+            },
+            attrs={"wet_thresh": self.wet_thresh},
+        )
+
+
+def compute_climatology(
+        archive: MRMSArchive,
+        product: str = MRMSProductsEnum.RadarOnly_QPE_01H,
+        start_time: datetime | None = None,
+        end_time: datetime | None = None,
+        wet_thresh: float = DEFAULT_WET_THRESH,
+        exceed_thresholds: Sequence[float] = DEFAULT_EXCEED_THRESHOLDS,
+        percentiles: Sequence[float] = DEFAULT_PERCENTILES,
+    ) -> xr.Dataset:
+    """
+    **Timezone**: ``UTC``
+    Stream ``product``'s archive one time chunk at a time.
+    """
+
+    ds    = archive.open(product)
+    times = ds["time"].values.astype('datetime64[s]')
+
+    # non-overlapping accumulations only, e.g. top-of-the-hour 1H files
+    period = int(MRMSProductsEnum.get_accumulation(product).total_seconds())
+    mask   = times.astype(np.int64) % period == 0
+    if start_time is not None:
+        mask &= times >= np.datetime64(start_time, 's')
+    if end_time is not None:
+        mask &= times < np.datetime64(end_time, 's')
+
+    acc = ClimatologyAccumulator(ds["latitude"].values, ds["longitude"].values, wet_thresh, exceed_thresholds)
+
+    # read within stored chunk boundaries, so at most one chunk is in memory
+    chunk   = ds[QPE_VAR].encoding.get("chunks", (archive.time_chunk,))[0]
+    indices = np.flatnonzero(mask)
+    for start in tqdm(range(0, len(times), chunk), desc="Climatology"):
+        idx = indices[(indices >= start) & (indices < start + chunk)]
+        if len(idx) == 0: continue
+        block = ds[QPE_VAR].isel(time=idx).values
+        acc.update(times[idx], block)
+
+    return acc.finalize(percentiles)
+
+
+def sample_at_points(clim: xr.Dataset, lats: np.ndarray, lons: np.ndarray) -> pd.DataFrame:
+    """
+    Climatology of the nearest grid-cell to each (lat, lon), e.g. to stratify gauge bias by regime.
+
+    Args
+    ---
+    :lons: degrees east, 0-360 (matches MRMS grids)
+
+    Returns
+    ---
+    - One row per point: ``wet_frac``, ``exceed_freq_<thresh>``, ``seasonal_total_<season>``, ``wet_p<percentile>``
+    """
+
+    points = clim.sel(
+        latitude =xr.DataArray(np.asarray(lats), dims="point"),
+        longitude=xr.DataArray(np.asarray(lons), dims="point"),
+        method="nearest",
+    )
+
+    df_dict = {"wet_frac": points["wet_frac"].values}
+    for thresh in points["threshold"].values:
+        df_dict[f"exceed_freq_{thresh:g}"] = points["exceed_freq"].sel(threshold=thresh).values
+    for season in points["season"].values:
+        df_dict[f"seasonal_total_{season.lower()}"] = points["seasonal_total"].sel(season=season).values
+    for p in points["percentile"].values:
+        df_dict[f"wet_p{p:g}"] = points["wet_percentile"].sel(percentile=p).values
+
+    return pd.DataFrame(df_dict)
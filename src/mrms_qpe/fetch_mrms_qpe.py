@@ -1,17 +1,23 @@
 import os
 import warnings
+import numpy as np
 import xarray as xr
 
 from glob import glob
-from typing import List
+from pathlib import Path
+from itertools import islice
+from collections import deque
+from typing import Dict, Iterator, List, Sequence, Tuple
 from datetime import datetime, timedelta
 from bisect import bisect_left, bisect_right
-from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 
 from src.utils.mrms.files import ZippedGrib2File, Grib2File
-from src.utils.mrms.mrms import MRMSDomain, MRMSPath
+from src.utils.mrms.mrms import MRMSDomain, MRMSFileName, MRMSPath
 from src.utils.mrms.mrms import MRMSAWSS3Client
 from src.utils.mrms.products import MRMSProductsEnum
+from src.mrms_qpe.grids import QPEGrid
+from src.utils.timezones import to_utc
 
 
 warnings.filterwarnings(
@@ -37,6 +43,57 @@ def _process_single_file(fp: str, to_dir: str) -> xr.Dataset:
     return xa
 
 
+def _to_qpe_args(gf: Grib2File) -> Tuple[datetime, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    ``Grib2File.to_numpy`` (fast reader, cfgrib fallback) in ``QPEGrid.from_mm`` argument order.
+    """
+    valid_time, lats, lons, values = gf.to_numpy()
+    return valid_time, values, lats, lons
+
+
+def _process_single_file_regional(fp: str, to_dir: str, bounds: Tuple[float, float, float, float]) -> Tuple[np.datetime64, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Decode one MRMS file and crop it to ``bounds`` (lat_min, lat_max, lon_min, lon_max; degrees east, -180-180)
+    inside the worker, so only the small regional grid is sent back to the parent process.
+
+    Returns
+    ---
+    - (valid_time, lats, lons, ``[H, W]`` float32 QPE (mm))
+    """
+
+    zipped_gf = ZippedGrib2File(fp)
+    gf        = zipped_gf.unzip(to_dir=to_dir)
+    grid      = QPEGrid.from_mm(*_to_qpe_args(gf)).crop(bounds)
+
+    valid_time = np.datetime64(grid.valid_time, 's')
+    return valid_time, grid.coords.lats, grid.coords.lons, np.ascontiguousarray(grid.values)
+
+
+def _decode_file(fp: str, to_dir: str, bounds: Tuple[float, float, float, float] | None, del_tmp_files: bool) -> Tuple[datetime, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Decode one MRMS file (optionally cropped to ``bounds``) into plain arrays; the decoded grid is fully
+    read before the file is closed, so temp files can be removed right away.
+
+    Returns
+    ---
+    - (valid_time, lats, lons, ``[H, W]`` float32 QPE (mm))
+    """
+
+    gf   = ZippedGrib2File(fp).unzip(to_dir=to_dir)
+    grid = QPEGrid.from_mm(*_to_qpe_args(gf))
+    if bounds is not None:
+        grid = grid.crop(bounds)
+
+    result = (grid.valid_time, grid.coords.lats, grid.coords.lons, np.ascontiguousarray(grid.values))
+
+    if del_tmp_files:
+        for tmp_fp in [str(gf.path), fp] + glob(f"{gf.path}*.idx"):
+            if os.path.isfile(tmp_fp):
+                os.remove(tmp_fp)
+
+    return result
+
+
 class MRMSQPEClient:
 
     def __init__(self):
@@ -108,9 +165,7 @@ class MRMSQPEClient:
         ---
         """
 
-        # HACK: PDT -> UTC
-        if time_zone == "PDT":
-            end_time += timedelta(hours=7)
+        end_time = to_utc(end_time, time_zone)
 
         yyyymmdd = end_time.strftime("%Y%m%d")
         basepath = MRMSPath(
@@ -168,9 +223,7 @@ class MRMSQPEClient:
         ---
         """
 
-        # HACK: PDT -> UTC
-        if time_zone == "PDT":
-            end_time += timedelta(hours=7)
+        end_time = to_utc(end_time, time_zone)
 
         yyyymmdd = end_time.strftime("%Y%m%d")
         basepath = MRMSPath(
@@ -206,6 +259,64 @@ class MRMSQPEClient:
 
         return xas
 
+    def iter_radar_only_qpe_x_batch(
+            self,
+            end_time: datetime,
+            product: str,
+            to_dir="__temp",
+            bounds: Tuple[float, float, float, float] | None = None,
+            max_in_flight: int = 8,
+            quantize: bool = False,
+            del_tmp_files=True,
+        ) -> Iterator[Tuple[datetime, QPEGrid]]:
+        """
+        **Timezone**: ``UTC``
+        Streaming variant of ``_fetch_radar_only_qpe_x_batch``: yields ``(valid_time, qpe)`` for every file of
+        ``end_time``'s day, in time order.
+
+        Files are decoded in a process pool through a FIFO window of at most ``max_in_flight`` files; grids decoded
+        out of order wait in the window (the reorder buffer) until their turn. At most ``max_in_flight`` decoded
+        grids exist at once (plus the one held by the caller), however long the day or fine the product cadence.
+
+        Args
+        ---
+        :bounds: (lat_min, lat_max, lon_min, lon_max); crop each grid while decoding (``None``: full CONUS)
+        :quantize: store grids as ``uint16`` at 0.01 mm (see ``src.mrms_qpe.grids``)
+        :del_tmp_files: remove each file's temp files as soon as it is decoded
+
+        Returns
+        ---
+        - An iterator of (``datetime``, ``[H, W]`` ``QPEGrid`` (mm)); every grid shares one ``GridCoords``
+        """
+
+        basepath = MRMSPath(domain=MRMSDomain.CONUS, product=product, yyyymmdd=end_time.strftime("%Y%m%d"))
+        try:
+            file_paths = self.mrms_client.ls(str(basepath))
+        except Exception:
+            print(f"Error: no MRMS file @{str(basepath)}")
+            return
+        if not file_paths:
+            return
+
+        fps = self.mrms_client.download(str(basepath) + "/", to=to_dir, recursive=True)
+        fps = [fps] if isinstance(fps, str) else fps
+        fps = sorted(fps, key=lambda fp: MRMSFileName(Path(fp).name).datetime)
+
+        remaining = iter(fps)
+        with ProcessPoolExecutor(max_workers=min(max_in_flight, os.cpu_count() or 1)) as executor:
+
+            window = deque(executor.submit(_decode_file, fp, to_dir, bounds, del_tmp_files) for fp in islice(remaining, max_in_flight))
+            while window:
+
+                valid_time, lats, lons, values = window.popleft().result()
+
+                # refill before handing the grid to the caller, so decoding overlaps with the caller's work
+                fp = next(remaining, None)
+                if fp is not None:
+                    window.append(executor.submit(_decode_file, fp, to_dir, bounds, del_tmp_files))
+
+                yield valid_time, QPEGrid.from_mm(valid_time, values, lats, lons, quantize=quantize)
+
     def fetch_radar_only_qpe_15m(self, end_time: datetime, mode="nearest", time_zone="UTC"):
         """
         **Time Zone**: ``UTC``
@@ -248,12 +359,145 @@ class MRMSQPEClient:
         """
         return self._fetch_radar_only_qpe_x(end_time, MRMSProductsEnum.RadarOnly_QPE_24H, mode=mode, time_zone=time_zone)
     
-    def fetch_radar_only_qpe_full_day_1hr(self, end_time: datetime, mode="nearest", time_zone="UTC", del_tmps=False) -> List[xr.Dataset]:
+    def fetch_radar_only_qpe_48hr(self, end_time: datetime, mode="nearest", time_zone="UTC"):
+        """
+        **Time Zone**: ``UTC``
+        - Fetch ``end_time-48:00``-``end_time``
+        """
+        return self._fetch_radar_only_qpe_x(end_time, MRMSProductsEnum.RadarOnly_QPE_48H, mode=mode, time_zone=time_zone)
+
+    def _list_product_files(self, products: Sequence[str], start_time: datetime, end_time: datetime) -> Dict[str, List[str]]:
+        """
+        **Timezone**: ``UTC``
+        List every file of every product with a valid time in ``[start_time, end_time]``; the listings are fetched concurrently.
+        A missing day prefix lists as empty; any other listing error (e.g., throttling, timeouts) raises, so callers never
+        mistake a failed listing for a day without files.
+
+        Returns
+        ---
+        - ``{product: [s3 path, ...]}``
+        """
+
+        days = []
+        day  = datetime(start_time.year, start_time.month, start_time.day)
+        while day <= end_time:
+            days.append(day)
+            day += timedelta(days=1)
+
+        def _ls(product: str, day: datetime) -> Tuple[str, List[str]]:
+            basepath = MRMSPath(domain=MRMSDomain.CONUS, product=product, yyyymmdd=day.strftime("%Y%m%d"))
+            try:
+                return product, self.mrms_client.ls(str(basepath))
+            except FileNotFoundError:
+                print(f"Error: no MRMS file @{str(basepath)}")
+                return product, []
+
+        listings = {product: [] for product in products}
+        with ThreadPoolExecutor() as executor:
+            futures = [executor.submit(_ls, product, day) for product in products for day in days]
+            for future in as_completed(futures):
+                product, paths = future.result()
+                for path in paths:
+                    valid_time = MRMSFileName(Path(path).name).datetime
+                    if start_time <= valid_time <= end_time:
+                        listings[product].append(path)
+
+        return {product: sorted(paths) for product, paths in listings.items()}
+
+    def fetch_radar_only_qpe_regional_batch(
+            self,
+            products: Sequence[str],
+            start_time: datetime,
+            end_time: datetime,
+            bounds: Tuple[float, float, float, float],
+            to_dir="__temp",
+            del_tmp_files=False,
+        ) -> Dict[str, Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]]:
+        """
+        **Timezone**: ``UTC``
+        Fetch several ``RadarOnly_QPE`` products for ``[start_time, end_time]`` together, cropped to ``bounds``
+        (lat_min, lat_max, lon_min, lon_max; degrees east, -180-180).
+
+        Returns
+        ---
+        ```python
+        {
+            product: (
+                valid_times, # [T] datetime64[s], ascending
+                lats,        # [H]
+                lons,        # [W] (0-360)
+                qpe,         # [T, H, W] float32 (mm)
+            )
+        }
+        ```
+        """
+
+        listings = self._list_product_files(products, start_time, end_time)
+
+        # download each (product, day) prefix once
+        local_fps: Dict[str, List[str]] = {product: [] for product in products}
+        for product, paths in listings.items():
+            product_dir = Path(to_dir) / product
+            os.makedirs(product_dir, exist_ok=True)
+            for yyyymmdd in sorted({MRMSPath.from_str(path).yyyymmdd for path in paths}):
+                prefix = str(MRMSPath(domain=MRMSDomain.CONUS, product=product, yyyymmdd=yyyymmdd)) + "/"
+                self.mrms_client.download(prefix, to=str(product_dir), recursive=True)
+            local_fps[product] = [str(product_dir / Path(path).name) for path in paths]
+
+        results = {}
+        with ProcessPoolExecutor() as executor:
+            futures = {
+                executor.submit(_process_single_file_regional, fp, str(Path(fp).parent), bounds): product
+                for product, fps in local_fps.items() for fp in fps
+            }
+            decoded: Dict[str, list] = {product: [] for product in products}
+            for future in as_completed(futures):
+                decoded[futures[future]].append(future.result())
+
+        for product, items in decoded.items():
+            if not items:
+                continue
+            items.sort(key=lambda t: t[0])
+            results[product] = (
+                np.array([item[0] for item in items]),
+                items[0][1],
+                items[0][2],
+                np.stack([item[3] for item in items]),
+            )
+
+        if del_tmp_files == True:
+            tmp_fps = glob(f"{to_dir}/**", recursive=True)
+            for fp in tmp_fps:
+                if os.path.isfile(fp):
+                    os.remove(fp)
+
+        return results
+
+    def fetch_regional_climatology(
+            self,
+            product: str = MRMSProductsEnum.RadarOnly_QPE_01H,
+            start_time: datetime | None = None,
+            end_time: datetime | None = None,
+            archive_dir: str = "data/archive/mrms",
+            **kwargs,
+        ) -> xr.Dataset:
+        """
+        **Time Zone**: ``UTC``
+        Per-cell climatology (wet hours, seasonal totals, exceedance frequencies, wet-hour percentiles)
+        of the regional archive; a single streaming pass, one chunk at a time (see ``src.mrms_qpe.climatology``).
+        """
+
+        from src.mrms_qpe.archive import MRMSArchive
+        from src.mrms_qpe.climatology import compute_climatology
+
+        return compute_climatology(MRMSArchive(archive_dir), product, start_time, end_time, **kwargs)
+
+    def fetch_radar_only_qpe_full_day_1hr(self, end_time: datetime, mode="nearest", time_zone="UTC", del_tmps=False, to_dir="__temp") -> List[xr.Dataset]:
         """
         **Time Zone**: ``UTC``
         - Fetch ``end_time-24:00``-``end_time``
         """
-        return self._fetch_radar_only_qpe_x_batch(end_time, MRMSProductsEnum.RadarOnly_QPE_01H, mode=mode, time_zone=time_zone, del_tmp_files=del_tmps)
+        return self._fetch_radar_only_qpe_x_batch(end_time, MRMSProductsEnum.RadarOnly_QPE_01H, mode=mode, time_zone=time_zone, to_dir=to_dir, del_tmp_files=del_tmps)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,318 @@
+"""
+Gauge-adjusted MRMS QPE.
+
+Adjusts hourly ``RadarOnly_QPE_01H`` grids with the CCRFCD gauge accumulations over the same hour:
+
+- ``"mfb"``: mean-field bias; the whole grid is scaled by ``sum(gauge) / sum(radar)`` over gauges under rain
+- ``"idw"``: local bias; gauge - radar residuals, inverse-distance weighted over each cell's nearest gauges
+- ``"kriging"``: local bias; residuals by ordinary kriging, with a compactly supported (spherical) covariance
+
+Everything that depends only on the geometry is precomputed once per ``GaugeAdjuster``: the IDW weights and
+the kriging cell-gauge covariances are sparse ``[H * W, G]`` matrices, and the kriging system is LU-factorized
+(sparse) once per set of reporting gauges. Kriging runs in dual form, so each hour is one triangular solve plus
+one sparse mat-vec, whatever the grid size:
+
+```python
+archive = MRMSArchive()
+ds      = adjust_event(archive, CCRFCDClient(gauge_qc=True), datetime(2023, 8, 20), datetime(2023, 8, 21), method="kriging")
+```
+"""
+
+import time
+import argparse
+import numpy as np
+import xarray as xr
+
+from datetime import datetime
+from typing import Dict, Tuple
+from scipy import sparse
+from scipy.sparse.linalg import splu
+
+from src.utils.ccrfcd.ccrfcd_client import CCRFCDClient
+from src.utils.ccrfcd.spatial_index import SpatialIndex
+from src.utils.mrms.products import MRMSProductsEnum
+from src.mrms_qpe.archive import MRMSArchive
+from src.mrms_qpe.grids import MM_PER_INCH, GridCoords
+
+
+METHODS = ("mfb", "idw", "kriging")
+
+# mean-field bias: gauges where radar saw at least this much count (gauge zeros included, so virga is penalized)
+MIN_RAIN_MM = 0.25
+MIN_PAIRS   = 3
+BIAS_RANGE  = (0.05, 20.0)
+
+DEFAULT_IDW_POWER     = 2.0
+DEFAULT_IDW_NEIGHBORS = 8
+DEFAULT_MAX_KM        = 20.0            # IDW search radius
+
+DEFAULT_RANGE_KM = 15.0                 # kriging (spherical) covariance range
+DEFAULT_NUGGET   = 0.2                  # fraction of the sill
+
+# cache this many kriging factorizations (one per distinct set of reporting gauges)
+_MAX_FACTORIZATIONS = 64
+
+
+def spherical_covariance(dist_km: np.ndarray, range_km: float) -> np.ndarray:
+    """
+    Unit-sill spherical covariance; exactly 0 beyond ``range_km``.
+    """
+    h = np.minimum(np.asarray(dist_km, dtype=np.float64) / range_km, 1.0)
+    return 1.0 - 1.5 * h + 0.5 * h ** 3
+
+
+class GaugeAdjuster:
+
+    def __init__(
+            self,
+            grid_lats: np.ndarray,
+            grid_lons: np.ndarray,
+            gauge_lats: np.ndarray,
+            gauge_lons: np.ndarray,
+            method: str = "kriging",
+            idw_power: float = DEFAULT_IDW_POWER,
+            idw_neighbors: int = DEFAULT_IDW_NEIGHBORS,
+            max_km: float = DEFAULT_MAX_KM,
+            range_km: float = DEFAULT_RANGE_KM,
+            nugget: float = DEFAULT_NUGGET,
+        ):
+        """
+        Args
+        ---
+        :grid_lats: ``[H]`` (descending, MRMS order)
+        :grid_lons: ``[W]`` degrees east, 0-360
+        :gauge_lats: ``[G]``
+        :gauge_lons: ``[G]`` degrees east, 0-360
+        """
+
+        assert method in METHODS, f"Error: invalid method: {method}; expected one of {METHODS}"
+
+        self.grid_lats  = np.asarray(grid_lats, dtype=np.float64)
+        self.grid_lons  = np.asarray(grid_lons, dtype=np.float64)
+        self.gauge_lats = np.asarray(gauge_lats, dtype=np.float64)
+        self.gauge_lons = np.asarray(gauge_lons, dtype=np.float64)
+        self.method     = method
+        self.range_km   = range_km
+        self.nugget     = nugget
+
+        H, W, G = len(self.grid_lats), len(self.grid_lons), len(self.gauge_lats)
+
+        # gauge -> nearest cell
+        self.rows, self.cols = GridCoords.get(self.grid_lats, self.grid_lons).nearest_indices(self.gauge_lats, self.gauge_lons)
+
+        # gauges with a location, as column indices; gauges without one never contribute
+        self.index = SpatialIndex(np.arange(G), self.gauge_lats, self.gauge_lons)
+        cell_lats  = np.repeat(self.grid_lats, W)
+        cell_lons  = np.tile(self.grid_lons, H)
+
+        self.weights: sparse.csr_matrix | None = None
+        self.cov_cells: sparse.csr_matrix | None = None
+        self.cov_gauges: sparse.csr_matrix | None = None
+        self._factorizations: Dict[bytes, object] = {}
+
+        if method == "idw":
+            # [H * W, G]: 1 / d^p to each cell's nearest gauges; floored at half a cell so a gauge's own cell is finite
+            ids, dist = self.index.query_knn(cell_lats, cell_lons, k=idw_neighbors, max_km=max_km)
+            found     = ids >= 0
+            w         = 1.0 / np.maximum(dist[found], 0.5) ** idw_power
+            self.weights = sparse.csr_matrix((w, (np.nonzero(found)[0], ids[found])), shape=(H * W, G))
+
+        elif method == "kriging":
+            # [H * W, G] cell-gauge and [G, G] gauge-gauge covariances; sparse, since the covariance vanishes past the range
+            offsets, ids, dist = self.index.query_radius(cell_lats, cell_lons, radius_km=range_km)
+            self.cov_cells     = sparse.csr_matrix((spherical_covariance(dist, range_km), ids, offsets), shape=(H * W, G))
+
+            pairs = self.index.query_pairs(radius_km=range_km)
+            a, b  = pairs["id_a"].to_numpy(dtype=np.int64), pairs["id_b"].to_numpy(dtype=np.int64)
+            c     = spherical_covariance(pairs["dist_km"].to_numpy(), range_km)
+            diag  = np.arange(G)
+            self.cov_gauges = sparse.csr_matrix(
+                (np.concatenate([c, c, np.full(G, 1.0 + nugget)]), (np.concatenate([a, b, diag]), np.concatenate([b, a, diag]))),
+                shape=(G, G),
+            )
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return len(self.grid_lats), len(self.grid_lons)
+
+    def _get_pairs(self, radar_mm: np.ndarray, gauge_mm: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Returns
+        ---
+        - ``valid``: ``[G]`` gauges with a location, a (finite) accumulation, and valid radar at their cell
+        - ``radar``: ``[G]`` radar (mm) at each gauge's cell
+        """
+        radar = radar_mm[self.rows, self.cols].astype(np.float64)
+        valid = np.isfinite(gauge_mm) & np.isfinite(radar) & (radar >= 0) & np.isfinite(self.gauge_lats) & np.isfinite(self.gauge_lons)
+        return valid, radar
+
+    def get_mean_field_bias(self, radar_mm: np.ndarray, gauge_mm: np.ndarray) -> Tuple[float, int]:
+        """
+        Returns
+        ---
+        - (``sum(gauge) / sum(radar)`` over gauges with radar >= ``MIN_RAIN_MM``, clipped to ``BIAS_RANGE``; 1 with fewer
+          than ``MIN_PAIRS`` such gauges, number of such gauges)
+        """
+        valid, radar = self._get_pairs(radar_mm, gauge_mm)
+        wet          = valid & (radar >= MIN_RAIN_MM)
+        if wet.sum() < MIN_PAIRS:
+            return 1.0, int(wet.sum())
+        return float(np.clip(gauge_mm[wet].sum() / radar[wet].sum(), *BIAS_RANGE)), int(wet.sum())
+
+    def _get_factorization(self, valid: np.ndarray):
+        """
+        LU factorization of the ordinary kriging system over the reporting gauges ``valid``; cached per gauge set.
+        """
+        key = np.packbits(valid).tobytes()
+        if key not in self._factorizations:
+            n   = int(valid.sum())
+            ix  = np.flatnonzero(valid)
+            one = sparse.csr_matrix(np.ones((n, 1)))
+            A   = sparse.bmat([[self.cov_gauges[ix][:, ix], one], [one.T, None]], format="csc")
+            if len(self._factorizations) >= _MAX_FACTORIZATIONS:
+                self._factorizations.pop(next(iter(self._factorizations)))
+            self._factorizations[key] = splu(A)
+        return self._factorizations[key]
+
+    def get_residual_field(self, radar_mm: np.ndarray, gauge_mm: np.ndarray) -> Tuple[np.ndarray, int]:
+        """
+        Interpolated gauge - radar residual (mm) at every cell (``"idw"``/``"kriging"``).
+
+        Ordinary kriging reverts to the estimated mean residual (beta) away from the gauges; beta is tapered by each
+        cell's total covariance with the reporting gauges (capped at the unit sill), so, as with IDW, the field is 0
+        past the range of every reporting gauge.
+
+        Returns
+        ---
+        - (``[H, W]`` residuals; 0 where no gauge contributes, number of gauges used)
+        """
+
+        valid, radar = self._get_pairs(radar_mm, gauge_mm)
+        residual     = np.where(valid, gauge_mm - radar, 0.0)
+        n            = int(valid.sum())
+
+        if n == 0:
+            return np.zeros(self.shape), 0
+
+        if self.method == "idw":
+            # re-normalize over the reporting gauges: two mat-vecs, no per-hour rebuild
+            num = self.weights @ residual
+            den = self.weights @ valid.astype(np.float64)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                field = np.where(den > 0, num / den, 0.0)
+
+        else:
+            # dual kriging: [C 1; 1' 0] [alpha; beta] = [residual; 0], then field = C_cells alpha + taper * beta
+            taper = np.minimum(self.cov_cells @ valid.astype(np.float64), 1.0)
+            if n == 1:
+                field = residual[valid][0] * taper
+            else:
+                sol   = self._get_factorization(valid).solve(np.concatenate([residual[valid], [0.0]]))
+                alpha = np.zeros(len(valid))
+                alpha[valid] = sol[:-1]
+                field = self.cov_cells @ alpha + sol[-1] * taper
+
+        return field.reshape(self.shape), n
+
+    def adjust(self, radar_mm: np.ndarray, gauge_mm: np.ndarray) -> Tuple[np.ndarray, float, int]:
+        """
+        Args
+        ---
+        :radar_mm: ``[H, W]`` radar-only QPE (mm); negative (MRMS flags) or NaN cells are missing
+        :gauge_mm: ``[G]`` gauge accumulations (mm) over the same period; NaN where unavailable
+
+        Returns
+        ---
+        - (``[H, W]`` adjusted QPE (mm, float32; NaN where radar is missing), mean-field bias (``"mfb"``; else NaN), number of gauges used)
+        """
+
+        radar_mm = np.asarray(radar_mm, dtype=np.float32)
+        gauge_mm = np.asarray(gauge_mm, dtype=np.float64)
+        missing  = ~np.isfinite(radar_mm) | (radar_mm < 0)
+
+        if self.method == "mfb":
+            bias, n  = self.get_mean_field_bias(radar_mm, gauge_mm)
+            adjusted = radar_mm * np.float32(bias)
+        else:
+            field, n = self.get_residual_field(radar_mm, gauge_mm)
+            bias     = np.nan
+            adjusted = np.maximum(radar_mm + field.astype(np.float32), 0.0)
+
+        return np.where(missing, np.float32(np.nan), adjusted).astype(np.float32), bias, n
+
+    def adjust_stack(self, stack_mm: np.ndarray, gauge_mm: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        ``adjust`` for every timestep of ``[T, H, W]`` and ``[T, G]``.
+
+        Returns
+        ---
+        - (``[T, H, W]`` adjusted (mm), ``[T]`` mean-field bias, ``[T]`` gauges used)
+        """
+        out    = np.empty(np.shape(stack_mm), dtype=np.float32)
+        bias   = np.full(len(out), np.nan)
+        n_used = np.zeros(len(out), dtype=np.int64)
+        for t in range(len(out)):
+            out[t], bias[t], n_used[t] = self.adjust(stack_mm[t], gauge_mm[t])
+        return out, bias, n_used
+
+
+def adjust_event(
+        archive: MRMSArchive,
+        ccrfcd_client: CCRFCDClient,
+        start_time: datetime,
+        end_time: datetime,
+        method: str = "kriging",
+        **kwargs,
+    ) -> xr.Dataset:
+    """
+    **Timezone**: ``UTC``
+    Gauge-adjusted ``RadarOnly_QPE_01H`` for every top-of-the-hour grid archived in ``[start_time, end_time]``.
+
+    Returns
+    ---
+    - ``adjusted``/``radar`` ``[T, H, W]`` (mm), ``bias`` ``[T]`` (``"mfb"``), ``n_gauges`` ``[T]``
+    """
+
+    product = MRMSProductsEnum.RadarOnly_QPE_01H
+    qpe     = archive.load(product, start_time, end_time)
+    times   = qpe["time"].values.astype('datetime64[s]')
+    hourly  = np.flatnonzero(times.astype(np.int64) % 3600 == 0)
+    qpe     = qpe.isel(time=hourly)
+    times   = times[hourly]
+
+    # [T, G] gauge accumulations over the same hours (in. -> mm)
+    _, lats, lons, gauge_qpe = ccrfcd_client._fetch_all_gauge_qpe_windows(times - np.timedelta64(MRMSProductsEnum.get_accumulation(product)), times)
+
+    adjuster = GaugeAdjuster(qpe["latitude"].values, qpe["longitude"].values, lats, lons, method=method, **kwargs)
+    stack    = qpe.values
+    adjusted, bias, n_used = adjuster.adjust_stack(stack, gauge_qpe * MM_PER_INCH)
+
+    dims = ("time", "latitude", "longitude")
+    return xr.Dataset(
+        {
+            "adjusted": (dims, adjusted, {"units": "mm", "method": method}),
+            "radar": (dims, np.asarray(stack, dtype=np.float32), {"units": "mm", "product": product}),
+            "bias": ("time", bias),
+            "n_gauges": ("time", n_used),
+        },
+        coords={"time": times.astype('datetime64[ns]'), "latitude": qpe["latitude"].values, "longitude": qpe["longitude"].values},
+    )
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Gauge-adjust archived RadarOnly_QPE_01H grids, hour by hour.")
+    parser.add_argument("--start", type=datetime.fromisoformat, required=True)
+    parser.add_argument("--end", type=datetime.fromisoformat, required=True)
+    parser.add_argument("--method", choices=METHODS, default="kriging")
+    parser.add_argument("--gauge-qc", action="store_true")
+    parser.add_argument("--out-fp", default=None)
+    args = parser.parse_args()
+
+    t0 = time.time()
+    ds = adjust_event(MRMSArchive(), CCRFCDClient(gauge_qc=args.gauge_qc), args.start, args.end, method=args.method)
+    print(f"Adjusted {ds.sizes['time']} hours in {time.time() - t0:.2f}s")
+
+    out_fp = args.out_fp or f"data/adjusted_{args.method}_{args.start:%Y%m%d%H}-{args.end:%Y%m%d%H}.nc"
+    ds.to_netcdf(out_fp)
+    print(f"-> {out_fp}")
@@ -0,0 +1,164 @@
+"""
+Compact in-memory QPE grids.
+
+- ``GridCoords``: lat/lon axes, interned, so every grid on the same MRMS grid shares one (read-only) copy
+- ``QPEGrid``: one valid time's values, either ``float32`` mm or ``uint16`` quantized at 0.01 mm (half the memory)
+
+Values stay in mm; conversions (and de-quantization) happen only for the gathered points.
+"""
+
+import numpy as np
+import xarray as xr
+
+from datetime import datetime
+from typing import Dict, Tuple
+
+
+MM_PER_INCH = 25.4
+
+# uint16 quantization: 0.01 mm steps up to 655.34 mm; 65535 marks missing (MRMS negative flags, NaN)
+QUANT_SCALE   = 0.01
+QUANT_MISSING = np.iinfo(np.uint16).max
+
+
+def _nearest_on_axis(axis: np.ndarray, values: np.ndarray) -> np.ndarray:
+    """
+    Index of the nearest ``axis`` entry to each value; ``axis`` is monotonic (ascending or descending),
+    so each lookup is a binary search instead of a scan over the axis. Ties go to the first index (as ``argmin``).
+    """
+
+    values = np.asarray(values, dtype=np.float64)
+    if len(axis) < 2:
+        return np.zeros(values.shape, dtype=np.int64)
+
+    descending = axis[0] > axis[-1]
+    asc        = axis[::-1] if descending else axis
+
+    hi     = np.clip(np.searchsorted(asc, values), 1, len(asc) - 1)
+    lo     = hi - 1
+    d_hi   = np.abs(values - asc[hi])
+    d_lo   = np.abs(values - asc[lo])
+    use_hi = (d_hi <= d_lo) if descending else (d_hi < d_lo)
+    idx    = np.where(use_hi, hi, lo)
+    return len(asc) - 1 - idx if descending else idx
+
+
+class GridCoords:
+
+    _interned: Dict[Tuple, "GridCoords"] = {}
+
+    def __init__(self, lats: np.ndarray, lons: np.ndarray):
+        """
+        Args
+        ---
+        :lats: descending (MRMS order)
+        :lons: degrees east, 0-360
+        """
+        self.lats = np.array(lats, dtype=np.float64)
+        self.lons = np.array(lons, dtype=np.float64)
+        self.lats.setflags(write=False)
+        self.lons.setflags(write=False)
+
+    @classmethod
+    def get(cls, lats: np.ndarray, lons: np.ndarray) -> "GridCoords":
+        """
+        Returns
+        ---
+        - The shared ``GridCoords`` for this grid; built once per distinct grid.
+        """
+        lats, lons = np.asarray(lats), np.asarray(lons)
+        key        = (len(lats), float(lats[0]), float(lats[-1]), len(lons), float(lons[0]), float(lons[-1])) if len(lats) and len(lons) else (len(lats), len(lons))
+        if key not in cls._interned:
+            cls._interned[key] = cls(lats, lons)
+        return cls._interned[key]
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return len(self.lats), len(self.lons)
+
+    def nearest_indices(self, lats: np.ndarray, lons: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Returns
+        ---
+        - (row, col) indices of the nearest grid-cell to each (lat, lon) pair; ``lons`` in degrees east, 0-360
+        """
+        return _nearest_on_axis(self.lats, lats), _nearest_on_axis(self.lons, lons)
+
+
+class QPEGrid:
+
+    def __init__(self, valid_time: datetime, values: np.ndarray, coords: GridCoords):
+        """
+        Use ``QPEGrid.from_mm``; ``values`` are stored as given (``float32`` mm, or quantized ``uint16``).
+        """
+        assert values.shape == coords.shape, f"Error: values {values.shape} do not match coords {coords.shape}"
+        self.valid_time = valid_time
+        self.values     = values
+        self.coords     = coords
+
+    @classmethod
+    def from_mm(cls, valid_time: datetime, values: np.ndarray, lats: np.ndarray, lons: np.ndarray, quantize: bool = False) -> "QPEGrid":
+
+        coords = GridCoords.get(lats, lons)
+        values = np.asarray(values)
+
+        if not quantize:
+            return cls(valid_time, values.astype(np.float32, copy=False), coords)
+
+        valid     = np.isfinite(values) & (values >= 0)
+        quantized = np.full(values.shape, QUANT_MISSING, dtype=np.uint16)
+        quantized[valid] = np.minimum(np.rint(values[valid] / QUANT_SCALE), QUANT_MISSING - 1).astype(np.uint16)
+        return cls(valid_time, quantized, coords)
+
+    @classmethod
+    def from_xarray(cls, xarr: xr.Dataset, quantize: bool = False) -> "QPEGrid":
+        valid_time = datetime.utcfromtimestamp(int(xarr.time.values.astype('datetime64[s]').astype('int64')))
+        return cls.from_mm(valid_time, xarr['unknown'].values, xarr['latitude'].values, xarr['longitude'].values, quantize=quantize)
+
+    @property
+    def quantized(self) -> bool:
+        return self.values.dtype == np.uint16
+
+    @property
+    def nbytes(self) -> int:
+        return self.values.nbytes
+
+    def _decode(self, values: np.ndarray) -> np.ndarray:
+        if not self.quantized:
+            return values.astype(np.float32, copy=False)
+        return np.where(values == QUANT_MISSING, np.float32(np.nan), values.astype(np.float32) * np.float32(QUANT_SCALE))
+
+    def gather(self, rows: np.ndarray, cols: np.ndarray, units: str = "mm") -> np.ndarray:
+        """
+        Values at (``rows``, ``cols``) only; de-quantized and converted (``"mm"`` or ``"in"``) after gathering.
+        """
+        values = self._decode(self.values[rows, cols])
+        if units == "in":
+            return values / np.float32(MM_PER_INCH)
+        assert units == "mm", f"Error: invalid units: {units}"
+        return values
+
+    def to_mm(self) -> np.ndarray:
+        """
+        Full ``[H, W]`` float32 grid (mm); a copy if quantized.
+        """
+        return self._decode(self.values)
+
+    def crop(self, bounds: Tuple[float, float, float, float]) -> "QPEGrid":
+        """
+        A view of the (lat_min, lat_max, lon_min, lon_max) window (degrees east, -180-180).
+        """
+        lat_min, lat_max, lon_min, lon_max = bounds
+        rows = np.flatnonzero((self.coords.lats >= lat_min) & (self.coords.lats <= lat_max))
+        cols = np.flatnonzero((self.coords.lons >= lon_min + 360) & (self.coords.lons <= lon_max + 360))
+        rs   = slice(rows[0], rows[-1] + 1) if len(rows) else slice(0, 0)
+        cs   = slice(cols[0], cols[-1] + 1) if len(cols) else slice(0, 0)
+        return QPEGrid(self.valid_time, self.values[rs, cs], GridCoords.get(self.coords.lats[rs], self.coords.lons[cs]))
+
+    def to_xarray(self) -> xr.DataArray:
+        return xr.DataArray(
+            self.to_mm(),
+            dims=("latitude", "longitude"),
+            coords={"latitude": self.coords.lats, "longitude": self.coords.lons, "time": np.datetime64(self.valid_time, 's')},
+            attrs={"units": "mm"},
+        )
@@ -0,0 +1,208 @@
+"""
+Persistent rain-day screening index built from MRMS ``RadarOnly_QPE_24H``.
+
+Deciding whether a day is worth processing used to mean downloading, unzipping, and decoding a
+full CONUS 24H-QPE file, serially, on every run. Here each day is screened once (in parallel, with
+each worker cropping to the region right after decoding and returning a few floats), and the per-day
+regional summary is persisted to a small CSV, so later runs answer "which days exceed 0.25 in?"
+with a vectorized lookup.
+"""
+
+import os
+import shutil
+import tempfile
+import numpy as np
+import pandas as pd
+
+from tqdm import tqdm
+from pathlib import Path
+from datetime import datetime, timedelta
+from typing import Dict, List, Sequence, Tuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+
+# lat/lon coords of the Las Vegas valley region
+DEFAULT_BOUNDS = (35.8, 36.4, -115.4, -114.8)
+
+# a grid-cell is "wet" if it records >= this much precip. (in.) in 24H
+DEFAULT_WET_THRESH = 0.01
+
+_INDEX_COLUMNS = ["day", "available", "max_in", "mean_in", "wet_frac"]
+
+
+def _screen_day(day: datetime, bounds: Tuple[float, float, float, float], wet_thresh: float) -> Dict:
+    """
+    Screen one UTC day in a worker process.
+
+    A day with no 24H file on S3 is returned as unavailable (and persisted); any other failure (e.g., an S3 timeout)
+    raises, so the day is not recorded and is retried next run.
+
+    Returns
+    ---
+    ```python
+    {"day": "YYYY-MM-DD", "available": bool, "max_in": float, "mean_in": float, "wet_frac": float}
+    ```
+    """
+
+    from src.mrms_qpe.fetch_mrms_qpe import MRMSQPEClient
+    from src.utils.mrms.products import MRMSProductsEnum
+    from src.utils.mrms.mrms import MRMSDomain, MRMSPath
+
+    lat_min, lat_max, lon_min, lon_max = bounds
+    row    = {"day": day.strftime("%Y-%m-%d"), "available": False, "max_in": np.nan, "mean_in": np.nan, "wet_frac": np.nan}
+    to_dir = tempfile.mkdtemp(prefix="rain_day_screen_")
+
+    try:
+        # 24H accumulation ending at 00Z of the next day; one temp dir per worker
+        client   = MRMSQPEClient()
+        end_time = day + timedelta(days=1)
+        basepath = MRMSPath(domain=MRMSDomain.CONUS, product=MRMSProductsEnum.RadarOnly_QPE_24H, yyyymmdd=end_time.strftime("%Y%m%d"))
+
+        # `_fetch_radar_only_qpe_x` returns None for any listing error; only a missing prefix means "no file"
+        try:
+            if not client.mrms_client.ls(str(basepath)):
+                return row
+        except FileNotFoundError:
+            return row
+
+        xarr = client._fetch_radar_only_qpe_x(end_time, MRMSProductsEnum.RadarOnly_QPE_24H, to_dir=to_dir)
+        if xarr is None:
+            raise RuntimeError(f"Error: failed to fetch MRMS file @{str(basepath)}")
+
+        qpe = xarr.unknown.sel(
+            latitude=slice(lat_max, lat_min),
+            longitude=slice(lon_min + 360, lon_max + 360)
+        ).values
+
+        # mm -> inch; MRMS flags missing/no-coverage cells with negative values
+        qpe_in = np.where(qpe >= 0, qpe / 25.4, np.nan)
+
+        row["available"] = bool(np.isfinite(qpe_in).any())
+        if row["available"]:
+            row["max_in"]   = float(np.nanmax(qpe_in))
+            row["mean_in"]  = float(np.nanmean(qpe_in))
+            row["wet_frac"] = float(np.nanmean(qpe_in >= wet_thresh))
+    finally:
+        shutil.rmtree(to_dir, ignore_errors=True)
+
+    return row
+
+
+class RainDayScreen:
+
+    _INDEX_FP = "data/screening/rain_day_index.csv"
+
+    def __init__(
+            self,
+            index_fp: str = _INDEX_FP,
+            bounds: Tuple[float, float, float, float] = DEFAULT_BOUNDS,
+            wet_thresh: float = DEFAULT_WET_THRESH,
+        ):
+        self.index_fp   = Path(index_fp)
+        self.bounds     = bounds
+        self.wet_thresh = wet_thresh
+        self._index: pd.DataFrame | None = None
+
+    def load_index(self) -> pd.DataFrame:
+        """
+        Returns
+        ---
+        - A ``pd.DataFrame`` indexed by ``day`` (``datetime64``) with ``available``, ``max_in``, ``mean_in``, ``wet_frac``
+        """
+
+        if self._index is not None:
+            return self._index
+
+        if self.index_fp.is_file():
+            df = pd.read_csv(self.index_fp, parse_dates=["day"])
+        else:
+            df = pd.DataFrame({col: [] for col in _INDEX_COLUMNS})
+            df["day"] = pd.to_datetime(df["day"])
+
+        self._index = df.set_index("day").sort_index()
+        return self._index
+
+    def _save_index(self, df: pd.DataFrame) -> None:
+
+        os.makedirs(self.index_fp.parent, exist_ok=True)
+        tmp_fp = self.index_fp.with_name(f".{self.index_fp.name}.tmp")
+        df.reset_index().to_csv(tmp_fp, index=False, date_format="%Y-%m-%d")
+        os.replace(tmp_fp, self.index_fp)
+        self._index = df
+
+    def build(self, days: Sequence[datetime], max_workers: int | None = None, save_every: int = 32) -> pd.DataFrame:
+        """
+        **Timezone**: ``UTC``
+        Screen every day in ``days`` that is not already in the index; days are processed in parallel
+        and the index is checkpointed every ``save_every`` days.
+        """
+
+        index   = self.load_index()
+        missing = self.get_unscreened(days)
+        if not missing:
+            return index
+
+        rows = []
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = {executor.submit(_screen_day, day, self.bounds, self.wet_thresh): day for day in missing}
+            for future in tqdm(as_completed(futures), total=len(futures), desc="Screening days"):
+                try:
+                    rows.append(future.result())
+                except Exception as e:
+                    # transient errors (e.g., S3 timeouts) are not recorded, so the day is retried next run
+                    print(f"Error screening day: {futures[future]} | {e}")
+                if len(rows) >= save_every:
+                    index = self._merge(index, rows)
+                    rows  = []
+
+        return self._merge(index, rows)
+
+    def _merge(self, index: pd.DataFrame, rows: List[Dict]) -> pd.DataFrame:
+
+        if rows:
+            new   = pd.DataFrame(rows, columns=_INDEX_COLUMNS)
+            new["day"] = pd.to_datetime(new["day"])
+            index = pd.concat([index, new.set_index("day")])
+            index = index[~index.index.duplicated(keep="last")].sort_index()
+            index["available"] = index["available"].astype(bool)
+            self._save_index(index)
+        return index
+
+    def days_exceeding(self, thresh: float, start_time: datetime | None = None, end_time: datetime | None = None) -> List[datetime]:
+        """
+        **Timezone**: ``UTC``
+
+        Returns
+        ---
+        - Every screened day (in ``[start_time, end_time)``) whose regional 24H max exceeds ``thresh`` (in.)
+        """
+
+        index = self.load_index()
+        mask  = index["available"].astype(bool).to_numpy() & (index["max_in"].to_numpy(dtype=float) > thresh)
+        days  = index.index[mask]
+        if start_time is not None:
+            days = days[days >= pd.Timestamp(start_time)]
+        if end_time is not None:
+            days = days[days < pd.Timestamp(end_time)]
+        return [day.to_pydatetime() for day in days]
+
+    def get_unscreened(self, days: Sequence[datetime]) -> List[datetime]:
+        """
+        Days in ``days`` missing from the index (never screened, or screening failed; e.g., an S3 timeout).
+        """
+        known = set(self.load_index().index)
+        return [day for day in days if pd.Timestamp(day.date()) not in known]
+
+    def is_min_rain_day(self, dt: datetime, thresh: float) -> bool:
+        """
+        **Timezone**: ``UTC``
+        Screens ``dt`` on demand if it is not indexed yet; fetch errors propagate and nothing is recorded.
+        """
+
+        day   = pd.Timestamp(dt.date())
+        index = self.load_index()
+        if day not in index.index:
+            index = self._merge(index, [_screen_day(datetime(dt.year, dt.month, dt.day), self.bounds, self.wet_thresh)])
+
+        row = index.loc[day]
+        return bool(row["available"]) and float(row["max_in"]) > thresh
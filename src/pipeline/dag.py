@@ -0,0 +1,293 @@
+"""
+A small stage-graph runner.
+
+Each ``Stage`` is an explicit node: a function of ``(key, **upstream_outputs)`` with declared upstream
+stages and a declared output type. For every key (e.g., one UTC day) stages run in topological order;
+keys run concurrently, and each stage has its own concurrency limit (e.g., at most two downloads at once).
+
+Stage outputs are persisted per (stage, key) as artifacts, so a stage can be rerun on its own: forcing
+``align`` recomputes alignment from the cached ``fetch`` artifact instead of re-downloading. Every run
+produces a ``RunReport`` with the status and duration of each (key, stage).
+"""
+
+import os
+import time
+import json
+import pickle
+import threading
+import traceback
+import pandas as pd
+
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Sequence, Tuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+
+class SkipKey(Exception):
+    """
+    Raised by a stage to skip the remaining (downstream) stages for a key, e.g. a dry day.
+    """
+
+
+class StageStatus:
+
+    RAN     = "ran"
+    CACHED  = "cached"
+    SKIPPED = "skipped"
+    FAILED  = "failed"
+    BLOCKED = "blocked"
+
+
+def _dump_pickle(obj: Any, fp: Path) -> None:
+    with open(fp, "wb") as f:
+        pickle.dump(obj, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def _load_pickle(fp: Path) -> Any:
+    with open(fp, "rb") as f:
+        return pickle.load(f)
+
+
+class Stage:
+
+    def __init__(
+            self,
+            name: str,
+            func: Callable[..., Any],
+            inputs: Sequence[str] = (),
+            output_type: type | Tuple[type, ...] = object,
+            max_concurrency: int = 1,
+            cache: bool = True,
+            dump: Callable[[Any, Path], None] = _dump_pickle,
+            load: Callable[[Path], Any] = _load_pickle,
+            suffix: str = ".pkl",
+            path: Callable[[str], Path] | None = None,
+        ):
+        """
+        Args
+        ---
+        :func: ``func(key, **{input_name: upstream_output})`` -> ``output_type``
+        :inputs: names of upstream stages whose outputs are passed to ``func``
+        :max_concurrency: max number of keys running this stage at once
+        :cache: persist outputs as artifacts; cached artifacts are reused unless the stage is forced
+        :dump/load/suffix: artifact codec (defaults to pickle)
+        :path: ``path(key)`` -> artifact location, if it should live outside the artifact dir (e.g., a final output file)
+        """
+
+        self.name            = name
+        self.func            = func
+        self.inputs          = list(inputs)
+        self.output_type     = output_type
+        self.max_concurrency = max_concurrency
+        self.cache           = cache
+        self.dump            = dump
+        self.load            = load
+        self.suffix          = suffix
+        self.path            = path
+        self._semaphore      = threading.BoundedSemaphore(max_concurrency)
+
+    def __repr__(self) -> str:
+        return f"Stage({self.name!r}, inputs={self.inputs})"
+
+
+class ArtifactStore:
+
+    def __init__(self, root: str):
+        self.root = Path(root)
+
+    def get_path(self, stage: Stage, key: str) -> Path:
+        if stage.path is not None:
+            return Path(stage.path(key))
+        return self.root / stage.name / f"{key}{stage.suffix}"
+
+    def exists(self, stage: Stage, key: str) -> bool:
+        return self.get_path(stage, key).is_file()
+
+    def load(self, stage: Stage, key: str) -> Any:
+        return stage.load(self.get_path(stage, key))
+
+    def save(self, stage: Stage, key: str, obj: Any) -> None:
+        fp = self.get_path(stage, key)
+        os.makedirs(fp.parent, exist_ok=True)
+        tmp_fp = fp.with_name(f".{fp.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        stage.dump(obj, tmp_fp)
+        os.replace(tmp_fp, fp)
+
+
+class RunReport:
+
+    def __init__(self):
+        self.records: List[Dict] = []
+        self._lock = threading.Lock()
+        self.start = time.time()
+        self.end: float | None = None
+
+    def add(self, key: str, stage: str, status: str, seconds: float = 0.0, error: str | None = None) -> None:
+        with self._lock:
+            self.records.append({"key": key, "stage": stage, "status": status, "seconds": seconds, "error": error})
+
+    def extend(self, other: "RunReport") -> None:
+        with self._lock:
+            self.records.extend(other.records)
+
+    def failed_keys(self) -> List[str]:
+        return sorted({r["key"] for r in self.records if r["status"] == StageStatus.FAILED})
+
+    def to_frame(self) -> pd.DataFrame:
+        return pd.DataFrame(self.records, columns=["key", "stage", "status", "seconds", "error"])
+
+    def summary(self) -> pd.DataFrame:
+        """
+        Returns
+        ---
+        - Per-stage counts of each status, plus total and mean seconds spent running.
+        """
+        df = self.to_frame()
+        if len(df) == 0:
+            return df
+        counts  = df.pivot_table(index="stage", columns="status", values="key", aggfunc="count", fill_value=0)
+        ran     = df[df["status"] == StageStatus.RAN].groupby("stage")["seconds"]
+        counts["total_s"] = ran.sum()
+        counts["mean_s"]  = ran.mean()
+        return counts.fillna(0.0)
+
+    def save(self, fp: str) -> None:
+        os.makedirs(Path(fp).parent, exist_ok=True)
+        with open(fp, "w") as f:
+            json.dump({"start": self.start, "end": self.end, "records": self.records}, f, indent=2)
+
+
+class PipelineRunner:
+
+    def __init__(self, stages: Sequence[Stage], artifact_dir: str, max_workers: int = 4):
+
+        self.stages       = {stage.name: stage for stage in stages}
+        self.artifacts    = ArtifactStore(artifact_dir)
+        self.max_workers  = max_workers
+        self.order        = self._toposort()
+
+    def _toposort(self) -> List[str]:
+
+        for stage in self.stages.values():
+            for name in stage.inputs:
+                if name not in self.stages:
+                    raise ValueError(f"Error: stage '{stage.name}' depends on unknown stage '{name}'")
+
+        order, state = [], {}
+
+        def _visit(name: str):
+            if state.get(name) == "done":
+                return
+            if state.get(name) == "visiting":
+                raise ValueError(f"Error: cycle detected at stage '{name}'")
+            state[name] = "visiting"
+            for dep in self.stages[name].inputs:
+                _visit(dep)
+            state[name] = "done"
+            order.append(name)
+
+        for name in self.stages:
+            _visit(name)
+        return order
+
+    def _get_required(self, targets: Sequence[str] | None) -> List[str]:
+        """
+        ``targets`` and all of their ancestors, in topological order.
+        """
+        if not targets:
+            return list(self.order)
+        required = set()
+        stack    = list(targets)
+        while stack:
+            name = stack.pop()
+            if name in required: continue
+            required.add(name)
+            stack.extend(self.stages[name].inputs)
+        return [name for name in self.order if name in required]
+
+    def _run_key(self, key: str, required: List[str], force: set, report: RunReport) -> None:
+
+        outputs: Dict[str, Any] = {}
+        for name in required:
+
+            stage = self.stages[name]
+
+            # a forced stage invalidates everything downstream of it
+            forced = name in force or any(dep in force for dep in stage.inputs)
+            if forced:
+                force.add(name)
+
+            if stage.cache and not forced and self.artifacts.exists(stage, key):
+                # lazily load: only if a downstream stage needs it
+                outputs[name] = _Lazy(self.artifacts, stage, key)
+                report.add(key, name, StageStatus.CACHED)
+                continue
+
+            kwargs = {dep: _resolve(outputs[dep]) for dep in stage.inputs}
+
+            t0 = time.time()
+            try:
+                with stage._semaphore:
+                    # time spent running, not waiting for a slot
+                    t0     = time.time()
+                    output = stage.func(key, **kwargs)
+            except SkipKey as e:
+                report.add(key, name, StageStatus.SKIPPED, time.time() - t0, str(e) or None)
+                for rest in required[required.index(name) + 1:]:
+                    report.add(key, rest, StageStatus.SKIPPED)
+                return
+            except Exception:
+                report.add(key, name, StageStatus.FAILED, time.time() - t0, traceback.format_exc())
+                for rest in required[required.index(name) + 1:]:
+                    report.add(key, rest, StageStatus.BLOCKED)
+                return
+
+            if not isinstance(output, stage.output_type):
+                report.add(key, name, StageStatus.FAILED, time.time() - t0, f"TypeError: stage '{name}' returned {type(output).__name__}, expected {stage.output_type}")
+                for rest in required[required.index(name) + 1:]:
+                    report.add(key, rest, StageStatus.BLOCKED)
+                return
+
+            if stage.cache:
+                self.artifacts.save(stage, key, output)
+
+            outputs[name] = output
+            report.add(key, name, StageStatus.RAN, time.time() - t0)
+
+    def run(self, keys: Sequence[str], targets: Sequence[str] | None = None, force: Sequence[str] = ()) -> RunReport:
+        """
+        Args
+        ---
+        :keys: e.g., one ``str`` per UTC day
+        :targets: only run these stages (and whatever they need); default: every stage
+        :force: recompute these stages (and everything downstream) even if artifacts exist
+
+        Returns
+        ---
+        - A ``RunReport``
+        """
+
+        required = self._get_required(targets)
+        report   = RunReport()
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = [executor.submit(self._run_key, str(key), required, set(force), report) for key in keys]
+            for future in as_completed(futures):
+                future.result()
+
+        report.end = time.time()
+        return report
+
+
+class _Lazy:
+
+    def __init__(self, artifacts: ArtifactStore, stage: Stage, key: str):
+        self.artifacts = artifacts
+        self.stage     = stage
+        self.key       = key
+
+
+def _resolve(obj: Any) -> Any:
+    if isinstance(obj, _Lazy):
+        return obj.artifacts.load(obj.stage, obj.key)
+    return obj
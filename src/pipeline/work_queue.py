@@ -0,0 +1,224 @@
+"""
+A small task queue backed by a single SQLite file; no external services.
+
+Several processes (or machines sharing a filesystem with working POSIX locks) can drain the same
+queue concurrently:
+
+- ``lease``: atomically claims one pending task (or one whose lease expired, e.g. after a crash)
+- ``lease_batch``: the same, for up to ``n`` tasks at once
+- ``heartbeat``: extends the lease of a long-running task
+- ``complete``/``fail``: release the task; failed tasks are retried until ``max_retries`` attempts
+"""
+
+import time
+import sqlite3
+import threading
+
+from pathlib import Path
+from datetime import timedelta
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, List
+
+
+class TaskStatus:
+
+    PENDING   = "pending"
+    LEASED    = "leased"
+    DONE      = "done"
+    FAILED    = "failed"
+
+
+class Task:
+
+    def __init__(self, task_id: str, attempts: int, worker_id: str):
+        self.task_id   = task_id
+        self.attempts  = attempts
+        self.worker_id = worker_id
+
+    def __repr__(self) -> str:
+        return f"Task({self.task_id!r}, attempts={self.attempts})"
+
+
+class WorkQueue:
+
+    _DB_FP = "data/queue/work_queue.sqlite"
+
+    def __init__(
+            self,
+            db_fp: str = _DB_FP,
+            lease_duration: timedelta = timedelta(minutes=30),
+            max_retries: int = 3,
+        ):
+
+        self.db_fp          = Path(db_fp)
+        self.lease_duration = lease_duration
+        self.max_retries    = max_retries
+
+        self.db_fp.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS tasks (
+                    task_id       TEXT PRIMARY KEY,
+                    status        TEXT NOT NULL DEFAULT 'pending',
+                    attempts      INTEGER NOT NULL DEFAULT 0,
+                    worker_id     TEXT,
+                    lease_expires REAL,
+                    last_error    TEXT,
+                    updated       REAL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS tasks_status ON tasks (status, task_id)")
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        """
+        Autocommit connection; callers open ``BEGIN IMMEDIATE`` transactions where atomicity matters.
+        """
+        conn = sqlite3.connect(str(self.db_fp), timeout=60, isolation_level=None)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def enqueue(self, task_ids: Iterable[str]) -> int:
+        """
+        Add tasks; ids already in the queue (in any state) are left untouched.
+
+        Returns
+        ---
+        - Number of newly added tasks.
+        """
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            before = conn.execute("SELECT COUNT(*) FROM tasks").fetchone()[0]
+            conn.executemany(
+                "INSERT OR IGNORE INTO tasks (task_id, updated) VALUES (?, ?)",
+                [(str(task_id), now) for task_id in task_ids],
+            )
+            after = conn.execute("SELECT COUNT(*) FROM tasks").fetchone()[0]
+            conn.execute("COMMIT")
+        return after - before
+
+    def lease(self, worker_id: str) -> Task | None:
+        """
+        Claim the next available task for ``worker_id``; expired leases are reclaimed.
+
+        Returns
+        ---
+        - A ``Task``, or ``None`` if nothing is available.
+        """
+        tasks = self.lease_batch(worker_id, 1)
+        return tasks[0] if tasks else None
+
+    def lease_batch(self, worker_id: str, n: int) -> List[Task]:
+        """
+        Claim up to ``n`` available tasks for ``worker_id`` in one transaction; expired leases are reclaimed.
+
+        Returns
+        ---
+        - A list of ``Task`` (empty if nothing is available).
+        """
+
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+
+            # expired leases that already used up their retries
+            conn.execute(
+                "UPDATE tasks SET status = ?, last_error = 'lease expired', updated = ? "
+                "WHERE status = ? AND lease_expires < ? AND attempts >= ?",
+                (TaskStatus.FAILED, now, TaskStatus.LEASED, now, self.max_retries),
+            )
+
+            rows = conn.execute(
+                "SELECT task_id, attempts FROM tasks "
+                "WHERE (status = ? OR (status = ? AND lease_expires < ?)) AND attempts < ? "
+                "ORDER BY task_id LIMIT ?",
+                (TaskStatus.PENDING, TaskStatus.LEASED, now, self.max_retries, n),
+            ).fetchall()
+
+            conn.executemany(
+                "UPDATE tasks SET status = ?, attempts = ?, worker_id = ?, lease_expires = ?, updated = ? WHERE task_id = ?",
+                [(TaskStatus.LEASED, attempts + 1, worker_id, now + self.lease_duration.total_seconds(), now, task_id) for task_id, attempts in rows],
+            )
+            conn.execute("COMMIT")
+
+        return [Task(task_id, attempts + 1, worker_id) for task_id, attempts in rows]
+
+    def _update_owned(self, task: Task, sql: str, params: tuple) -> bool:
+        """
+        Apply ``sql`` only if ``task`` is still leased by its worker (the lease may have been reclaimed).
+        """
+        with self._connect() as conn:
+            cur = conn.execute(
+                sql + " WHERE task_id = ? AND worker_id = ? AND status = ?",
+                params + (task.task_id, task.worker_id, TaskStatus.LEASED),
+            )
+            return cur.rowcount == 1
+
+    def heartbeat(self, task: Task) -> bool:
+        """
+        Extend ``task``'s lease. Returns ``False`` if the lease was lost.
+        """
+        now = time.time()
+        return self._update_owned(
+            task,
+            "UPDATE tasks SET lease_expires = ?, updated = ?",
+            (now + self.lease_duration.total_seconds(), now),
+        )
+
+    def complete(self, task: Task) -> bool:
+        return self._update_owned(task, "UPDATE tasks SET status = ?, updated = ?", (TaskStatus.DONE, time.time()))
+
+    def fail(self, task: Task, error: str) -> bool:
+        """
+        Release ``task`` for a retry, or mark it failed once it has used ``max_retries`` attempts.
+        """
+        status = TaskStatus.FAILED if task.attempts >= self.max_retries else TaskStatus.PENDING
+        return self._update_owned(
+            task,
+            "UPDATE tasks SET status = ?, last_error = ?, lease_expires = NULL, updated = ?",
+            (status, error[-2000:], time.time()),
+        )
+
+    def counts(self) -> Dict[str, int]:
+        with self._connect() as conn:
+            rows = conn.execute("SELECT status, COUNT(*) FROM tasks GROUP BY status").fetchall()
+        return {status: n for status, n in rows}
+
+    def reset_failed(self) -> int:
+        """
+        Give every failed task a fresh set of retries.
+        """
+        with self._connect() as conn:
+            cur = conn.execute(
+                "UPDATE tasks SET status = ?, attempts = 0, updated = ? WHERE status = ?",
+                (TaskStatus.PENDING, time.time(), TaskStatus.FAILED),
+            )
+            return cur.rowcount
+
+    @contextmanager
+    def keep_alive(self, *tasks: Task, every: timedelta | None = None) -> Iterator[None]:
+        """
+        Heartbeat ``tasks`` from a background thread while the body runs.
+        """
+
+        every = every or self.lease_duration / 3
+        stop  = threading.Event()
+
+        def _beat():
+            alive = list(tasks)
+            while alive and not stop.wait(every.total_seconds()):
+                for task in list(alive):
+                    if not self.heartbeat(task):
+                        print(f"Warning: lost lease on task: {task.task_id}")
+                        alive.remove(task)
+
+        thread = threading.Thread(target=_beat, daemon=True)
+        thread.start()
+        try:
+            yield
+        finally:
+            stop.set()
+            thread.join()
@@ -0,0 +1,48 @@
+"""
+Helpers for loading the aligned gauge/MRMS tables written by ``scripts/gather_all_events.py``.
+"""
+
+import pandas as pd
+
+from glob import glob
+from pathlib import Path
+
+
+EVENTS_DIR = "data/events"
+
+
+def load_aligned_events(events_dir: str = EVENTS_DIR) -> pd.DataFrame:
+    """
+    Concatenate every ``<events_dir>/<date>/ccrfcd_gauge_deltas_<date>.csv`` into one table.
+
+    Returns
+    ---
+    - A ``pd.DataFrame`` with the aligned columns (``start_time``, ``end_time``, ``station_id``, ...),
+      plus an ``event`` column holding the event directory name. Times are parsed as ``datetime64`` (UTC).
+    """
+
+    fps = sorted(glob(f"{events_dir}/*/ccrfcd_gauge_deltas_*.csv"))
+    dfs = []
+    for fp in fps:
+        df = pd.read_csv(fp, index_col=0)
+        df["event"] = Path(fp).parent.name
+        dfs.append(df)
+
+    if not dfs:
+        raise FileNotFoundError(f"Error: no aligned event tables found in {events_dir}")
+
+    df = pd.concat(dfs, ignore_index=True)
+    df["start_time"] = pd.to_datetime(df["start_time"])
+    df["end_time"]   = pd.to_datetime(df["end_time"])
+    return df
+
+
+def get_event_labels(df: pd.DataFrame, event_col: str = "event") -> pd.Series:
+    """
+    Returns
+    ---
+    - ``df[event_col]`` if present; otherwise the UTC day of ``end_time`` (one event per day, as in ``gather_all_events``).
+    """
+    if event_col in df.columns:
+        return df[event_col]
+    return pd.to_datetime(df["end_time"]).dt.floor("D").astype(str)
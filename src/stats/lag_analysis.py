@@ -0,0 +1,178 @@
+"""
+Batch gauge-vs-MRMS lag analysis.
+
+MRMS files are stamped every 2 minutes; gauges report every ~5 minutes with irregular gaps.
+Rather than re-aligning the whole dataset once per candidate lag, we lay the aligned series
+out as regular ``[panel, time]`` arrays (one panel per (event, station)) and compute the
+normalized cross-correlation for every lag of every panel with a handful of batched FFTs.
+
+Missing samples are handled exactly: every sum in the Pearson correlation is itself a
+cross-correlation of masked series, so ``r(lag)`` only uses pairs where both series are valid.
+"""
+
+import numpy as np
+import pandas as pd
+
+from datetime import timedelta
+from typing import Tuple
+
+from src.stats.aligned_data import get_event_labels, load_aligned_events
+
+
+DEFAULT_FREQ        = timedelta(minutes=2)
+DEFAULT_MAX_LAG     = timedelta(minutes=60)
+DEFAULT_MIN_OVERLAP = 10
+
+
+def build_panels(
+        df: pd.DataFrame,
+        freq: timedelta = DEFAULT_FREQ,
+        event_col: str = "event",
+        x_col: str = "gauge_qpe",
+        y_col: str = "mrms_qpe",
+    ) -> Tuple[pd.DataFrame, np.ndarray, np.ndarray]:
+    """
+    Scatter the aligned rows onto a regular time grid.
+
+    If ``event_col`` is missing, each UTC day of ``end_time`` is treated as one event.
+
+    Returns
+    ---
+    - ``keys``: ``pd.DataFrame`` [P] with ``event``, ``station_id``, ``t0`` (first grid time)
+    - ``x``: ``[P, T]`` array of ``x_col`` values (``NaN`` where missing)
+    - ``y``: ``[P, T]`` array of ``y_col`` values (``NaN`` where missing)
+    """
+
+    end_times = pd.to_datetime(df["end_time"])
+    events    = get_event_labels(df, event_col)
+
+    # one panel per (event, station)
+    keys_df   = pd.DataFrame({"event": events.to_numpy(), "station_id": df["station_id"].to_numpy()})
+    panel_idx = keys_df.groupby(["event", "station_id"], sort=False).ngroup().to_numpy()
+    keys      = keys_df.drop_duplicates().reset_index(drop=True)
+
+    # time index relative to the start of each event
+    event_t0 = end_times.groupby(events.to_numpy()).transform("min")
+    t_idx    = np.rint(((end_times - event_t0) / pd.Timedelta(freq)).to_numpy(dtype=float)).astype(np.int64)
+
+    P, T = len(keys), int(t_idx.max()) + 1 if len(t_idx) else 0
+    x    = np.full((P, T), np.nan)
+    y    = np.full((P, T), np.nan)
+    x[panel_idx, t_idx] = df[x_col].to_numpy(dtype=float)
+    y[panel_idx, t_idx] = df[y_col].to_numpy(dtype=float)
+
+    keys["t0"] = pd.Series(event_t0.to_numpy()).groupby(panel_idx).first().to_numpy()
+
+    return keys, x, y
+
+
+def masked_xcorr(x: np.ndarray, y: np.ndarray, max_lag: int, min_overlap: int = DEFAULT_MIN_OVERLAP) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Pearson correlation of ``x[t + lag]`` against ``y[t]`` for ``lag`` in ``[-max_lag, max_lag]`` (in steps),
+    for every row of ``x``/``y`` at once. Positive lags mean ``x`` trails ``y``.
+
+    Returns
+    ---
+    - ``lags``: ``[L]`` lags in steps
+    - ``r``: ``[P, L]`` correlations (``NaN`` where the overlap is < ``min_overlap`` or a series is constant)
+    - ``n``: ``[P, L]`` number of valid overlapping pairs
+    """
+
+    assert x.shape == y.shape, f"Error: shape mismatch: {x.shape} != {y.shape}"
+    P, T = x.shape
+
+    mx = ~np.isnan(x)
+    my = ~np.isnan(y)
+
+    # center each series for numerical stability
+    with np.errstate(invalid="ignore"):
+        xc = np.where(mx, x - np.nanmean(np.where(mx, x, np.nan), axis=1, keepdims=True), 0.0)
+        yc = np.where(my, y - np.nanmean(np.where(my, y, np.nan), axis=1, keepdims=True), 0.0)
+    xc = np.nan_to_num(xc)
+    yc = np.nan_to_num(yc)
+    mx = mx.astype(float)
+    my = my.astype(float)
+
+    # zero-pad to avoid circular wrap-around for |lag| <= max_lag
+    nfft = 1 << int(np.ceil(np.log2(max(T + max_lag, 1) + 1)))
+
+    def _fft(a: np.ndarray) -> np.ndarray:
+        return np.fft.rfft(a, n=nfft, axis=1)
+
+    X, X2, MX = _fft(xc), _fft(xc * xc), _fft(mx)
+    Y, Y2, MY = _fft(yc), _fft(yc * yc), _fft(my)
+
+    lags = np.arange(-max_lag, max_lag + 1)
+
+    def _xc(A: np.ndarray, B: np.ndarray) -> np.ndarray:
+        # sum_t a[t + lag] * b[t]
+        c = np.fft.irfft(A * np.conj(B), n=nfft, axis=1)
+        return c[:, lags % nfft]
+
+    n   = np.rint(_xc(MX, MY))
+    sx  = _xc(X,  MY)
+    sy  = _xc(MX, Y)
+    sxx = _xc(X2, MY)
+    syy = _xc(MX, Y2)
+    sxy = _xc(X,  Y)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        cov = sxy - sx * sy / n
+        vx  = sxx - sx * sx / n
+        vy  = syy - sy * sy / n
+        r   = cov / np.sqrt(vx * vy)
+
+    eps = 1e-12
+    r[(n < min_overlap) | (vx <= eps) | (vy <= eps)] = np.nan
+    return lags, np.clip(r, -1.0, 1.0), n.astype(np.int64)
+
+
+def fetch_lag_stats(
+        df: pd.DataFrame,
+        max_lag: timedelta = DEFAULT_MAX_LAG,
+        freq: timedelta = DEFAULT_FREQ,
+        event_col: str = "event",
+        min_overlap: int = DEFAULT_MIN_OVERLAP,
+    ) -> Tuple[pd.DataFrame, np.ndarray, np.ndarray]:
+    """
+    Gauge-vs-radar cross-correlation and best lag for every (event, station).
+
+    Args
+    ---
+    :df: aligned output of ``StatsClient.fetch_stats_for_range`` (or ``load_aligned_events``)
+    :max_lag: lags are evaluated in ``[-max_lag, max_lag]`` in steps of ``freq``
+
+    Returns
+    ---
+    - ``pd.DataFrame`` [P] with ``event``, ``station_id``, ``best_lag_min``, ``best_r``, ``r_lag0``, ``n_overlap``
+        - positive ``best_lag_min``: the gauge trails MRMS
+    - ``lags_min``: ``[L]`` lags (minutes)
+    - ``r``: ``[P, L]`` full correlation curves
+    """
+
+    keys, x, y = build_panels(df, freq=freq, event_col=event_col)
+
+    step_min     = pd.Timedelta(freq).total_seconds() / 60
+    max_lag_step = int(round(pd.Timedelta(max_lag) / pd.Timedelta(freq)))
+
+    lags, r, n = masked_xcorr(x, y, max_lag_step, min_overlap=min_overlap)
+
+    has_r    = ~np.all(np.isnan(r), axis=1)
+    best_idx = np.argmax(np.where(np.isnan(r), -np.inf, r), axis=1)
+    rows     = np.arange(len(keys))
+    zero_idx = max_lag_step
+
+    out = keys[["event", "station_id"]].copy()
+    out["best_lag_min"] = np.where(has_r, lags[best_idx] * step_min, np.nan)
+    out["best_r"]       = np.where(has_r, r[rows, best_idx], np.nan)
+    out["r_lag0"]       = r[:, zero_idx]
+    out["n_overlap"]    = n[rows, best_idx]
+
+    return out, lags * step_min, r
+
+
+if __name__ == "__main__":
+
+    df = load_aligned_events()
+    lag_df, lags_min, r = fetch_lag_stats(df)
+    print(lag_df.describe())
@@ -0,0 +1,331 @@
+"""
+Near-real-time (watch mode) gauge/MRMS alignment.
+
+Every ``poll_interval``:
+
+1. new ``RadarOnly_QPE_01H`` files are listed through a ``ListingBackend`` (S3, or a local directory
+   standing in for it) and each one is fetched, cropped to the CCRFCD region, and aligned on its own
+2. gauge csvs that changed since the last poll are re-read; if any did, the timesteps still inside
+   ``lookback`` are re-aligned against the updated gauges (their regional grids are kept in memory)
+3. rolling bias stats (the same metrics as ``src.stats.bootstrap``) over the last ``bias_window`` are updated
+
+Per-file latency (listing -> aligned) is recorded for every new MRMS file.
+"""
+
+import os
+import time
+import shutil
+import argparse
+import numpy as np
+import pandas as pd
+
+from glob import glob
+from pathlib import Path
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta
+from typing import Dict, List, Tuple
+
+from src.utils.mrms.mrms import MRMSAWSS3Client, MRMSDomain, MRMSFileName, MRMSPath
+from src.utils.mrms.products import MRMSProductsEnum
+from src.mrms_qpe.fetch_mrms_qpe import _process_single_file_regional
+from src.mrms_qpe.grids import QPEGrid
+from src.stats.bootstrap import METRICS, _event_sums, _metrics
+from src.stats.mrms_ccrfcd_stats_client import StatsClient
+
+
+class ListingBackend(ABC):
+    """
+    Where new MRMS files come from.
+    """
+
+    @abstractmethod
+    def list_day(self, product: str, day: datetime) -> List[str]:
+        """
+        Returns
+        ---
+        - Paths of every ``product`` file of the UTC ``day`` available right now.
+        """
+
+    @abstractmethod
+    def get(self, path: str, to_dir: str) -> str:
+        """
+        Returns
+        ---
+        - A local path to ``path``'s (zipped) contents.
+        """
+
+
+class S3Listing(ListingBackend):
+
+    def __init__(self, mrms_client: MRMSAWSS3Client | None = None):
+        self.mrms_client = mrms_client or MRMSAWSS3Client()
+
+    def list_day(self, product: str, day: datetime) -> List[str]:
+        basepath = MRMSPath(domain=MRMSDomain.CONUS, product=product, yyyymmdd=day.strftime("%Y%m%d"))
+        try:
+            # skip s3fs's listing cache; the day's prefix keeps growing
+            return self.mrms_client.s3_file_system.ls(str(basepath), refresh=True)
+        except FileNotFoundError:
+            return []
+
+    def get(self, path: str, to_dir: str) -> str:
+        # a single small object; a direct get avoids the overhead of spawning the aws cli
+        fp = str(Path(to_dir) / Path(path).name)
+        self.mrms_client.s3_file_system.get(path, fp)
+        return fp
+
+
+class LocalDirListing(ListingBackend):
+    """
+    Files under ``root`` laid out as ``<product>/<yyyymmdd>/MRMS_<product>_<yyyymmdd>-<hhmmss>.grib2.gz``
+    (or directly under ``<product>/``).
+    """
+
+    def __init__(self, root: str):
+        self.root = Path(root)
+
+    def list_day(self, product: str, day: datetime) -> List[str]:
+        yyyymmdd = day.strftime("%Y%m%d")
+        pattern  = f"MRMS_{product}_{yyyymmdd}-*.grib2.gz"
+        return sorted(set(
+            glob(str(self.root / product / yyyymmdd / pattern)) + glob(str(self.root / product / pattern))
+        ))
+
+    def get(self, path: str, to_dir: str) -> str:
+        return path
+
+
+class RollingBias:
+    """
+    Per-station and network-wide bias metrics over the valid times in the last ``window``.
+    Each valid time's contribution is kept separately, so a re-aligned timestep replaces (rather than double counts) its rows.
+    """
+
+    def __init__(self, window: timedelta = timedelta(hours=24)):
+        self.window = window
+        self.contributions: Dict[datetime, pd.DataFrame] = {}
+        self.totals = pd.DataFrame(columns=range(5), dtype=float)
+
+    def update(self, valid_time: datetime, station_ids: np.ndarray, gauge: np.ndarray, mrms: np.ndarray) -> None:
+
+        # MRMS flags missing/no-coverage cells with negative values
+        valid = np.isfinite(gauge) & np.isfinite(mrms) & (mrms >= 0)
+        ids, inverse = np.unique(station_ids[valid], return_inverse=True)
+        sums = pd.DataFrame(_event_sums(gauge[valid], mrms[valid], inverse, len(ids)), index=ids)
+
+        if valid_time in self.contributions:
+            self.totals = self.totals.sub(self.contributions[valid_time], fill_value=0.0)
+        self.contributions[valid_time] = sums
+        self.totals = self.totals.add(sums, fill_value=0.0)
+
+        # evict timesteps that left the window
+        latest = max(self.contributions)
+        for old_time in [t for t in self.contributions if t <= latest - self.window]:
+            self.totals = self.totals.sub(self.contributions.pop(old_time), fill_value=0.0)
+
+    def to_frame(self) -> pd.DataFrame:
+        """
+        Returns
+        ---
+        - One row per station (plus ``station_id == -1`` for the whole network) with ``n`` and ``METRICS``
+        """
+
+        totals = self.totals[self.totals[0] > 0]
+        sums   = np.vstack([totals.to_numpy(), totals.to_numpy().sum(axis=0, keepdims=True)]) if len(totals) else np.zeros((1, 5))
+        df     = pd.DataFrame({"station_id": np.r_[totals.index.to_numpy(dtype=int), -1], "n": sums[:, 0].astype(int)})
+        for name, values in _metrics(sums).items():
+            df[name] = values
+        return df[["station_id", "n"] + METRICS]
+
+
+class LiveAligner:
+
+    _OUT_DIR = "data/live"
+
+    def __init__(
+            self,
+            listing: ListingBackend,
+            stats_client: StatsClient | None = None,
+            product: str = MRMSProductsEnum.RadarOnly_QPE_01H,
+            poll_interval: timedelta = timedelta(seconds=30),
+            lookback: timedelta = timedelta(hours=3),
+            bias_window: timedelta = timedelta(hours=24),
+            out_dir: str = _OUT_DIR,
+            to_dir: str = "__temp/live",
+        ):
+        """
+        Args
+        ---
+        :lookback: new files older than this are ignored; aligned rows are re-aligned on gauge updates until they are this old
+        :out_dir: ``aligned.csv`` (rows, appended once final), ``rolling_bias.csv`` (rewritten every poll), ``latency.csv`` (appended)
+        """
+
+        self.listing       = listing
+        self.stats_client  = stats_client or StatsClient()
+        self.product       = product
+        self.accumulation  = MRMSProductsEnum.get_accumulation(product)
+        self.poll_interval = poll_interval
+        self.lookback      = lookback
+        self.out_dir       = Path(out_dir)
+        self.to_dir        = Path(to_dir)
+        self.bias          = RollingBias(bias_window)
+
+        # grids of timesteps still inside ``lookback``; all share one ``GridCoords``
+        self.recent: Dict[datetime, QPEGrid] = {}
+        self.seen: set = set()
+
+        os.makedirs(self.out_dir, exist_ok=True)
+        os.makedirs(self.to_dir, exist_ok=True)
+
+    def _list_new(self, now: datetime) -> List[Tuple[datetime, str]]:
+        """
+        **Timezone**: ``UTC``
+        """
+
+        since     = now - self.lookback
+        self.seen = {t for t in self.seen if t > since}
+        days      = sorted({datetime(since.year, since.month, since.day), datetime(now.year, now.month, now.day)})
+
+        new = []
+        for day in days:
+            for path in self.listing.list_day(self.product, day):
+                valid_time = MRMSFileName(Path(path).name).datetime
+                if valid_time > since and valid_time not in self.seen:
+                    new.append((valid_time, path))
+        return sorted(new)
+
+    def _align(self, valid_times: List[datetime]) -> pd.DataFrame:
+
+        coords = self.recent[valid_times[0]].coords
+        stack  = np.stack([self.recent[t].to_mm() for t in valid_times])
+        df     = self.stats_client.align_regional_stack(
+            np.array(valid_times, dtype='datetime64[s]'), coords.lats, coords.lons, stack,
+            accumulation=self.accumulation, neighborhood_sizes=None,
+        )
+
+        for end_time, rows in df.groupby("end_time", sort=False):
+            self.bias.update(
+                datetime.fromisoformat(end_time),
+                rows["station_id"].to_numpy(),
+                rows["gauge_qpe"].to_numpy(dtype=float),
+                rows["mrms_qpe"].to_numpy(dtype=float),
+            )
+        return df
+
+    def _process_file(self, valid_time: datetime, path: str, listed_at: float) -> Dict:
+
+        t0       = time.time()
+        local_fp = self.listing.get(path, str(self.to_dir))
+        t1       = time.time()
+
+        work_dir = self.to_dir / valid_time.strftime("%Y%m%d-%H%M%S")
+        os.makedirs(work_dir, exist_ok=True)
+        try:
+            _, lats, lons, values = _process_single_file_regional(local_fp, str(work_dir), self.stats_client._get_region_bounds())
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+            if local_fp != path and os.path.isfile(local_fp):
+                os.remove(local_fp)
+        t2 = time.time()
+
+        self.recent[valid_time] = QPEGrid.from_mm(valid_time, values, lats, lons)
+        self._align([valid_time])
+        self.seen.add(valid_time)
+        t3 = time.time()
+
+        return {
+            "valid_time": str(valid_time),
+            "fetch_s": t1 - t0,
+            "decode_s": t2 - t1,
+            "align_s": t3 - t2,
+            "total_s": t3 - listed_at,
+            "data_age_s": (datetime.utcnow() - valid_time).total_seconds(),
+        }
+
+    def _finalize(self, now: datetime) -> None:
+        """
+        Append rows of timesteps that left ``lookback`` (no longer re-aligned) to ``aligned.csv``.
+        """
+
+        final = sorted(t for t in self.recent if t <= now - self.lookback)
+        if not final:
+            return
+
+        df = self._align(final)
+        fp = self.out_dir / "aligned.csv"
+        df.to_csv(fp, mode="a", header=not fp.is_file(), index=False)
+        for t in final:
+            del self.recent[t]
+
+    def _write_bias(self) -> None:
+        fp     = self.out_dir / "rolling_bias.csv"
+        tmp_fp = fp.with_name(f".{fp.name}.tmp")
+        self.bias.to_frame().to_csv(tmp_fp, index=False)
+        os.replace(tmp_fp, fp)
+
+    def step(self, now: datetime | None = None) -> pd.DataFrame:
+        """
+        **Timezone**: ``UTC``
+        One poll.
+
+        Returns
+        ---
+        - Latency report: one row per new MRMS file (``fetch_s``, ``decode_s``, ``align_s``, and ``total_s`` from listing to aligned)
+        """
+
+        now       = now or datetime.utcnow()
+        listed_at = time.time()
+        new       = self._list_new(now)
+
+        latencies = []
+        for valid_time, path in new:
+            try:
+                latencies.append(self._process_file(valid_time, path, listed_at))
+            except Exception as e:
+                # e.g., a file still being written; retried next poll
+                print(f"Error aligning MRMS file: {path} | {e}")
+
+        # gauge rows may arrive after the MRMS file; re-align everything still provisional
+        changed = self.stats_client.ccrfcd_client.refresh_gauge_data()
+        if changed and self.recent:
+            self._align(sorted(self.recent))
+
+        self._finalize(now)
+        self._write_bias()
+
+        report = pd.DataFrame(latencies, columns=["valid_time", "fetch_s", "decode_s", "align_s", "total_s", "data_age_s"])
+        if len(report):
+            fp = self.out_dir / "latency.csv"
+            report.to_csv(fp, mode="a", header=not fp.is_file(), index=False)
+        return report
+
+    def run(self, max_polls: int | None = None) -> None:
+
+        # read every gauge up front, so the first file's latency isn't dominated by csv parsing
+        empty = np.array([], dtype='datetime64[s]')
+        self.stats_client.ccrfcd_client._fetch_all_gauge_qpe_windows(empty, empty)
+
+        polls = 0
+        while max_polls is None or polls < max_polls:
+
+            t0     = time.time()
+            report = self.step()
+            polls += 1
+
+            if len(report):
+                print(f"aligned {len(report)} new file(s) | mean latency: {report['total_s'].mean():.2f}s | max: {report['total_s'].max():.2f}s")
+
+            time.sleep(max(self.poll_interval.total_seconds() - (time.time() - t0), 0.0))
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Align new MRMS 1H-QPE files with the CCRFCD gauges as they arrive.")
+    parser.add_argument("--local-dir", default=None, help="watch a local directory instead of the MRMS S3 bucket")
+    parser.add_argument("--poll-seconds", type=float, default=30.0)
+    parser.add_argument("--max-polls", type=int, default=None)
+    args = parser.parse_args()
+
+    listing = LocalDirListing(args.local_dir) if args.local_dir else S3Listing()
+    aligner = LiveAligner(listing, poll_interval=timedelta(seconds=args.poll_seconds))
+    aligner.run(max_polls=args.max_polls)
@@ -4,13 +4,17 @@ import numpy as np
 import pandas as pd
 
 from tqdm import tqdm
-from typing import List
+from typing import Dict, List, Sequence, Tuple
 from datetime import datetime, timedelta
 from concurrent.futures import ProcessPoolExecutor, as_completed
 
 from src.utils.mrms.products import MRMSProductsEnum
 from src.utils.ccrfcd.ccrfcd_client import CCRFCDClient
 from src.mrms_qpe.fetch_mrms_qpe import MRMSQPEClient
+from src.utils.mrms.mrms import MRMSDomain, MRMSFileName, MRMSPath
+from src.stats.stats_cache import StatsCache
+from src.mrms_qpe.grids import MM_PER_INCH, QPEGrid
+from src.stats.neighborhood import DEFAULT_WINDOW_SIZES, DEFAULT_PERCENTILE, sample_neighborhoods
 
 
 warnings.filterwarnings(
@@ -22,10 +26,39 @@ warnings.filterwarnings(
 
 class StatsClient:
     
-    def __init__(self):
+    def __init__(self, cache_dir: str = StatsCache._CACHE_DIR, gauge_qc: bool = False, interpolate: bool = False):
         
-        self.ccrfcd_client = CCRFCDClient()
+        self.ccrfcd_client = CCRFCDClient(gauge_qc=gauge_qc, interpolate=interpolate)
         self.mrms_client   = MRMSQPEClient()
+        self.cache         = StatsCache(self.ccrfcd_client, cache_dir=cache_dir)
+
+    def _crop_to_region(self, xarr: xarray.Dataset) -> xarray.Dataset:
+        """
+        Slice a CONUS MRMS grid to the CCRFCD region.
+        """
+        return xarr.sel(
+            latitude =slice(self.ccrfcd_client._LAT_MAX, self.ccrfcd_client._LAT_MIN),
+            longitude=slice(self.ccrfcd_client._LON_MIN + 360, self.ccrfcd_client._LON_MAX + 360)
+        )
+
+    @staticmethod
+    def _get_nearest_cell_indices(grid_lats: np.ndarray, grid_lons: np.ndarray, lats: np.ndarray, lons: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Returns
+        ---
+        - (row, col) indices of the nearest grid-cell to each (lat, lon) pair.
+        """
+        lat_indices = np.abs(grid_lats[:, None] - np.asarray(lats)).argmin(axis=0)
+        lon_indices = np.abs(grid_lons[:, None] - np.asarray(lons)).argmin(axis=0)
+        return lat_indices, lon_indices
+
+    @staticmethod
+    def _get_valid_time(xarr: xarray.Dataset) -> datetime:
+        """
+        **Timezone**: ``UTC``
+        """
+        secs = xarr.time.values.astype('datetime64[s]').astype('int64')
+        return datetime.utcfromtimestamp(secs)
 
     def _get_gauge_mrms_deltas(self, gpe_raw_vals: List[dict], xarr: xarray.Dataset) -> List[dict]:
         
@@ -35,29 +68,24 @@ class StatsClient:
         qpes        = [item["qpe"] for item in gpe_raw_vals]
 
         # slice to region to save time during search
-        _xarr = xarr.sel(
-            latitude =slice(self.ccrfcd_client._LAT_MAX, self.ccrfcd_client._LAT_MIN),
-            longitude=slice(self.ccrfcd_client._LON_MIN + 360, self.ccrfcd_client._LON_MAX + 360)
-        )
-
-        grid_lats = _xarr['latitude'].values
-        grid_lons = _xarr['longitude'].values
+        _xarr = self._crop_to_region(xarr)
 
-        # mm -> inch
-        qpe_values = _xarr['unknown'].values / 25.4
+        grid = QPEGrid.from_xarray(_xarr)
 
         lats = np.array(lats)
         lons = np.array(lons)
 
-        lat_indices = np.abs(grid_lats[:, None] - lats).argmin(axis=0)
-        lon_indices = np.abs(grid_lons[:, None] - lons).argmin(axis=0)
+        lat_indices, lon_indices = grid.coords.nearest_indices(lats, lons)
+
+        # mm -> inch; only at the gauge cells
+        qpe_values = grid.gather(lat_indices, lon_indices, units="in")
 
         # get closest MRMS grid cell; read QPE value
         deltas = []
         for i, station_id in enumerate(station_ids):
 
             gauge_qpe = qpes[i]
-            mrms_qpe  = qpe_values[lat_indices[i], lon_indices[i]]
+            mrms_qpe  = qpe_values[i]
             delta_qpe = gauge_qpe - float(mrms_qpe)
 
             # print(f"station id: {station_id} | delta: {delta_qpe}")
@@ -73,14 +101,16 @@ class StatsClient:
 
         return deltas
 
-    def _proc_gauge(self, xarr: xarray.Dataset) -> List[dict]:
-        
-        # get start_time from xarr
-        secs = xarr.time.values.astype('datetime64[s]').astype('int64')
+    def _proc_gauge(self, xarr: xarray.Dataset, accumulation: timedelta) -> List[dict]:
+        """
+        Args
+        ---
+        :accumulation: the product's accumulation period (``MRMSProductsEnum.get_accumulation``); the gauge window ends
+            at the MRMS valid time and spans the same period
+        """
 
-        # HACK:
-        mrms_end_time = datetime.utcfromtimestamp(secs)
-        mrms_start_time = mrms_end_time - timedelta(hours=1)
+        mrms_end_time   = self._get_valid_time(xarr)
+        mrms_start_time = mrms_end_time - accumulation
 
         # grab rain-gauge qpe
         gauge_qpes    = self.ccrfcd_client._fetch_all_gauge_qpe(mrms_start_time, mrms_end_time, disable_tqdm=True)
@@ -88,6 +118,218 @@ class StatsClient:
         deltas = self._get_gauge_mrms_deltas(gauge_qpes, xarr)
         return deltas, mrms_start_time, mrms_end_time
 
+    def _get_neighborhood_stats(
+            self,
+            xarrs: List[xarray.Dataset],
+            window_sizes: Sequence[int] = DEFAULT_WINDOW_SIZES,
+            percentile: float = DEFAULT_PERCENTILE,
+        ) -> pd.DataFrame:
+        """
+        Sample ``k x k`` MRMS neighborhoods around every gauge, for every timestep in ``xarrs``.
+        The regional stack is cropped once and reduced with strided views (see ``src.stats.neighborhood``).
+
+        Returns
+        ---
+        - A ``pd.DataFrame`` with ``end_time``, ``station_id`` and one column per (statistic, window size), in inches.
+        """
+
+        metadata = self.ccrfcd_client.metadata
+        metadata = metadata[metadata['station_id'].isin(self.ccrfcd_client.valid_station_ids)].dropna(subset=['lat', 'lon'])
+
+        station_ids = metadata['station_id'].astype(int).to_numpy()
+        lats        = metadata['lat'].to_numpy(dtype=float)
+        lons        = metadata['lon'].to_numpy(dtype=float) + 360
+
+        cropped   = [self._crop_to_region(xarr) for xarr in xarrs]
+        end_times = [str(self._get_valid_time(xarr)) for xarr in xarrs]
+
+        # [T, H, W] (mm)
+        stack = np.stack([_xarr['unknown'].values.astype(np.float32) for _xarr in cropped])
+
+        rows, cols = self._get_nearest_cell_indices(
+            cropped[0]['latitude'].values,
+            cropped[0]['longitude'].values,
+            lats,
+            lons,
+        )
+        stats = sample_neighborhoods(stack, rows, cols, window_sizes=window_sizes, percentile=percentile)
+
+        T, G    = stack.shape[0], len(station_ids)
+        df_dict = {
+            "end_time": np.repeat(end_times, G),
+            "station_id": np.tile(station_ids, T),
+        }
+        for name, values in stats.items():
+            # max/mean/percentiles scale with units; mm -> inch on the [T, G] results only
+            df_dict[name] = values.reshape(-1).astype(float) / MM_PER_INCH
+
+        return pd.DataFrame(df_dict)
+
+    def _get_region_bounds(self) -> Tuple[float, float, float, float]:
+        """
+        Returns
+        ---
+        - (lat_min, lat_max, lon_min, lon_max) of the CCRFCD region
+        """
+        c = self.ccrfcd_client
+        return (c._LAT_MIN, c._LAT_MAX, c._LON_MIN, c._LON_MAX)
+
+    def fetch_stats_for_products(
+            self,
+            start_time: datetime,
+            end_time: datetime,
+            mrms_products: Sequence[str],
+            del_tmps: bool = False,
+        ) -> pd.DataFrame:
+        """
+        **Timezone**: ``UTC``
+        Align several ``RadarOnly_QPE`` accumulations (e.g., 1H/3H/6H/12H/24H) with the rain-gauges in one pass.
+
+        - Listings for all products are fetched together, and every file is cropped to the CCRFCD region on decode.
+        - Gauge windows for every (product, valid time) are computed at once from shared prefix sums.
+
+        Args
+        ---
+        :mrms_products: list of ``MRMSProductsEnum`` products
+
+        Returns
+        ---
+        - One wide ``pd.DataFrame`` keyed by (``end_time``, ``station_id``) with ``lat``, ``lon``,
+          and a ``gauge_qpe_<dur>``/``mrms_qpe_<dur>`` column pair per product (e.g., ``gauge_qpe_06h``); inches.
+        """
+
+        assert start_time < end_time, f"Error: `start_time` >= `end_time`"
+
+        regional = self.mrms_client.fetch_radar_only_qpe_regional_batch(
+            mrms_products,
+            start_time,
+            end_time,
+            bounds=self._get_region_bounds(),
+            del_tmp_files=del_tmps,
+        )
+        if not regional:
+            return pd.DataFrame()
+
+        # one shared set of gauge windows for every (product, valid time)
+        products     = [product for product in mrms_products if product in regional]
+        window_ends  = np.concatenate([regional[product][0] for product in products])
+        window_durs  = np.concatenate([
+            np.full(len(regional[product][0]), np.timedelta64(MRMSProductsEnum.get_accumulation(product)), dtype='timedelta64[s]')
+            for product in products
+        ])
+        station_ids, lats, lons, gauge_qpe = self.ccrfcd_client._fetch_all_gauge_qpe_windows(window_ends - window_durs, window_ends)
+
+        dfs    = []
+        offset = 0
+        for product in products:
+
+            valid_times, grid_lats, grid_lons, stack = regional[product]
+            T, G = len(valid_times), len(station_ids)
+            tag  = MRMSProductsEnum.get_suffix(product).lower()
+
+            rows, cols = self._get_nearest_cell_indices(grid_lats, grid_lons, lats, lons)
+
+            # mm -> inch; only at the gauge cells
+            mrms_qpe = stack[:, rows, cols].astype(float) / MM_PER_INCH
+
+            dfs.append(pd.DataFrame({
+                "end_time": np.repeat(valid_times, G),
+                "station_id": np.tile(station_ids, T),
+                f"gauge_qpe_{tag}": gauge_qpe[offset:offset + T].reshape(-1),
+                f"mrms_qpe_{tag}": mrms_qpe.reshape(-1),
+            }).set_index(["end_time", "station_id"]))
+            offset += T
+
+        df = pd.concat(dfs, axis=1, join="outer").reset_index()
+        df = df.merge(pd.DataFrame({"station_id": station_ids, "lat": lats, "lon": lons}), on="station_id", how="left")
+
+        front = ["end_time", "station_id", "lat", "lon"]
+        df    = df[front + [col for col in df.columns if col not in front]]
+        return df.sort_values(["end_time", "station_id"]).reset_index(drop=True)
+
+    def align_regional_stack(
+            self,
+            valid_times: np.ndarray,
+            grid_lats: np.ndarray,
+            grid_lons: np.ndarray,
+            stack: np.ndarray,
+            accumulation: timedelta = timedelta(hours=1),
+            neighborhood_sizes: Sequence[int] | None = DEFAULT_WINDOW_SIZES,
+            neighborhood_percentile: float = DEFAULT_PERCENTILE,
+        ) -> pd.DataFrame:
+        """
+        **Timezone**: ``UTC``
+        Align an already-cropped regional stack (see ``MRMSQPEClient.fetch_radar_only_qpe_regional_batch``) with the rain-gauges.
+        No downloads happen here, so alignment can be rerun from a saved stack.
+
+        Args
+        ---
+        :stack: ``[T, H, W]`` QPE (mm) valid at ``valid_times``
+        :accumulation: accumulation period of the product (e.g., 1H)
+
+        Returns
+        ---
+        - A ``pd.DataFrame`` with the same columns as ``fetch_stats_for_range``
+        """
+
+        valid_times = np.asarray(valid_times, dtype='datetime64[s]')
+        start_times = valid_times - np.timedelta64(accumulation)
+        station_ids, lats, lons, gauge_qpe = self.ccrfcd_client._fetch_all_gauge_qpe_windows(start_times, valid_times)
+
+        T, G       = len(valid_times), len(station_ids)
+        rows, cols = self._get_nearest_cell_indices(grid_lats, grid_lons, lats, lons)
+
+        # [T, H, W] (mm); mm -> inch only at the gauge cells
+        stack    = np.asarray(stack, dtype=np.float32)
+        mrms_qpe = stack[:, rows, cols].astype(float) / MM_PER_INCH
+
+        df_dict = {
+            "start_time": np.repeat([str(t) for t in start_times.astype(datetime)], G),
+            "end_time": np.repeat([str(t) for t in valid_times.astype(datetime)], G),
+            "station_id": np.tile(station_ids, T),
+            "lat": np.tile(lats, T).astype(float),
+            "lon": np.tile(lons, T).astype(float),
+            "gauge_qpe": gauge_qpe.reshape(-1).astype(float),
+            "mrms_qpe": mrms_qpe.reshape(-1),
+        }
+        df_dict["delta_qpe"] = df_dict["gauge_qpe"] - df_dict["mrms_qpe"]
+
+        if neighborhood_sizes and T > 0:
+            stats = sample_neighborhoods(stack, rows, cols, window_sizes=neighborhood_sizes, percentile=neighborhood_percentile)
+            for name, values in stats.items():
+                df_dict[name] = values.reshape(-1).astype(float) / MM_PER_INCH
+
+        return self._sort_stats(pd.DataFrame(df_dict))
+
+    @staticmethod
+    def _sort_stats(df: pd.DataFrame) -> pd.DataFrame:
+        if len(df) == 0:
+            return df
+        return df.sort_values(["end_time", "station_id"]).reset_index(drop=True)
+
+    def _get_wanted_valid_times(self, mrms_product: str, end_time: datetime, fetch_full_day: bool) -> List[datetime]:
+        """
+        **Timezone**: ``UTC``
+        Valid times ``fetch_stats_for_range`` would align: every file of ``end_time``'s day, or the file nearest ``end_time``.
+        """
+
+        yyyymmdd = end_time.strftime("%Y%m%d")
+        paths    = self.cache.get_listing(mrms_product, yyyymmdd)
+        if paths is None:
+            basepath = MRMSPath(domain=MRMSDomain.CONUS, product=mrms_product, yyyymmdd=yyyymmdd)
+            try:
+                paths = self.mrms_client.mrms_client.ls(str(basepath))
+            except Exception:
+                return []
+            self.cache.put_listing(mrms_product, yyyymmdd, paths)
+
+        if not paths:
+            return []
+        if not fetch_full_day:
+            paths = [self.mrms_client._get_closest_file(paths, end_time)]
+
+        return sorted(MRMSFileName(MRMSPath.from_str(path).get_basename()).datetime for path in paths)
+
     def fetch_stats_for_range(
             self, 
             start_time: datetime, 
@@ -95,18 +337,32 @@ class StatsClient:
             mrms_product: MRMSProductsEnum, 
             timezone: str = "UTC",
             timedelta_interval: timedelta = None,
-            fetch_full_day: bool = False
+            fetch_full_day: bool = False,
+            neighborhood_sizes: Sequence[int] | None = DEFAULT_WINDOW_SIZES,
+            neighborhood_percentile: float = DEFAULT_PERCENTILE,
+            use_cache: bool = True,
+            to_dir: str = "__temp",
         ) -> pd.DataFrame: 
         """
         **Timezone**: ``UTC``
         TODO: rewrite to ONLY support batch proc.; this func is in shambles
+
+        Args
+        ---
+        :use_cache: reuse aligned per-timestep results from ``self.cache`` (see ``src.stats.stats_cache``)
+        - only valid times missing from the cache are aligned; a fully cached call skips downloads entirely
+        :to_dir: scratch dir for full-day downloads (use one per concurrent worker)
+        :neighborhood_sizes: add max/mean/percentile MRMS QPE over ``k x k`` windows around each gauge
+        - e.g., ``mrms_qpe_max_3x3``, ``mrms_qpe_mean_5x5``, ``mrms_qpe_p90_9x9``
+        - ``None`` to skip
         """
 
         assert start_time < end_time, f"Error: `start_time` >= `end_time`"
 
-        suffix = mrms_product.split("_")[-2]
+        suffix = MRMSProductsEnum.get_suffix(mrms_product)
         if suffix == "15M":
-            raise NotImplementedError(f"Error: invalid product: {mrms_product}")
+            step         = timedelta(minutes=15)
+            mrms_fetch_f = self.mrms_client.fetch_radar_only_qpe_15m
         elif suffix == "01H":
             step         = timedelta(hours=1)
             mrms_fetch_f = self.mrms_client.fetch_radar_only_qpe_1hr
@@ -115,7 +371,7 @@ class StatsClient:
         elif suffix == "03H":
             step         = timedelta(hours=3)
             mrms_fetch_f = self.mrms_client.fetch_radar_only_qpe_3hr
-        elif suffix == "6H":
+        elif suffix == "06H":
             step         = timedelta(hours=6)
             mrms_fetch_f = self.mrms_client.fetch_radar_only_qpe_6hr
         elif suffix == "12H":
@@ -125,7 +381,8 @@ class StatsClient:
             step         = timedelta(hours=24)
             mrms_fetch_f = self.mrms_client.fetch_radar_only_qpe_24hr
         elif suffix == "48H":
-            raise NotImplementedError(f"Error: invalid product: {mrms_product}")
+            step         = timedelta(hours=48)
+            mrms_fetch_f = self.mrms_client.fetch_radar_only_qpe_48hr
         else: 
             raise NotImplementedError(f"Error: invalid product: {mrms_product}")
         
@@ -143,13 +400,33 @@ class StatsClient:
             "delta_qpe": [],
         }
 
-        mrms_qpe_xarrs = mrms_fetch_f(end_time, del_tmps=False)
-
-        # HACK:
-
+        cached: Dict[datetime, pd.DataFrame] = {}
+        if use_cache:
+            version      = self.cache.get_version(
+                neighborhood_sizes=tuple(neighborhood_sizes or ()),
+                neighborhood_percentile=neighborhood_percentile,
+                # only when on, so existing (non-QC) entries keep their version; covers QC threshold changes
+                **({"gauge_qc": self.ccrfcd_client.get_qc().fingerprint} if self.ccrfcd_client.gauge_qc else {}),
+                **({"interpolate": True} if self.ccrfcd_client.interpolate else {}),
+            )
+            wanted_times = self._get_wanted_valid_times(mrms_product, end_time, fetch_full_day)
+            cached       = self.cache.load(mrms_product, version, wanted_times)
+            if wanted_times and len(cached) == len(wanted_times):
+                return self._sort_stats(pd.concat(cached.values(), ignore_index=True))
+
+        if fetch_full_day:
+            mrms_qpe_xarrs = mrms_fetch_f(end_time, del_tmps=False, to_dir=to_dir) or []
+        else:
+            xarr           = mrms_fetch_f(end_time)
+            mrms_qpe_xarrs = [xarr] if xarr is not None else []
+
+        # only align timesteps we don't already have
+        mrms_qpe_xarrs = [xarr for xarr in mrms_qpe_xarrs if self._get_valid_time(xarr) not in cached]
+
+        accumulation = MRMSProductsEnum.get_accumulation(mrms_product)
         with tqdm(total=len(mrms_qpe_xarrs), desc="Fetching stats.") as pbar:
             with ProcessPoolExecutor() as ex:
-                futures = {ex.submit(self._proc_gauge, xarr): xarr for xarr in mrms_qpe_xarrs}
+                futures = {ex.submit(self._proc_gauge, xarr, accumulation): xarr for xarr in mrms_qpe_xarrs}
                 for future in as_completed(futures):   
                     deltas, curr_start_time, next_time_ccrfcd = future.result()
                     for item in deltas:
@@ -163,6 +440,16 @@ class StatsClient:
                         df_dict['delta_qpe'].append(float(item['delta_qpe']))
                     pbar.update()
 
+        df = pd.DataFrame(df_dict)
+
+        if neighborhood_sizes and len(mrms_qpe_xarrs) > 0:
+            nbhd_df = self._get_neighborhood_stats(mrms_qpe_xarrs, neighborhood_sizes, neighborhood_percentile)
+            df      = df.merge(nbhd_df, on=["end_time", "station_id"], how="left")
+
+        if use_cache:
+            self.cache.store(mrms_product, version, df, valid_times=[self._get_valid_time(xarr) for xarr in mrms_qpe_xarrs])
+            df = pd.concat(list(cached.values()) + [df], ignore_index=True)
+
         # TODO: parallelize
         # for xarr in tqdm(mrms_qpe_xarrs, total=len(mrms_qpe_xarrs), desc="Fetching stats: "):
             
@@ -224,7 +511,7 @@ class StatsClient:
         #         next_time       += step
         #         pbar.update()
 
-        return pd.DataFrame(df_dict)
+        return self._sort_stats(df)
 
 
 if __name__ == "__main__":
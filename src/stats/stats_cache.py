@@ -0,0 +1,193 @@
+"""
+On-disk memoization of aligned, per-timestep ``StatsClient`` results.
+
+Layout
+---
+- ``<cache_dir>/<product>/<data_version>/<params_version>/<yyyymmdd-hhmmss>.pkl``: aligned rows for one MRMS valid time
+- ``<cache_dir>/<product>/listings/<yyyymmdd>.json``: S3 listing of a (complete) MRMS day
+
+``data_version`` hashes the alignment code version, the station set, and the gauge store; re-ingesting gauge data
+(or editing the station metadata) therefore yields a new one. ``params_version`` hashes the alignment params
+(neighborhoods, QC, ...), so differently-configured callers share a data version without touching each other's entries.
+
+Nothing is deleted automatically; stale data versions are removed explicitly:
+
+```
+python -m src.stats.stats_cache --purge
+```
+"""
+
+import os
+import json
+import shutil
+import hashlib
+import argparse
+import pandas as pd
+
+from pathlib import Path
+from datetime import datetime, timedelta
+from typing import Dict, List, Sequence
+
+from src.utils.ccrfcd.ccrfcd_client import CCRFCDClient
+
+
+_VALID_TIME_FMT = "%Y%m%d-%H%M%S"
+_LISTINGS_DIR   = "listings"
+
+# bump whenever aligned values change for the same inputs (2: DST-correct gauge report times; 3: gauge window spans
+# the product's accumulation period, not 1 h)
+_ALIGNMENT_VERSION = 3
+
+
+def _hash(*parts) -> str:
+    h = hashlib.sha1()
+    for part in parts:
+        h.update(repr(part).encode())
+    return h.hexdigest()[:12]
+
+
+class StatsCache:
+
+    _CACHE_DIR = "data/cache/stats"
+
+    def __init__(self, ccrfcd_client: CCRFCDClient, cache_dir: str = _CACHE_DIR):
+        self.ccrfcd_client = ccrfcd_client
+        self.cache_dir     = Path(cache_dir)
+
+    def get_station_set_version(self) -> str:
+        """
+        Hash of the station metadata file and the set of valid station ids.
+        """
+        with open(self.ccrfcd_client._METADATA_FP, "rb") as f:
+            metadata_bytes = f.read()
+        return _hash(hashlib.sha1(metadata_bytes).hexdigest(), sorted(self.ccrfcd_client.valid_station_ids))
+
+    def get_gauge_store_version(self) -> str:
+        """
+        Fingerprint (name, size, mtime) of every gauge file; changes whenever gauge data is re-ingested.
+        """
+        entries = []
+        for fp in sorted(Path(self.ccrfcd_client._GAUGE_DATA_DIR).glob("*.csv")):
+            st = fp.stat()
+            entries.append((fp.name, st.st_size, st.st_mtime_ns))
+        return _hash(entries)
+
+    def get_data_version(self) -> str:
+        """
+        Hash of everything aligned values depend on besides the call's params: alignment version, station set, gauge store.
+        """
+        return _hash(_ALIGNMENT_VERSION, self.get_station_set_version(), self.get_gauge_store_version())
+
+    def get_version(self, **params) -> str:
+        """
+        Returns
+        ---
+        - A version tag ``<data_version>/<params_version>``; ``params`` are the alignment options.
+        """
+        return f"{self.get_data_version()}/{_hash(sorted(params.items()))}"
+
+    def _product_dir(self, product: str) -> Path:
+        return self.cache_dir / product
+
+    def _entry_fp(self, product: str, version: str, valid_time: datetime) -> Path:
+        return self._product_dir(product) / version / f"{valid_time.strftime(_VALID_TIME_FMT)}.pkl"
+
+    @staticmethod
+    def _atomic_write(fp: Path, write_f) -> None:
+        os.makedirs(fp.parent, exist_ok=True)
+        tmp_fp = fp.with_name(f".{fp.name}.{os.getpid()}.tmp")
+        write_f(tmp_fp)
+        os.replace(tmp_fp, fp)
+
+    def get_listing(self, product: str, yyyymmdd: str) -> List[str] | None:
+
+        fp = self._product_dir(product) / _LISTINGS_DIR / f"{yyyymmdd}.json"
+        if not fp.is_file():
+            return None
+        with open(fp, "r") as f:
+            return json.load(f)
+
+    def put_listing(self, product: str, yyyymmdd: str, paths: List[str]) -> None:
+        """
+        Only complete (i.e., past) UTC days are cached; today's listing is still growing.
+        """
+
+        day = datetime.strptime(yyyymmdd, "%Y%m%d")
+        if day + timedelta(days=2) > datetime.utcnow():
+            return
+
+        def _write(tmp_fp: Path):
+            with open(tmp_fp, "w") as f:
+                json.dump(paths, f)
+
+        self._atomic_write(self._product_dir(product) / _LISTINGS_DIR / f"{yyyymmdd}.json", _write)
+
+    def load(self, product: str, version: str, valid_times: Sequence[datetime]) -> Dict[datetime, pd.DataFrame]:
+        """
+        Returns
+        ---
+        - ``{valid_time: pd.DataFrame}`` for every cached valid time in ``valid_times``
+        """
+        hits = {}
+        for valid_time in valid_times:
+            fp = self._entry_fp(product, version, valid_time)
+            if fp.is_file():
+                hits[valid_time] = pd.read_pickle(fp)
+        return hits
+
+    def store(self, product: str, version: str, df: pd.DataFrame, valid_times: Sequence[datetime] = ()) -> None:
+        """
+        Split aligned rows by ``end_time`` and write one entry per valid time.
+        ``valid_times`` without any rows are stored as empty entries, so they also count as cached.
+        """
+
+        groups = dict(tuple(df.groupby("end_time", sort=False))) if len(df) else {}
+        for valid_time in valid_times:
+            groups.setdefault(str(valid_time), df.iloc[0:0])
+
+        for end_time, rows in groups.items():
+            fp = self._entry_fp(product, version, datetime.fromisoformat(str(end_time)))
+            self._atomic_write(fp, lambda tmp_fp, rows=rows: rows.reset_index(drop=True).to_pickle(tmp_fp))
+
+    def purge_stale(self, product: str | None = None) -> List[Path]:
+        """
+        Remove entries written under any data version other than the current one (e.g., before gauge data was
+        re-ingested), for ``product`` or every cached product. Entries for other alignment params are kept.
+
+        Don't run while workers with an older gauge store are still writing; their entries are removed with the rest.
+
+        Returns
+        ---
+        - The removed version dirs
+        """
+
+        data_version = self.get_data_version()
+        if product:
+            product_dirs = [self._product_dir(product)]
+        else:
+            product_dirs = sorted(self.cache_dir.iterdir()) if self.cache_dir.is_dir() else []
+
+        removed = []
+        for product_dir in product_dirs:
+            if not product_dir.is_dir():
+                continue
+            for entry in product_dir.iterdir():
+                if entry.is_dir() and entry.name not in (data_version, _LISTINGS_DIR):
+                    shutil.rmtree(entry, ignore_errors=True)
+                    removed.append(entry)
+        return removed
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Manage the aligned-stats cache.")
+    parser.add_argument("--cache_dir", type=str, default=StatsCache._CACHE_DIR)
+    parser.add_argument("--product", type=str, default=None, help="only this product (default: all)")
+    parser.add_argument("--purge", action="store_true", help="remove entries from stale data versions")
+    args = parser.parse_args()
+
+    cache = StatsCache(CCRFCDClient(), cache_dir=args.cache_dir)
+    print(f"data version: {cache.get_data_version()}")
+    if args.purge:
+        for entry in cache.purge_stale(args.product):
+            print(f"removed: {entry}")
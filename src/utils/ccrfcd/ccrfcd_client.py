@@ -29,6 +29,10 @@ from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Tuple
 from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 
+from src.utils.ccrfcd.spatial_index import SpatialIndex
+from src.utils.ccrfcd.gauge_qc import GaugeQC, get_fingerprint
+from src.utils.timezones import local_to_utc
+
 
 class Location:
 
@@ -52,13 +56,39 @@ class CCRFCDClient:
     # _DLAT = _DLON = 0.045
     _DLAT = _DLON = 0.02
 
-    def __init__(self, ):
+    # network curve: gauge ``g``'s report at epoch second ``t`` sits at ``g * _CURVE_SPAN + t``
+    _CURVE_SPAN = 2 ** 32
+
+    def __init__(self, gauge_qc: bool = False, interpolate: bool = False):
+        """
+        Args
+        ---
+        :gauge_qc: use QC'd gauge data (see ``src.utils.ccrfcd.gauge_qc``): flagged reports are dropped from the prefix sums,
+            and windows touching a day the gauge is unavailable are NaN (or skipped)
+        :interpolate: accumulate by linearly interpolating each gauge's (reset-corrected) cumulative curve at the exact
+            window edges, instead of summing the whole reports that fall inside the window
+        """
 
         self.metadata                            = pd.read_csv(CCRFCDClient._METADATA_FP)
         self.valid_station_ids                   = self.metadata[self.metadata['station_id'] > 0]['station_id'].astype(int).tolist()
         self.data_cache: Dict[int, pd.DataFrame] = {}
+        self.prefix_cache: Dict[int, Tuple[np.ndarray, np.ndarray]] = {}
+        self.file_stats: Dict[int, Tuple[int, int]] = {}
+        self.spatial_index: Optional[SpatialIndex]  = None
+        self.gauge_qc                               = gauge_qc
+        self.qc: Optional[GaugeQC]                  = None
+        self.interpolate                            = interpolate
+        self.curve_cache: Optional[Tuple[np.ndarray, ...]] = None
+
+        # station id -> metadata row, so location lookups don't scan the metadata
+        station_ids         = self.metadata['station_id']
+        self._metadata_rows = {int(_id): i for i, _id in zip(self.metadata.index, station_ids) if pd.notna(_id)}
+        self._id_counts     = station_ids.dropna().astype(int).value_counts().to_dict()
 
     def _get_gauge_df(self, gauge_id) -> pd.DataFrame | None:
+        """
+        A gauge's csv (newest -> oldest), indexed by report time in UTC; ``Date``/``Time`` stay in local time.
+        """
 
         if gauge_id in self.data_cache:
             return self.data_cache[gauge_id]
@@ -67,19 +97,155 @@ class CCRFCDClient:
         if not fp.is_file():
             return None
         
+        st = fp.stat()
         df = pd.read_csv(fp)
-        df['datetime'] = pd.to_datetime(df['Date'] + ' ' + df['Time'])
+        # local -> UTC once, here; csvs are stored newest -> oldest, so convert in logging order
+        local          = pd.to_datetime(df['Date'] + ' ' + df['Time']).values
+        df['datetime'] = local_to_utc(local[::-1])[::-1]
         df.set_index('datetime', inplace=True)
         self.data_cache[gauge_id] = df
+        self.file_stats[gauge_id] = (st.st_size, st.st_mtime_ns)
 
         return df
 
+    def refresh_gauge_data(self) -> List[int]:
+        """
+        Drop cached data for every gauge whose csv changed (e.g., newly scraped rows) since it was read;
+        the next lookup re-reads it.
+
+        Returns
+        ---
+        - ids of the refreshed gauges
+        """
+
+        changed = []
+        for gauge_id, stats in list(self.file_stats.items()):
+            fp = Path(self._GAUGE_DATA_DIR) / f"gagedata_{gauge_id}.csv"
+            st = fp.stat() if fp.is_file() else None
+            if st is None or (st.st_size, st.st_mtime_ns) != stats:
+                self.data_cache.pop(gauge_id, None)
+                self.prefix_cache.pop(gauge_id, None)
+                self.file_stats.pop(gauge_id, None)
+                changed.append(gauge_id)
+
+        # QC is network-wide (neighbor checks), so any change invalidates all of it
+        if changed:
+            self.qc          = None
+            self.curve_cache = None
+
+        return changed
+
+    def _get_gauge_prefix_sums(self, gauge_id: int) -> Tuple[np.ndarray, np.ndarray] | None:
+        """
+        **Time Zone: UTC**
+
+        Returns
+        ---
+        - ``times``: [N] ascending gauge report times (``datetime64[s]``, i.e., int64 epoch seconds)
+        - ``cum``: [N + 1] prefix sums of precip. increments (in.), with ``cum[0] = 0``
+            - precip. between ``start`` and ``end`` (inclusive) is ``cum[searchsorted(times, end, 'right')] - cum[searchsorted(times, start, 'left')]``
+        """
+
+        if gauge_id in self.prefix_cache:
+            return self.prefix_cache[gauge_id]
+
+        if self.gauge_qc:
+            prefix_sums = self.get_qc().get_prefix_sums(gauge_id)
+            if prefix_sums is not None:
+                self.prefix_cache[gauge_id] = prefix_sums
+            return prefix_sums
+
+        df = self._get_gauge_df(gauge_id)
+        if df is None:
+            return None
+
+        # csvs are stored newest -> oldest
+        times  = df.index.values.astype('datetime64[s]')[::-1]
+        values = df["Value"].to_numpy(dtype=float)[::-1]
+        order  = np.argsort(times, kind="stable")
+        times  = times[order]
+        values = values[order]
+
+        # one issue is that rain gauges occasionally reset (e.g., 3.0" -> 0.0")
+        # these resets (and descending values, generally should be ignored)
+        deltas = np.fmax(np.diff(values, prepend=values[:1]), 0.0)
+        cum    = np.concatenate([[0.0], np.cumsum(deltas)])
+
+        self.prefix_cache[gauge_id] = (times, cum)
+        return times, cum
+
+    def _get_network_curve(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        **Time Zone: UTC**
+        Every gauge's cumulative curve (``cum`` after each report, from the prefix sums) on one increasing axis, so a
+        single ``np.interp`` evaluates all gauges at once. Each gauge's curve is padded with flat end points at the edges
+        of its span, so lookups never leak into a neighboring gauge.
+
+        Returns
+        ---
+        - ``station_ids``, ``lats``, ``lons`` (0-360): [G]
+        - ``x``: gauge ``g``'s report times as ``g * _CURVE_SPAN + epoch seconds`` (``float64``; exact)
+        - ``y``: cumulative precip. (in.) at ``x``
+        """
+
+        if self.curve_cache is not None:
+            return self.curve_cache
+
+        station_ids, lats, lons, xs, ys = [], [], [], [], []
+        for _id in self.valid_station_ids:
+
+            prefix_sums = self._get_gauge_prefix_sums(_id)
+            if prefix_sums is None: continue
+
+            times, cum = prefix_sums
+            location   = self._get_station_location(_id)
+            base       = len(station_ids) * self._CURVE_SPAN
+            xs.append(np.concatenate([[base], base + times.astype(np.int64), [base + self._CURVE_SPAN - 1]]))
+            ys.append(np.concatenate([cum[1:2] if len(times) else [0.0], cum[1:], cum[-1:]]))
+            station_ids.append(_id)
+            lats.append(location.lat)
+            lons.append(location.lon + 360)
+
+        x = np.concatenate(xs).astype(np.float64) if xs else np.zeros(0)
+        y = np.concatenate(ys) if ys else np.zeros(0)
+        self.curve_cache = (np.array(station_ids), np.array(lats), np.array(lons), x, y)
+        return self.curve_cache
+
+    def _get_station_location(self, gauge_id: int) -> Location:
+
+        assert self._id_counts.get(gauge_id, 0) == 1, f"Error: no metadata available for `gauge_id`: {gauge_id}"
+        row = self.metadata.loc[self._metadata_rows[gauge_id]]
+        return Location(lat=float(row.lat), lon=float(row.lon))
+
+    def get_spatial_index(self) -> SpatialIndex:
+        """
+        KD-tree over every valid gauge with a location (built once); see ``src.utils.ccrfcd.spatial_index``.
+        """
+        if self.spatial_index is None:
+            valid              = self.metadata[self.metadata['station_id'] > 0]
+            self.spatial_index = SpatialIndex(valid['station_id'].astype(int).values, valid['lat'].values, valid['lon'].values)
+        return self.spatial_index
+
+    def get_qc(self) -> GaugeQC:
+        """
+        Network QC; loaded from ``GaugeQC._QC_FP``, or rebuilt (and saved) if the gauge data, metadata, or thresholds changed since.
+        """
+        if self.qc is None:
+            qc = GaugeQC.load()
+            if qc is None or qc.fingerprint != get_fingerprint(self):
+                qc = GaugeQC.build(self)
+                qc.save()
+            self.qc = qc
+        return self.qc
+
     def _fetch_gauge_qpe(self, 
                          gauge_id: int, 
                          start_time: datetime, 
                          end_time: datetime
                          ) -> Tuple[Location, float, int]:
         """
+        **Time Zone: UTC**
+
         Returns
         --- 
         - Cumlative precipitation (QPE) for a clark county rain gauge between ``start_time`` and ``end_time``.
@@ -87,48 +253,84 @@ class CCRFCDClient:
 
         assert start_time < end_time, f"Error: expected `start_time` < `end_time`"
 
-        df = self._get_gauge_df(gauge_id)
-        if df is None:
+        prefix_sums = self._get_gauge_prefix_sums(gauge_id)
+        if prefix_sums is None:
             return (None, None, None)
 
-        # one issue is that rain gauges occasionally reset (e.g., 3.0" -> 0.0")
-        # these resets (and descending values, generally should be ignored)
-        if 'delta' not in df.columns:
+        if self.gauge_qc and not self.get_qc().get_window_mask([gauge_id], np.datetime64(start_time, 's'), np.datetime64(end_time, 's'))[0]:
+            return (None, None, None)
 
-            delta_arr   = []
-            values = list(df["Value"])
+        # grab gauge location
+        location = self._get_station_location(gauge_id)
 
-            for i, val in enumerate(values): 
+        # get [start, end] bounds
+        times, cum = prefix_sums
+        if self.interpolate:
+            edges      = np.array([start_time, end_time], dtype='datetime64[s]').astype(np.int64)
+            cum_precip = np.diff(np.interp(edges, times.astype(np.int64), cum[1:]))[0] if len(times) else 0.0
+        else:
+            start_idx  = np.searchsorted(times, np.datetime64(start_time, 's'), side="left")
+            end_idx    = np.searchsorted(times, np.datetime64(end_time, 's'), side="right")
+            cum_precip = cum[end_idx] - cum[start_idx]
 
-                if i >= len(values) - 1: break
-                curr_val = val
-                prev_val = values[i + 1]
-                delta    = curr_val - prev_val
+        return location, float(cum_precip), gauge_id
 
-                # handle gauge resets; negative values
-                delta    = max(delta, 0.0)
-                delta_arr.append(delta)
+    def _fetch_all_gauge_qpe_windows(
+            self,
+            start_times: np.ndarray,
+            end_times: np.ndarray,
+            timezone="UTC",
+            interpolate: bool | None = None,
+        ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        **Time Zone: UTC**
+        Cummulative precipitation (in.) for every gauge over many ``[start_time, end_time]`` windows (inclusive) at once.
+        Each window costs two ``searchsorted`` lookups into the gauge's prefix sums or, with ``interpolate`` (defaults to
+        ``self.interpolate``), one ``np.interp`` of the network curve at both edges of every window, for every gauge.
 
-            delta_arr   = delta_arr + [0.0]
-            df['delta'] = delta_arr
+        Returns
+        ---
+        - ``station_ids``: [G]
+        - ``lats``: [G]
+        - ``lons``: [G] (degrees east, 0-360; matches MRMS grids)
+        - ``qpe``: [W, G]; NaN where the gauge is unavailable (``gauge_qc`` only)
+        """
 
-        # cumulative precip
-        cum_precip = None
+        start_times = np.asarray(start_times, dtype='datetime64[s]')
+        end_times   = np.asarray(end_times,   dtype='datetime64[s]')
+        assert start_times.shape == end_times.shape, f"Error: expected one `end_time` per `start_time`"
+        assert timezone == "UTC", f"Error: unsupported timezone: {timezone}; gauge times are stored in UTC"
 
-        # grab gauge location
-        location_row = self.metadata[self.metadata['station_id'] == gauge_id]
-        assert len(location_row) == 1, f"Error: no metadata available for `gauge_id`: {gauge_id}"
-        row          = location_row.iloc[0]
-        location     = Location(lat=float(row.lat), lon=float(row.lon))
+        if self.interpolate if interpolate is None else interpolate:
 
-        # get [start, end] bounds
-        # TODO: fix, we should just index between start and end times
-        # start_idx  = df.index.get_indexer([start_time], method='nearest')[0]
-        # end_idx    = df.index.get_indexer([end_time],   method='nearest')[0]
-        # cum_precip = df.iloc[end_idx:start_idx+1]['delta'].sum()
+            station_ids, lats, lons, x, y = self._get_network_curve()
+            base  = np.arange(len(station_ids), dtype=np.float64) * self._CURVE_SPAN
+            edges = np.clip(np.stack([start_times, end_times]).astype(np.int64), 1, self._CURVE_SPAN - 2).astype(np.float64)
+            # gauge-major query order: consecutive queries are close, so np.interp's search hint is nearly always right
+            cum   = np.interp(base.reshape((-1,) + (1,) * edges.ndim) + edges, x, y) if len(x) else np.zeros((0,) + edges.shape)
+            qpe   = np.moveaxis(cum[:, 1] - cum[:, 0], 0, -1)
 
-        cum_precip = df.loc[end_time:start_time]['delta'].sum()
-        return location, float(cum_precip), gauge_id
+        else:
+
+            station_ids, lats, lons, columns = [], [], [], []
+            for _id in self.valid_station_ids:
+
+                prefix_sums = self._get_gauge_prefix_sums(_id)
+                if prefix_sums is None: continue
+
+                times, cum = prefix_sums
+                location   = self._get_station_location(_id)
+                columns.append(cum[np.searchsorted(times, end_times, side="right")] - cum[np.searchsorted(times, start_times, side="left")])
+                station_ids.append(_id)
+                lats.append(location.lat)
+                lons.append(location.lon + 360)
+
+            station_ids, lats, lons = np.array(station_ids), np.array(lats), np.array(lons)
+            qpe = np.stack(columns, axis=-1) if columns else np.zeros(start_times.shape + (0,))
+
+        if self.gauge_qc:
+            qpe = np.where(self.get_qc().get_window_mask(station_ids, start_times, end_times), qpe, np.nan)
+        return station_ids, lats, lons, qpe
 
     def _fetch_all_gauge_qpe(self, start_time: datetime, end_time: datetime, timezone="UTC", disable_tqdm=False) -> List[Dict]:
         """
@@ -146,12 +348,13 @@ class CCRFCDClient:
         ```
         """
 
-        # UTC -> PDT
-        if timezone == "UTC":
-            start_time -= timedelta(hours=7)
-            end_time   -= timedelta(hours=7)
+        assert timezone == "UTC", f"Error: unsupported timezone: {timezone}; gauge times are stored in UTC"
         
         all_gauge_qpe = []
+
+        # build/load QC once, not once per worker
+        if self.gauge_qc:
+            self.get_qc()
         
         with ThreadPoolExecutor() as executor:
             
@@ -271,7 +474,7 @@ class CCRFCDClient:
 
     def fetch_ccrfcd_qpe_12hr(self, end_time: datetime) -> np.ndarray: 
         """
-        **Time Zone: PDT**
+        **Time Zone: UTC**
         - Fetch precip accumulation from ``end_time - 12:00`` to ``end_time``
 
         Returns
@@ -0,0 +1,473 @@
+"""
+Network-wide rain-gauge quality control.
+
+Run once at ingest (``python -m src.utils.ccrfcd.gauge_qc``) as vectorized passes over every gauge's reports,
+concatenated into flat arrays. Produces:
+
+- ``flags``: a bit mask (``FLAG_*``) on every report
+- ``available``: a ``[D, G]`` per-gauge/day availability mask (UTC calendar days)
+
+``CCRFCDClient(gauge_qc=True)`` builds its prefix sums from the cleaned reports and NaNs out every gauge window
+touching an unavailable day, so analyses don't re-implement these filters.
+
+Passes
+---
+1. ``DUPLICATE``: a repeated timestamp; only the last report is kept
+2. ``NON_ACCUMULATING``: the series goes down about as often as it goes up (not a cumulative rain counter)
+3. ``SPIKE``: a rise undone at the very next report
+4. ``DROPOUT``: a drop (or missing value) that recovers to the prior level within ``MAX_DROPOUT_ROWS`` reports
+5. ``RESET``: any remaining drop (counter reset); its increment is clamped to 0, as before
+6. ``JUMP``: an implausible increment (over ``MAX_INCREMENT``, faster than ``MAX_RATE``); its increment is zeroed
+7. ``GAP``: over ``MAX_GAP`` since the previous report; every day the gap touches is unavailable
+8. ``STUCK``: no rain on a day the gauge's neighbors (median) recorded at least ``STUCK_NEIGHBOR_MIN``
+9. ``OOS``: out of service, per the station metadata
+
+``DROP_FLAGS`` reports are removed before increments are taken; ``NON_ACCUMULATING``/``OOS`` gauges are never available.
+"""
+
+import hashlib
+import argparse
+import warnings
+import numpy as np
+import pandas as pd
+
+from tqdm import tqdm
+from pathlib import Path
+from typing import TYPE_CHECKING, List, Tuple
+
+from src.utils.ccrfcd.spatial_index import SpatialIndex
+
+if TYPE_CHECKING:
+    from src.utils.ccrfcd.ccrfcd_client import CCRFCDClient
+
+
+FLAG_DUPLICATE        = 1 << 0
+FLAG_NON_ACCUMULATING = 1 << 1
+FLAG_SPIKE            = 1 << 2
+FLAG_DROPOUT          = 1 << 3
+FLAG_RESET            = 1 << 4
+FLAG_JUMP             = 1 << 5
+FLAG_GAP              = 1 << 6
+FLAG_STUCK            = 1 << 7
+FLAG_OOS              = 1 << 8
+
+FLAG_NAMES = {
+    FLAG_DUPLICATE: "duplicate",
+    FLAG_NON_ACCUMULATING: "non_accumulating",
+    FLAG_SPIKE: "spike",
+    FLAG_DROPOUT: "dropout",
+    FLAG_RESET: "reset",
+    FLAG_JUMP: "jump",
+    FLAG_GAP: "gap",
+    FLAG_STUCK: "stuck",
+    FLAG_OOS: "oos",
+}
+
+# removed before increments are taken
+DROP_FLAGS = FLAG_DUPLICATE | FLAG_SPIKE | FLAG_DROPOUT
+# kept, with a zero increment
+ZERO_FLAGS = FLAG_RESET | FLAG_JUMP
+
+TOL                 = 0.005                     # in.; half the 0.01" reporting resolution
+MAX_REVERSAL_FRAC   = 0.3                       # of a gauge's value changes
+MIN_CHANGES         = 20
+MAX_DROPOUT_ROWS    = 3
+MAX_INCREMENT       = 1.0                       # in. per report
+MAX_RATE            = 3.0                       # in./hr
+MAX_GAP             = np.timedelta64(24, 'h')
+STUCK_RADIUS_KM     = 5.0
+STUCK_NEIGHBORS     = 5
+STUCK_MIN_NEIGHBORS = 2
+STUCK_NEIGHBOR_MIN  = 0.5                       # in./day
+
+_DAY_S = 86400
+
+# bump whenever saved results would change for the same inputs and thresholds (2: report times in UTC)
+QC_VERSION = 2
+
+
+def _shift(x: np.ndarray, gauge: np.ndarray, k: int, fill) -> np.ndarray:
+    """
+    ``x[i + k]`` where row ``i + k`` belongs to the same gauge as row ``i``, else ``fill``.
+    """
+    out = np.full(len(x), fill, dtype=np.result_type(x, np.asarray(fill)))
+    if abs(k) >= len(x):
+        return out
+    if k > 0:
+        out[:-k] = np.where(gauge[k:] == gauge[:-k], x[k:], fill)
+    else:
+        out[-k:] = np.where(gauge[:k] == gauge[-k:], x[:k], fill)
+    return out
+
+
+def _clean_increments(gauge: np.ndarray, values: np.ndarray, flags: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Returns
+    ---
+    - ``ix``: indices of the kept reports (no ``DROP_FLAGS``)
+    - ``deltas``: their precip. increments (in.); 0 for each gauge's first report, ``ZERO_FLAGS`` reports, and drops
+    """
+    ix     = np.flatnonzero((flags & DROP_FLAGS) == 0)
+    g, v   = gauge[ix], values[ix]
+    first  = np.r_[True, g[1:] != g[:-1]] if len(ix) else np.zeros(0, dtype=bool)
+    deltas = np.diff(v, prepend=v[:1])
+    deltas[first | ((flags[ix] & ZERO_FLAGS) != 0)] = 0.0
+    return ix, np.fmax(deltas, 0.0)
+
+
+def _flag_reports(gauge: np.ndarray, times: np.ndarray, values: np.ndarray, n_gauges: int) -> np.ndarray:
+    """
+    Passes 1-7 (see module docstring) over every report of every gauge at once.
+    """
+
+    flags = np.zeros(len(times), dtype=np.uint16)
+    t     = times.astype(np.int64)
+
+    # 1. keep the last report at each timestamp
+    flags[_shift(t, gauge, 1, np.iinfo(np.int64).min) == t] |= FLAG_DUPLICATE
+
+    ix   = np.flatnonzero(flags == 0)
+    g, v = gauge[ix], values[ix]
+    prev = _shift(v, g, -1, np.nan)
+
+    # 2. cumulative counters only go down on (rare) resets
+    with np.errstate(invalid="ignore"):
+        ups   = np.bincount(g, weights=v - prev > TOL, minlength=n_gauges)
+        downs = np.bincount(g, weights=v - prev < -TOL, minlength=n_gauges)
+    non_accumulating = (ups + downs >= MIN_CHANGES) & (downs > MAX_REVERSAL_FRAC * (ups + downs))
+    flags[non_accumulating[gauge]] |= FLAG_NON_ACCUMULATING
+
+    # 3. a rise that is undone at the next report
+    with np.errstate(invalid="ignore"):
+        spike = (v - prev > TOL) & (np.abs(_shift(v, g, 1, np.nan) - prev) <= TOL)
+
+        # 4. a drop (or missing value) that recovers within a few reports; shortest recovery first
+        dropped   = (v < prev - TOL) | np.isnan(v)
+        dropout   = np.zeros(len(ix), dtype=bool)
+        recovered = np.zeros(len(ix), dtype=bool)
+        for k in range(1, MAX_DROPOUT_ROWS + 1):
+            hit = dropped & ~recovered & (_shift(v, g, k, np.nan) >= prev - TOL)
+            for m in range(k):
+                dropout[np.flatnonzero(hit) + m] = True
+            recovered |= hit
+
+    flags[ix[spike]]   |= FLAG_SPIKE
+    flags[ix[dropout]] |= FLAG_DROPOUT
+
+    # 5-7. over the reports that are left
+    ix    = np.flatnonzero((flags & DROP_FLAGS) == 0)
+    g, v  = gauge[ix], values[ix]
+    delta = v - _shift(v, g, -1, np.nan)
+    dt    = t[ix] - _shift(t[ix], g, -1, np.iinfo(np.int64).max)
+    hours = np.where(dt > 0, dt, 0) / 3600
+
+    with np.errstate(invalid="ignore"):
+        flags[ix[delta < -TOL]] |= FLAG_RESET
+        flags[ix[(delta > MAX_INCREMENT) & (delta > MAX_RATE * hours)]] |= FLAG_JUMP
+    flags[ix[dt > MAX_GAP.astype('timedelta64[s]').astype(np.int64)]] |= FLAG_GAP
+
+    return flags
+
+
+def _flag_days(
+        gauge: np.ndarray,
+        times: np.ndarray,
+        values: np.ndarray,
+        flags: np.ndarray,
+        offsets: np.ndarray,
+        bad_gauges: np.ndarray,
+        lats: np.ndarray,
+        lons: np.ndarray,
+    ) -> Tuple[np.datetime64, np.ndarray, np.ndarray]:
+    """
+    Per-gauge/day availability and pass 8 (``STUCK``); see module docstring.
+
+    Returns
+    ---
+    - ``day0``: first day of the day axis
+    - ``available``: ``[D, G]``
+    - ``stuck``: ``[D, G]``
+    """
+
+    G = len(offsets) - 1
+    if len(times) == 0:
+        return np.datetime64("1970-01-01", 'D'), np.zeros((0, G), dtype=bool), np.zeros((0, G), dtype=bool)
+
+    day0   = times.min().astype('datetime64[D]')
+    t      = times.astype(np.int64) - day0.astype('datetime64[s]').astype(np.int64)
+    D      = int(t.max() // _DAY_S) + 1
+    counts = np.diff(offsets)
+    has    = np.flatnonzero(counts > 0)
+
+    # covered: whole days between a gauge's first and last report
+    cover = np.zeros((D + 1, G), dtype=np.int32)
+    start = -(-t[offsets[:-1][has]] // _DAY_S)
+    end   = t[offsets[1:][has] - 1] // _DAY_S
+    ok    = start < end
+    np.add.at(cover, (start[ok], has[ok]), 1)
+    np.add.at(cover, (end[ok], has[ok]), -1)
+
+    # every day a gap touches, including the (partial) days it starts and ends on
+    kept = np.flatnonzero((flags & DROP_FLAGS) == 0)
+    pos  = np.flatnonzero(flags[kept] & FLAG_GAP)
+    gaps = np.zeros((D + 1, G), dtype=np.int32)
+    np.add.at(gaps, (t[kept[pos - 1]] // _DAY_S, gauge[kept[pos]]), 1)
+    np.add.at(gaps, (t[kept[pos]] // _DAY_S + 1, gauge[kept[pos]]), -1)
+
+    available = (np.cumsum(cover, axis=0)[:D] > 0) & (np.cumsum(gaps, axis=0)[:D] == 0)
+    available[:, bad_gauges] = False
+
+    # daily totals [D, G]: one searchsorted over (gauge, time) keys
+    ix, deltas = _clean_increments(gauge, values, flags)
+    cum        = np.concatenate([[0.0], np.cumsum(deltas)])
+    keys       = (gauge[ix].astype(np.int64) << 32) + t[ix]
+    bounds     = (np.arange(G, dtype=np.int64)[None, :] << 32) + np.arange(D + 1, dtype=np.int64)[:, None] * _DAY_S
+    totals     = np.diff(cum[np.searchsorted(keys, bounds, side="left")], axis=0)
+
+    # neighbors within STUCK_RADIUS_KM (excluding the gauge itself), as [G, K] column indices
+    neighbors = np.full((G, STUCK_NEIGHBORS + 1), -1, dtype=np.int64)
+    located   = np.flatnonzero(np.isfinite(lats) & np.isfinite(lons))
+    if len(located):
+        index    = SpatialIndex(located, lats[located], lons[located])
+        ids, _   = index.query_knn(lats[located], lons[located], k=STUCK_NEIGHBORS + 1, max_km=STUCK_RADIUS_KM)
+        neighbors[located] = np.where(ids == located[:, None], -1, ids)
+
+    valid  = (neighbors >= 0)[None] & available[:, neighbors]
+    nbr    = np.where(valid, totals[:, neighbors], np.nan)
+    with warnings.catch_warnings():
+        # days without any available neighbor -> NaN
+        warnings.simplefilter("ignore", category=RuntimeWarning)
+        median = np.nanmedian(nbr, axis=2)
+
+    with np.errstate(invalid="ignore"):
+        stuck = available & (totals <= TOL) & (valid.sum(axis=2) >= STUCK_MIN_NEIGHBORS) & (median >= STUCK_NEIGHBOR_MIN)
+
+    return day0, available & ~stuck, stuck
+
+
+def get_fingerprint(client: "CCRFCDClient") -> str:
+    """
+    Hash of the station metadata, every gauge file (name, size, mtime), and the QC thresholds.
+    """
+    h = hashlib.sha1()
+    h.update(Path(client._METADATA_FP).read_bytes())
+    for fp in sorted(Path(client._GAUGE_DATA_DIR).glob("*.csv")):
+        st = fp.stat()
+        h.update(repr((fp.name, st.st_size, st.st_mtime_ns)).encode())
+    h.update(repr((QC_VERSION, TOL, MAX_REVERSAL_FRAC, MIN_CHANGES, MAX_DROPOUT_ROWS, MAX_INCREMENT, MAX_RATE, MAX_GAP,
+                   STUCK_RADIUS_KM, STUCK_NEIGHBORS, STUCK_MIN_NEIGHBORS, STUCK_NEIGHBOR_MIN)).encode())
+    return h.hexdigest()[:12]
+
+
+class GaugeQC:
+
+    _QC_FP = "data/cache/gauge_qc.npz"
+
+    def __init__(
+            self,
+            station_ids: np.ndarray,
+            offsets: np.ndarray,
+            times: np.ndarray,
+            values: np.ndarray,
+            flags: np.ndarray,
+            day0: np.datetime64,
+            available: np.ndarray,
+            fingerprint: str = "",
+        ):
+        """
+        Args
+        ---
+        :station_ids: ``[G]``
+        :offsets: ``[G + 1]``; gauge ``g``'s reports are rows ``offsets[g]:offsets[g + 1]``, ascending in time
+        :times: ``[N]`` ``datetime64[s]`` (UTC)
+        :values: ``[N]`` raw cumulative values (in.)
+        :flags: ``[N]`` ``FLAG_*`` bit masks
+        :day0: first day of the ``available`` day axis
+        :available: ``[D, G]``
+        """
+        self.station_ids = np.asarray(station_ids, dtype=np.int64)
+        self.offsets     = np.asarray(offsets, dtype=np.int64)
+        self.times       = np.asarray(times, dtype='datetime64[s]')
+        self.values      = np.asarray(values, dtype=np.float64)
+        self.flags       = np.asarray(flags, dtype=np.uint16)
+        self.day0        = np.datetime64(day0, 'D')
+        self.available   = np.asarray(available, dtype=bool)
+        self.fingerprint = fingerprint
+
+        self._station_ix      = {int(_id): i for i, _id in enumerate(self.station_ids)}
+        self._unavailable_cum = None
+
+    @classmethod
+    def run(
+            cls,
+            station_ids: np.ndarray,
+            series: List[Tuple[np.ndarray, np.ndarray]],
+            oos: np.ndarray,
+            lats: np.ndarray,
+            lons: np.ndarray,
+            fingerprint: str = "",
+        ) -> "GaugeQC":
+        """
+        Args
+        ---
+        :series: per gauge, ``(times, values)`` sorted by time
+        :oos: ``[G]`` out-of-service per the metadata
+        """
+
+        counts  = np.array([len(times) for times, _ in series], dtype=np.int64)
+        offsets = np.concatenate([[0], np.cumsum(counts)])
+        times   = np.concatenate([np.asarray(times, dtype='datetime64[s]') for times, _ in series]) if series else np.array([], dtype='datetime64[s]')
+        values  = np.concatenate([np.asarray(values, dtype=np.float64) for _, values in series]) if series else np.array([], dtype=np.float64)
+        gauge   = np.repeat(np.arange(len(series)), counts)
+
+        flags       = _flag_reports(gauge, times, values, len(series))
+        oos         = np.asarray(oos, dtype=bool)
+        flags[oos[gauge]] |= FLAG_OOS
+
+        bad_gauges             = oos.copy()
+        bad_gauges[gauge[(flags & FLAG_NON_ACCUMULATING) != 0]] = True
+
+        day0, available, stuck = _flag_days(gauge, times, values, flags, offsets, bad_gauges, np.asarray(lats, dtype=np.float64), np.asarray(lons, dtype=np.float64))
+        if len(times):
+            row_day = (times.astype('datetime64[D]') - day0).astype(np.int64)
+            flags[stuck[row_day, gauge]] |= FLAG_STUCK
+
+        return cls(station_ids, offsets, times, values, flags, day0, available, fingerprint=fingerprint)
+
+    @classmethod
+    def build(cls, client: "CCRFCDClient") -> "GaugeQC":
+        """
+        QC every valid gauge with data.
+        """
+
+        station_ids, series, oos, lats, lons = [], [], [], [], []
+        for _id in tqdm(client.valid_station_ids, desc="Reading gauges"):
+
+            df = client._get_gauge_df(_id)
+            if df is None: continue
+
+            # csvs are stored newest -> oldest
+            times  = df.index.values.astype('datetime64[s]')[::-1]
+            values = df["Value"].to_numpy(dtype=float)[::-1]
+            order  = np.argsort(times, kind="stable")
+            row    = client.metadata.loc[client._metadata_rows[_id]]
+
+            station_ids.append(_id)
+            series.append((times[order], values[order]))
+            oos.append(bool(row.oos == True))
+            lats.append(float(row.lat))
+            lons.append(float(row.lon))
+
+        return cls.run(np.array(station_ids), series, np.array(oos, dtype=bool), np.array(lats), np.array(lons), fingerprint=get_fingerprint(client))
+
+    def save(self, fp: str = _QC_FP) -> None:
+        Path(fp).parent.mkdir(parents=True, exist_ok=True)
+        tmp_fp = Path(fp).with_name(Path(fp).name + ".tmp.npz")
+        np.savez_compressed(
+            tmp_fp,
+            station_ids=self.station_ids,
+            offsets=self.offsets,
+            times=self.times.astype(np.int64),
+            values=self.values,
+            flags=self.flags,
+            day0=self.day0.astype(np.int64),
+            available=self.available,
+            fingerprint=np.array(self.fingerprint),
+        )
+        tmp_fp.replace(fp)
+
+    @classmethod
+    def load(cls, fp: str = _QC_FP) -> "GaugeQC | None":
+        if not Path(fp).is_file():
+            return None
+        with np.load(fp) as npz:
+            return cls(
+                npz["station_ids"],
+                npz["offsets"],
+                npz["times"].astype('datetime64[s]'),
+                npz["values"],
+                npz["flags"],
+                np.datetime64(int(npz["day0"]), 'D'),
+                npz["available"],
+                fingerprint=str(npz["fingerprint"]),
+            )
+
+    def _get_slice(self, gauge_id: int) -> slice | None:
+        i = self._station_ix.get(int(gauge_id))
+        return None if i is None else slice(self.offsets[i], self.offsets[i + 1])
+
+    def get_flags(self, gauge_id: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray] | None:
+        """
+        Returns
+        ---
+        - (``times``, raw ``values``, ``flags``), every report of ``gauge_id``, ascending in time
+        """
+        s = self._get_slice(gauge_id)
+        return None if s is None else (self.times[s], self.values[s], self.flags[s])
+
+    def get_prefix_sums(self, gauge_id: int) -> Tuple[np.ndarray, np.ndarray] | None:
+        """
+        **Time Zone: UTC**
+        Same as ``CCRFCDClient._get_gauge_prefix_sums``, over the cleaned reports.
+        """
+        s = self._get_slice(gauge_id)
+        if s is None:
+            return None
+        flags      = self.flags[s]
+        ix, deltas = _clean_increments(np.zeros(len(flags), dtype=np.int64), self.values[s], flags)
+        return self.times[s][ix], np.concatenate([[0.0], np.cumsum(deltas)])
+
+    def get_window_mask(self, station_ids: np.ndarray, start_times: np.ndarray, end_times: np.ndarray) -> np.ndarray:
+        """
+        **Time Zone: UTC**
+
+        Returns
+        ---
+        - ``[W, G]``: whether each gauge is available on every day its ``[start_time, end_time]`` window touches
+        """
+
+        D, G = self.available.shape
+        cols = np.array([self._station_ix.get(int(_id), -1) for _id in station_ids], dtype=np.int64)
+        d0   = (np.asarray(start_times, dtype='datetime64[s]').astype('datetime64[D]') - self.day0).astype(np.int64)
+        d1   = (np.asarray(end_times, dtype='datetime64[s]').astype('datetime64[D]') - self.day0).astype(np.int64)
+        if D == 0 or len(cols) == 0:
+            return np.zeros(d0.shape + (len(cols),), dtype=bool)
+
+        # unavailable days per gauge, as prefix counts: one lookup per window end
+        if self._unavailable_cum is None:
+            self._unavailable_cum = np.concatenate([np.zeros((1, G), dtype=np.int32), np.cumsum(~self.available, axis=0, dtype=np.int32)])
+
+        inside = (d0 >= 0) & (d1 < D)
+        d0, d1 = np.clip(d0, 0, D - 1), np.clip(d1, 0, D - 1)
+        bad    = self._unavailable_cum[d1 + 1][..., np.maximum(cols, 0)] - self._unavailable_cum[d0][..., np.maximum(cols, 0)]
+        return inside[..., None] & (bad == 0) & (cols >= 0)
+
+    def summary(self) -> pd.DataFrame:
+        """
+        Returns
+        ---
+        - One row per gauge: ``station_id``, ``n_reports``, a count per flag, ``days_available``
+        """
+        counts = np.diff(self.offsets)
+        gauge  = np.repeat(np.arange(len(self.station_ids)), counts)
+        df     = pd.DataFrame({"station_id": self.station_ids, "n_reports": counts})
+        for flag, name in FLAG_NAMES.items():
+            df[name] = np.bincount(gauge[(self.flags & flag) != 0], minlength=len(self.station_ids))
+        df["days_available"] = self.available.sum(axis=0)
+        return df
+
+
+if __name__ == "__main__":
+
+    from src.utils.ccrfcd.ccrfcd_client import CCRFCDClient
+
+    parser = argparse.ArgumentParser(description="Run gauge QC over the whole network and save flags + availability masks.")
+    parser.add_argument("--out-fp", default=GaugeQC._QC_FP)
+    args = parser.parse_args()
+
+    qc = GaugeQC.build(CCRFCDClient())
+    qc.save(args.out_fp)
+
+    summary = qc.summary()
+    print(summary[list(FLAG_NAMES.values())].sum().to_string())
+    print(f"{len(qc.station_ids)} gauges, {int(qc.available.sum())} available gauge-days -> {args.out_fp}")
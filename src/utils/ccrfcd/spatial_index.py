@@ -0,0 +1,124 @@
+"""
+Spatial index over point locations (rain gauges, ASOS stations, ...).
+
+Points are stored as unit vectors on the sphere in a ``scipy.spatial.cKDTree``: Euclidean (chord)
+distance is monotonic in great-circle distance, so k-nearest and radius queries are exact
+(``d = 2 R asin(chord / 2)``) with no projection distortion, and every query is vectorized over
+thousands of points.
+
+```python
+index          = ccrfcd_client.get_spatial_index()
+ids, dist_km   = index.query_knn(lats, lons, k=5)
+offsets, ids, _ = index.query_radius(lats, lons, radius_km=10.0)   # CSR: ids[offsets[i]:offsets[i + 1]]
+```
+"""
+
+import numpy as np
+import pandas as pd
+
+from scipy.spatial import cKDTree
+from typing import Tuple
+
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+def to_unit_xyz(lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+    """
+    ``[N, 3]`` unit vectors; ``lons`` in degrees east (-180-180 or 0-360).
+    """
+    lat = np.radians(np.asarray(lats, dtype=np.float64))
+    lon = np.radians(np.asarray(lons, dtype=np.float64))
+    return np.stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)], axis=-1).reshape(-1, 3)
+
+
+def km_to_chord(km: float | np.ndarray) -> np.ndarray:
+    return 2.0 * np.sin(np.minimum(np.asarray(km, dtype=np.float64) / EARTH_RADIUS_KM, np.pi) / 2.0)
+
+
+def chord_to_km(chord: float | np.ndarray) -> np.ndarray:
+    return 2.0 * EARTH_RADIUS_KM * np.arcsin(np.clip(np.asarray(chord, dtype=np.float64) / 2.0, 0.0, 1.0))
+
+
+class SpatialIndex:
+
+    def __init__(self, ids: np.ndarray, lats: np.ndarray, lons: np.ndarray):
+        """
+        Points with a missing (NaN) location are dropped.
+        """
+        ids, lats, lons = np.asarray(ids), np.asarray(lats, dtype=np.float64), np.asarray(lons, dtype=np.float64)
+        valid     = np.isfinite(lats) & np.isfinite(lons)
+        self.ids  = ids[valid]
+        self.lats = lats[valid]
+        self.lons = lons[valid]
+        self.tree = cKDTree(to_unit_xyz(self.lats, self.lons))
+
+        # returned where a query has no match
+        self.missing_id = -1 if self.ids.dtype.kind in "iuf" else ""
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def query_knn(self, lats: np.ndarray, lons: np.ndarray, k: int = 1, max_km: float = np.inf) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Returns
+        ---
+        - ``ids``: ``[N, k]`` nearest points, closest first (``missing_id`` (-1, or "" for string ids) past ``max_km`` or the index size)
+        - ``dist_km``: ``[N, k]`` great-circle distances (``inf`` where there is no match)
+        """
+
+        chord, idx = self.tree.query(to_unit_xyz(lats, lons), k=k, distance_upper_bound=km_to_chord(max_km) if np.isfinite(max_km) else np.inf)
+        chord, idx = np.asarray(chord).reshape(-1, k), np.asarray(idx).reshape(-1, k)
+
+        found = idx < len(self.ids)
+        ids   = np.where(found, self.ids[np.minimum(idx, len(self.ids) - 1)], self.missing_id) if len(self.ids) else np.full(idx.shape, self.missing_id)
+        return ids, np.where(found, chord_to_km(np.where(found, chord, 0.0)), np.inf)
+
+    def query_radius(self, lats: np.ndarray, lons: np.ndarray, radius_km: float) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Every point within ``radius_km`` of each query point.
+
+        Returns
+        ---
+        - CSR-style ``(offsets [N + 1], ids, dist_km)``; query ``i``'s matches are ``ids[offsets[i]:offsets[i + 1]]``, closest first
+        """
+
+        xyz     = to_unit_xyz(lats, lons)
+        matches = self.tree.query_ball_point(xyz, r=km_to_chord(radius_km), return_sorted=False)
+        counts  = np.fromiter((len(m) for m in matches), dtype=np.int64, count=len(matches))
+        offsets = np.concatenate([[0], np.cumsum(counts)])
+        idx     = np.fromiter((j for m in matches for j in m), dtype=np.int64, count=int(offsets[-1]))
+
+        # distances in one pass, then sort within each query's run
+        query  = np.repeat(np.arange(len(xyz)), counts)
+        dist   = chord_to_km(np.linalg.norm(self.tree.data[idx] - xyz[query], axis=1))
+        order  = np.lexsort((dist, query))
+        return offsets, self.ids[idx[order]], dist[order]
+
+    def query_pairs(self, radius_km: float) -> pd.DataFrame:
+        """
+        Every pair of indexed points within ``radius_km`` of each other (each pair once).
+
+        Returns
+        ---
+        - ``id_a``, ``id_b``, ``dist_km``
+        """
+        pairs = self.tree.query_pairs(r=km_to_chord(radius_km), output_type="ndarray")
+        dist  = chord_to_km(np.linalg.norm(self.tree.data[pairs[:, 0]] - self.tree.data[pairs[:, 1]], axis=1))
+        return pd.DataFrame({"id_a": self.ids[pairs[:, 0]], "id_b": self.ids[pairs[:, 1]], "dist_km": dist})
+
+    def nearest_to(self, other: "SpatialIndex", k: int = 1, max_km: float = np.inf) -> pd.DataFrame:
+        """
+        For every point in ``other``, its ``k`` nearest points in this index (e.g., the nearest ASOS station to each gauge).
+
+        Returns
+        ---
+        - One row per (``other`` point, neighbor rank): ``id``, ``rank``, ``neighbor_id``, ``dist_km``
+        """
+        ids, dist = self.query_knn(other.lats, other.lons, k=k, max_km=max_km)
+        return pd.DataFrame({
+            "id": np.repeat(other.ids, k),
+            "rank": np.tile(np.arange(k), len(other.ids)),
+            "neighbor_id": ids.reshape(-1),
+            "dist_km": dist.reshape(-1),
+        })
@@ -1,8 +1,13 @@
 import gzip
 import shutil
+import numpy as np
 import xarray as xr
 
 from pathlib import Path
+from datetime import datetime
+from typing import Tuple
+
+from src.utils.mrms.grib2 import UnsupportedGrib2Error, read_mrms_grib2
 
 
 class Grib2File:
@@ -12,8 +17,43 @@ class Grib2File:
         assert self.path.suffix == ".grib2"
 
     def to_xarray(self, engine="cfgrib") -> xr.Dataset:
+        """
+        Args
+        ---
+        :engine: ``"cfgrib"``, or ``"mrms"`` for the fast reader (``src.utils.mrms.grib2``; falls back to cfgrib)
+        """
+
+        if engine == "mrms":
+            try:
+                msg = read_mrms_grib2(str(self.path))
+            except UnsupportedGrib2Error:
+                return self.to_xarray(engine="cfgrib")
+            return xr.Dataset(
+                {"unknown": (("latitude", "longitude"), msg.values)},
+                coords={"latitude": msg.lats, "longitude": msg.lons, "time": np.datetime64(msg.valid_time, 'ns')},
+            )
+
         return xr.open_dataset(str(self.path), engine="cfgrib")
 
+    def to_numpy(self) -> Tuple[datetime, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Decode with the fast MRMS reader, falling back to cfgrib for unsupported templates.
+
+        Returns
+        ---
+        - (valid_time, lats, lons, ``[H, W]`` float32 values)
+        """
+
+        try:
+            msg = read_mrms_grib2(str(self.path))
+            return msg.valid_time, msg.lats, msg.lons, msg.values
+        except UnsupportedGrib2Error:
+            xa = self.to_xarray(engine="cfgrib")
+            valid_time = datetime.utcfromtimestamp(int(xa.time.values.astype('datetime64[s]').astype('int64')))
+            result     = (valid_time, xa['latitude'].values, xa['longitude'].values, xa['unknown'].values.astype(np.float32))
+            xa.close()
+            return result
+
 
 class ZippedGrib2File:
 
@@ -0,0 +1,285 @@
+"""
+A minimal GRIB2 reader for MRMS ``RadarOnly_QPE_*`` files.
+
+MRMS files hold a single message on a regular lat/lon grid, so cfgrib/eccodes (index files, xarray
+objects, library start-up) is mostly overhead. This reader parses the sections directly and returns
+NumPy arrays. It supports exactly what MRMS uses:
+
+- grid definition template 3.0 (regular lat/lon)
+- data representation templates 5.0 (simple packing) and 5.41 (PNG); PNG is decoded with Pillow if it is
+  installed, otherwise with NumPy (rows filtered with None/Sub/Up only)
+
+Anything else raises ``UnsupportedGrib2Error``; callers fall back to cfgrib (see ``Grib2File.to_numpy``).
+
+```
+python -m src.utils.mrms.grib2 <file.grib2> [...]   # parity check against cfgrib
+```
+"""
+
+import io
+import sys
+import time
+import zlib
+import struct
+import numpy as np
+
+from pathlib import Path
+from datetime import datetime
+from typing import Dict
+
+
+class UnsupportedGrib2Error(ValueError):
+    """
+    The file uses a GRIB2 feature this reader does not implement; use cfgrib instead.
+    """
+
+
+class Grib2Message:
+
+    def __init__(self, valid_time: datetime, lats: np.ndarray, lons: np.ndarray, values: np.ndarray, template: int):
+        """
+        - ``lats``/``lons``: grid axes in file (scan) order; ``lons`` in degrees east as stored (0-360 for MRMS)
+        - ``values``: ``[len(lats), len(lons)]`` float32
+        """
+        self.valid_time = valid_time
+        self.lats       = lats
+        self.lons       = lons
+        self.values     = values
+        self.template   = template
+
+
+def _uint(b: bytes) -> int:
+    return int.from_bytes(b, "big")
+
+
+def _sint(b: bytes) -> int:
+    """
+    GRIB2 signed integers are sign-magnitude (not two's complement).
+    """
+    v    = int.from_bytes(b, "big")
+    sign = 1 << (8 * len(b) - 1)
+    return -(v & ~sign) if v & sign else v
+
+
+def _split_sections(data: bytes) -> Dict[int, bytes]:
+
+    if data[:4] != b"GRIB" or data[7] != 2:
+        raise UnsupportedGrib2Error("Error: not a GRIB2 file")
+
+    total    = _uint(data[8:16])
+    sections = {}
+    offset   = 16
+    while offset < total - 4:
+        length = _uint(data[offset:offset + 4])
+        number = data[offset + 4]
+        if number in sections:
+            raise UnsupportedGrib2Error("Error: multiple fields per message")
+        sections[number] = data[offset:offset + length]
+        offset += length
+
+    if data[total - 4:total] != b"7777":
+        raise UnsupportedGrib2Error("Error: truncated GRIB2 message")
+    if total < len(data) and data[total:total + 4] == b"GRIB":
+        raise UnsupportedGrib2Error("Error: multiple messages per file")
+    return sections
+
+
+def _decode_png_numpy(buf: bytes) -> np.ndarray:
+    """
+    Grayscale/RGB(A) 8/16-bit PNGs whose rows use the None/Sub/Up filters (each row is vectorized).
+    """
+
+    pos, idat, header = 8, [], None
+    while pos < len(buf):
+        length, kind = struct.unpack(">I4s", buf[pos:pos + 8])
+        chunk        = buf[pos + 8:pos + 8 + length]
+        if kind == b"IHDR":
+            header = struct.unpack(">IIBBBBB", chunk)
+        elif kind == b"IDAT":
+            idat.append(chunk)
+        elif kind == b"IEND":
+            break
+        pos += 12 + length
+
+    width, height, depth, color, _, _, interlace = header
+    channels = {0: 1, 2: 3, 4: 2, 6: 4}.get(color)
+    if channels is None or depth not in (8, 16) or interlace:
+        raise UnsupportedGrib2Error(f"Error: unsupported PNG (color type: {color}, bit depth: {depth}, interlace: {interlace})")
+
+    bpp      = channels * depth // 8
+    rowbytes = width * bpp
+    raw      = np.frombuffer(zlib.decompress(b"".join(idat)), dtype=np.uint8).reshape(height, rowbytes + 1)
+    filters  = raw[:, 0]
+    if np.any(filters > 2):
+        raise UnsupportedGrib2Error("Error: PNG rows use the Average/Paeth filters")
+
+    out  = np.empty((height, rowbytes), dtype=np.uint8)
+    prev = np.zeros(rowbytes, dtype=np.uint8)
+    for r in range(height):
+        row = raw[r, 1:]
+        if filters[r] == 1:
+            row = np.cumsum(row.reshape(width, bpp), axis=0, dtype=np.uint8).reshape(-1)
+        elif filters[r] == 2:
+            row = row + prev
+        out[r] = row
+        prev   = out[r]
+
+    if depth == 16:
+        out = out.view(">u2").astype(np.uint32)
+    out = out.reshape(height, width, channels).astype(np.uint32)
+
+    # multi-channel images pack one big-endian integer per pixel
+    packed = np.zeros((height, width), dtype=np.uint32)
+    for c in range(channels):
+        packed = (packed << depth) | out[..., c]
+    return packed
+
+
+def _decode_png(buf: bytes, nbits: int) -> np.ndarray:
+
+    try:
+        from PIL import Image
+    except ImportError:
+        return _decode_png_numpy(buf)
+
+    img = np.array(Image.open(io.BytesIO(buf)))
+    if img.ndim == 2:
+        return img.astype(np.uint32)
+
+    # 24/32-bit values are stored as RGB(A) bytes
+    packed = np.zeros(img.shape[:2], dtype=np.uint32)
+    for c in range(img.shape[2]):
+        packed = (packed << 8) | img[..., c].astype(np.uint32)
+    return packed
+
+
+def _unpack_bits(buf: bytes, nbits: int, n: int) -> np.ndarray:
+    """
+    ``n`` big-endian unsigned ``nbits``-wide integers.
+    """
+    if nbits in (8, 16, 32):
+        return np.frombuffer(buf, dtype=f">u{nbits // 8}", count=n).astype(np.uint32)
+
+    bits    = np.unpackbits(np.frombuffer(buf, dtype=np.uint8))[:n * nbits].reshape(n, nbits)
+    weights = (1 << np.arange(nbits - 1, -1, -1, dtype=np.uint64))
+    return (bits @ weights).astype(np.uint32)
+
+
+def read_mrms_grib2(fp: str) -> Grib2Message:
+    """
+    Returns
+    ---
+    - A ``Grib2Message``; raises ``UnsupportedGrib2Error`` for anything outside templates 3.0 & 5.0/5.41
+    """
+
+    with open(fp, "rb") as f:
+        data = f.read()
+
+    sections = _split_sections(data)
+    s1, s3, s5, s6, s7 = (sections.get(k) for k in (1, 3, 5, 6, 7))
+    if any(s is None for s in (s1, s3, s5, s7)):
+        raise UnsupportedGrib2Error("Error: missing GRIB2 sections")
+
+    # reference time; MRMS analyses are valid at the reference time (this is cfgrib's ``time``)
+    valid_time = datetime(_uint(s1[12:14]), s1[14], s1[15], s1[16], s1[17], s1[18])
+
+    # grid: template 3.0 (regular lat/lon)
+    if _uint(s3[12:14]) != 0:
+        raise UnsupportedGrib2Error(f"Error: unsupported grid template: 3.{_uint(s3[12:14])}")
+
+    ni, nj        = _uint(s3[30:34]), _uint(s3[34:38])
+    basic, subdiv = _uint(s3[38:42]), _uint(s3[42:46])
+    unit          = 1e-6 if basic in (0, 0xFFFFFFFF) or subdiv in (0, 0xFFFFFFFF) else basic / subdiv
+    la1, lo1      = _sint(s3[46:50]) * unit, _sint(s3[50:54]) * unit
+    di, dj        = _uint(s3[63:67]) * unit, _uint(s3[67:71]) * unit
+    scan          = s3[71]
+    if scan & 0x10:
+        raise UnsupportedGrib2Error("Error: boustrophedonic scanning")
+
+    lons = lo1 + (-1 if scan & 0x80 else 1) * di * np.arange(ni)
+    lats = la1 + (1 if scan & 0x40 else -1) * dj * np.arange(nj)
+
+    # data representation: template 5.0 (simple) or 5.41 (PNG)
+    n_points = _uint(s5[5:9])
+    template = _uint(s5[9:11])
+    if template not in (0, 41):
+        raise UnsupportedGrib2Error(f"Error: unsupported data representation template: 5.{template}")
+
+    ref   = struct.unpack(">f", s5[11:15])[0]
+    e     = _sint(s5[15:17])
+    d     = _sint(s5[17:19])
+    nbits = s5[19]
+
+    bitmap = None
+    if s6 is not None and s6[5] == 0:
+        bitmap = np.unpackbits(np.frombuffer(s6[6:], dtype=np.uint8))[:ni * nj].astype(bool)
+    elif s6 is not None and s6[5] != 255:
+        raise UnsupportedGrib2Error("Error: predefined/previous bitmaps")
+
+    n_packed = n_points if bitmap is None else int(bitmap.sum())
+    if nbits == 0:
+        packed = np.zeros(n_packed, dtype=np.uint32)
+    elif template == 0:
+        packed = _unpack_bits(s7[5:], nbits, n_packed)
+    else:
+        packed = _decode_png(s7[5:], nbits).reshape(-1)[:n_packed]
+
+    # Y = (R + X * 2^E) / 10^D
+    decoded = ((np.float64(ref) + packed.astype(np.float64) * 2.0 ** e) / 10.0 ** d).astype(np.float32)
+    if bitmap is not None:
+        values         = np.full(ni * nj, np.nan, dtype=np.float32)
+        values[bitmap] = decoded
+    else:
+        values = decoded
+
+    if scan & 0x20:
+        # adjacent points are consecutive along j
+        values = values.reshape(ni, nj).T
+    else:
+        values = values.reshape(nj, ni)
+
+    return Grib2Message(valid_time, lats, lons, np.ascontiguousarray(values), template)
+
+
+def check_parity(fp: str) -> Dict:
+    """
+    Compare ``read_mrms_grib2`` against cfgrib for one (unzipped) file.
+
+    Returns
+    ---
+    - ``{"time": bool, "lats": bool, "lons": bool, "values": bool, "max_abs_diff": float, "fast_s": float, "cfgrib_s": float}``
+    """
+
+    import xarray as xr
+
+    t0   = time.time()
+    msg  = read_mrms_grib2(fp)
+    t1   = time.time()
+    xarr = xr.open_dataset(fp, engine="cfgrib", indexpath="")
+    ref  = xarr["unknown"].values
+    t2   = time.time()
+
+    ref_time = datetime.utcfromtimestamp(int(xarr.time.values.astype('datetime64[s]').astype('int64')))
+    diff     = np.abs(msg.values.astype(np.float64) - ref.astype(np.float64))
+    both_nan = np.isnan(msg.values) & np.isnan(ref)
+
+    return {
+        "time": msg.valid_time == ref_time,
+        "lats": bool(np.allclose(msg.lats, xarr["latitude"].values, atol=1e-6)),
+        "lons": bool(np.allclose(msg.lons, xarr["longitude"].values, atol=1e-6)),
+        "values": bool(np.all(both_nan | (diff <= 1e-4 * np.maximum(1.0, np.abs(ref))))),
+        "max_abs_diff": float(np.nanmax(np.where(both_nan, 0.0, diff))),
+        "fast_s": t1 - t0,
+        "cfgrib_s": t2 - t1,
+    }
+
+
+if __name__ == "__main__":
+
+    ok = True
+    for fp in sys.argv[1:]:
+        result = check_parity(fp)
+        ok    &= result["time"] and result["lats"] and result["lons"] and result["values"]
+        print(f"{Path(fp).name}: {result}")
+
+    sys.exit(0 if ok else 1)
@@ -1,3 +1,6 @@
+from datetime import timedelta
+
+
 class MRMSProductsEnum:
     
     RadarOnly_QPE_15M = "RadarOnly_QPE_15M_00.00"
@@ -7,4 +10,24 @@ class MRMSProductsEnum:
     RadarOnly_QPE_12H = "RadarOnly_QPE_12H_00.00"
     RadarOnly_QPE_24H = "RadarOnly_QPE_24H_00.00"
     RadarOnly_QPE_48H = "RadarOnly_QPE_48H_00.00"
-    RadarOnly_QPE_72H = "RadarOnly_QPE_72H_00.00"
\ No newline at end of file
+    RadarOnly_QPE_72H = "RadarOnly_QPE_72H_00.00"
+
+    @staticmethod
+    def get_suffix(product: str) -> str:
+        """
+        e.g., ``RadarOnly_QPE_06H_00.00`` -> ``06H``
+        """
+        return product.split("_")[-2]
+
+    @staticmethod
+    def get_accumulation(product: str) -> timedelta:
+        """
+        Accumulation period of a ``RadarOnly_QPE_*`` product; e.g., ``RadarOnly_QPE_06H_00.00`` -> ``timedelta(hours=6)``
+        """
+        suffix      = MRMSProductsEnum.get_suffix(product)
+        value, unit = int(suffix[:-1]), suffix[-1]
+        if unit == "M":
+            return timedelta(minutes=value)
+        elif unit == "H":
+            return timedelta(hours=value)
+        raise ValueError(f"Error: invalid product: {product}")
@@ -0,0 +1,63 @@
+"""
+Local (Las Vegas) wall-clock time -> UTC.
+
+Gauge csvs are logged in ``America/Los_Angeles`` local time: UTC-7 in summer (PDT), UTC-8 in winter (PST).
+Convert once, at ingest; everything downstream runs in UTC.
+"""
+
+import numpy as np
+import pandas as pd
+
+from zoneinfo import ZoneInfo
+from datetime import datetime, timezone
+
+
+LOCAL_TZ = "America/Los_Angeles"
+
+# legacy names for local time
+_LOCAL_ALIASES = {"PDT", "PST", "local"}
+
+
+def local_to_utc(times: np.ndarray, tz: str = LOCAL_TZ) -> np.ndarray:
+    """
+    Naive wall-clock times -> UTC, DST-aware.
+
+    ``times`` must be in logging order (oldest first). Inside a repeated fall-back hour, a report is taken as the
+    second (standard-time) occurrence once the wall clock has stepped back within that hour, and as the first
+    (daylight-time) occurrence otherwise. Wall-clock times skipped at spring-forward are shifted forward.
+
+    Returns
+    ---
+    - ``[N]`` ``datetime64[s]`` UTC (int64 epoch seconds)
+    """
+
+    times = np.asarray(times, dtype='datetime64[s]')
+    index = pd.DatetimeIndex(times)
+
+    # ambiguous (fall-back) times localize to NaT here
+    probe     = index.tz_localize(tz, ambiguous="NaT", nonexistent="shift_forward")
+    ambiguous = np.flatnonzero(probe.isna() & ~pd.isna(times))
+
+    is_dst = np.ones(len(times), dtype=bool)
+    if len(ambiguous):
+        # one run per fall-back night; within a run, every report after the clock steps back is standard time
+        days = times[ambiguous].astype('datetime64[D]')
+        for day in np.unique(days):
+            run     = ambiguous[days == day]
+            t       = times[run].astype(np.int64)
+            stepped = np.r_[False, t[1:] < np.maximum.accumulate(t)[:-1]]
+            is_dst[run] = ~np.logical_or.accumulate(stepped)
+
+    utc = index.tz_localize(tz, ambiguous=is_dst, nonexistent="shift_forward").tz_convert("UTC").tz_localize(None)
+    return utc.values.astype('datetime64[s]')
+
+
+def to_utc(dt: datetime, time_zone: str = "UTC") -> datetime:
+    """
+    A naive ``dt`` in ``time_zone`` (``"UTC"``, an IANA name, or ``"PDT"``/``"PST"``/``"local"`` for Las Vegas time) -> naive UTC.
+    Ambiguous fall-back times resolve to the first (daylight-time) occurrence.
+    """
+    if time_zone == "UTC":
+        return dt
+    tz = ZoneInfo(LOCAL_TZ if time_zone in _LOCAL_ALIASES else time_zone)
+    return dt.replace(tzinfo=tz).astimezone(timezone.utc).replace(tzinfo=None)
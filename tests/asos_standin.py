@@ -0,0 +1,113 @@
+"""
+A local stand-in for the IEM ASOS endpoint (``/cgi-bin/request/asos.py``), for testing ``scripts/dl_asos.py``.
+
+Serves ``rows`` (``onlycomma`` csv lines) whose ``valid`` day falls in the requested ``[day1, day2)`` window,
+and can inject HTTP errors: the first ``len(fail_codes)`` requests are answered with those status codes.
+
+```
+python tests/asos_standin.py --port 8000 --fail-every 3
+python scripts/dl_asos.py --endpoint http://localhost:8000/asos.py
+```
+"""
+
+import argparse
+import threading
+
+from datetime import datetime, timedelta
+from typing import List, Sequence
+from urllib.parse import urlparse, parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+HEADER = "station,valid,lon,lat,elevation,tmpf,p01i"
+
+
+def make_rows(start_day: datetime, end_day: datetime, stations: Sequence[str] = ("LAS", "VGT"), every: timedelta = timedelta(hours=6)) -> List[str]:
+    """
+    Synthetic reports every ``every`` for each station in ``[start_day, end_day)``.
+    """
+    rows, t = [], start_day
+    while t < end_day:
+        for station in stations:
+            rows.append(f"{station},{t:%Y-%m-%d %H:%M},-115.1,36.1,664.0,95.0,0.00")
+        t += every
+    return rows
+
+
+class ASOSStandIn:
+
+    def __init__(self, rows: Sequence[str] = (), fail_codes: Sequence[int] = (), fail_every: int = 0, port: int = 0):
+        """
+        Args
+        ---
+        :fail_codes: status codes for the first requests, in order
+        :fail_every: afterwards, answer every ``fail_every``-th request with a 503 (0: never)
+        :port: 0 picks a free port
+        """
+
+        self.rows       = list(rows)
+        self.fail_codes = list(fail_codes)
+        self.fail_every = fail_every
+        self.requests: List[str] = []
+        self._lock      = threading.Lock()
+
+        standin = self
+
+        class _Handler(BaseHTTPRequestHandler):
+
+            def do_GET(self):
+                status, body = standin._respond(self.path)
+                self.send_response(status)
+                self.send_header("Content-Type", "text/plain")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), _Handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True)
+
+    @property
+    def endpoint(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_address[1]}/asos.py"
+
+    def _respond(self, path: str):
+
+        with self._lock:
+            self.requests.append(path)
+            n = len(self.requests)
+            if self.fail_codes:
+                return self.fail_codes.pop(0), b"injected error"
+            if self.fail_every and n % self.fail_every == 0:
+                return 503, b"injected error"
+
+        qs    = parse_qs(urlparse(path).query)
+        start = datetime(int(qs["year1"][0]), int(qs["month1"][0]), int(qs["day1"][0]))
+        end   = datetime(int(qs["year2"][0]), int(qs["month2"][0]), int(qs["day2"][0]))
+
+        rows = [row for row in self.rows if start <= datetime.strptime(row.split(",")[1][:10], "%Y-%m-%d") < end]
+        return 200, "\n".join([HEADER, *rows, ""]).encode("utf-8")
+
+    def __enter__(self) -> "ASOSStandIn":
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Serve synthetic ASOS reports on localhost.")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--fail-every", type=int, default=0, help="answer every n-th request with a 503")
+    parser.add_argument("--start", type=datetime.fromisoformat, default=datetime(2021, 1, 1))
+    parser.add_argument("--end", type=datetime.fromisoformat, default=datetime(2025, 8, 1))
+    args = parser.parse_args()
+
+    with ASOSStandIn(make_rows(args.start, args.end), fail_every=args.fail_every, port=args.port) as standin:
+        print(f"Serving on {standin.endpoint}")
+        standin.thread.join()
@@ -0,0 +1,115 @@
+"""
+A local replay of the Gustfront portal's gauge downloads, for testing ``scripts/scrape_gustfront_v2.py --mode http``.
+
+Serves the recorded ``gagedata_<id>.csv`` files under ``fixture_dir`` (byte-for-byte rows, newest first, CRLF):
+
+- ``/gagedatalist/``: the portal page; sets a session cookie
+- ``/gagedatalist/download?gage=<id>&startDate=<mm/dd/yyyy>&endDate=<mm/dd/yyyy>``: the rows dated in
+  ``[startDate, endDate]``; without the session cookie, an HTML page (as a portal would answer)
+
+```
+python tests/gustfront_replay.py --port 8000
+python scripts/scrape_gustfront_v2.py --mode http --warmup-url http://127.0.0.1:8000/gagedatalist/ \\
+    --url-template "http://127.0.0.1:8000/gagedatalist/download?gage={gauge_id}&startDate={start:%m/%d/%Y}&endDate={end:%m/%d/%Y}"
+```
+"""
+
+import argparse
+import threading
+
+from pathlib import Path
+from datetime import datetime
+from typing import Dict, List
+from urllib.parse import urlparse, parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+FIXTURE_DIR = Path(__file__).parent / "fixtures" / "gustfront"
+
+_COOKIE = "ASP.NET_SessionId=replay"
+_PAGE   = b"<html><body><select id='uiGage'></select><button id='uiDownload'>Download</button></body></html>"
+
+
+class GustfrontReplay:
+
+    def __init__(self, fixture_dir: Path = FIXTURE_DIR, port: int = 0):
+
+        self.gauges: Dict[int, List[bytes]] = {}
+        self.header = b""
+        for fp in sorted(Path(fixture_dir).glob("gagedata_*.csv")):
+            lines                = fp.read_bytes().split(b"\r\n")
+            self.header          = lines[0]
+            self.gauges[int(fp.stem.split("_")[1])] = [line for line in lines[1:] if line]
+
+        self.requests: List[str] = []
+        self._lock = threading.Lock()
+
+        replay = self
+
+        class _Handler(BaseHTTPRequestHandler):
+
+            def do_GET(self):
+                status, headers, body = replay._respond(self.path, self.headers.get("Cookie", ""))
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), _Handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True)
+
+    @property
+    def page_url(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_address[1]}/gagedatalist/"
+
+    @property
+    def url_template(self) -> str:
+        return self.page_url + "download?gage={gauge_id}&startDate={start:%m/%d/%Y}&endDate={end:%m/%d/%Y}"
+
+    def _respond(self, path: str, cookie: str):
+
+        with self._lock:
+            self.requests.append(path)
+
+        url = urlparse(path)
+        if url.path == "/gagedatalist/":
+            return 200, {"Content-Type": "text/html", "Set-Cookie": f"{_COOKIE}; Path=/"}, _PAGE
+        if url.path != "/gagedatalist/download":
+            return 404, {}, b"not found"
+        if _COOKIE not in cookie:
+            return 200, {"Content-Type": "text/html"}, _PAGE
+
+        qs    = parse_qs(url.query)
+        gauge = int(qs["gage"][0])
+        if gauge not in self.gauges:
+            return 404, {}, b"unknown gauge"
+
+        start = datetime.strptime(qs["startDate"][0], "%m/%d/%Y")
+        end   = datetime.strptime(qs["endDate"][0], "%m/%d/%Y")
+        rows  = [row for row in self.gauges[gauge] if start <= datetime.strptime(row[1:11].decode(), "%m/%d/%Y") <= end]
+        return 200, {"Content-Type": "text/csv"}, b"\r\n".join([self.header, *rows, b""])
+
+    def __enter__(self) -> "GustfrontReplay":
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Replay recorded gauge csvs as the Gustfront portal would serve them.")
+    parser.add_argument("--fixture-dir", default=str(FIXTURE_DIR))
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args()
+
+    with GustfrontReplay(Path(args.fixture_dir), port=args.port) as replay:
+        print(f"Serving {sorted(replay.gauges)} on {replay.page_url}")
+        replay.thread.join()
@@ -0,0 +1,117 @@
+"""
+``MRMSArchive.build`` resume behaviour with a fake MRMS client, and listing-error handling in ``MRMSQPEClient``.
+"""
+
+import pytest
+import numpy as np
+
+from datetime import datetime, timedelta
+
+pytest.importorskip("s3fs")
+pytest.importorskip("zarr")
+
+from src.mrms_qpe.archive import MRMSArchive
+from src.mrms_qpe.fetch_mrms_qpe import MRMSQPEClient
+from src.utils.mrms.products import MRMSProductsEnum
+
+
+PRODUCT = MRMSProductsEnum.RadarOnly_QPE_01H
+START   = datetime(2023, 7, 20)
+END     = START + timedelta(days=4)
+
+LATS = np.array([36.2, 36.1, 36.0])
+LONS = np.array([244.8, 244.9])
+
+
+class FakeMRMSClient:
+    """
+    Hourly grids (value: hours since ``START``) for every day except ``empty_days``; listing ``fail_day`` raises.
+    """
+
+    def __init__(self, fail_day: datetime | None = None, empty_days=()):
+        self.fail_day   = fail_day
+        self.empty_days = set(empty_days)
+        self.requested  = []
+
+    def fetch_radar_only_qpe_regional_batch(self, products, start_time, end_time, bounds, to_dir):
+
+        day = datetime(start_time.year, start_time.month, start_time.day)
+        self.requested.append(day)
+        if day == self.fail_day:
+            raise OSError("S3 listing throttled")
+        if day in self.empty_days:
+            return {}
+
+        times = np.arange(np.datetime64(start_time, 'h') + 1, np.datetime64(end_time, 'h') + 1).astype('datetime64[s]')
+        times = times[(times > np.datetime64(start_time, 's')) & (times <= np.datetime64(end_time, 's'))]
+        hours = (times - np.datetime64(START, 's')).astype(np.int64) / 3600
+        stack = np.broadcast_to(hours[:, None, None], (len(times), len(LATS), len(LONS))).astype(np.float32)
+        return {products[0]: (times, LATS, LONS, stack)}
+
+
+def _expected_times(days) -> np.ndarray:
+    return np.concatenate([np.arange(np.datetime64(day, 'h') + 1, np.datetime64(day + timedelta(days=1), 'h')).astype('datetime64[s]') for day in days])
+
+
+def test_failed_day_stops_the_run_and_is_resumed(tmp_path):
+
+    archive = MRMSArchive(archive_dir=str(tmp_path / "mrms"))
+    days    = [START + timedelta(days=i) for i in range(4)]
+
+    with pytest.raises(OSError):
+        archive.build(PRODUCT, START, END, mrms_client=FakeMRMSClient(fail_day=days[2]), to_dir=str(tmp_path / "tmp"))
+
+    # nothing past the failed day was appended, so no gap can be hidden behind a later valid time
+    np.testing.assert_array_equal(archive.get_valid_times(PRODUCT), _expected_times(days[:2]))
+
+    client = FakeMRMSClient()
+    archive.build(PRODUCT, START, END, mrms_client=client, to_dir=str(tmp_path / "tmp"))
+
+    assert client.requested[0] == days[1]
+    np.testing.assert_array_equal(archive.get_valid_times(PRODUCT), _expected_times(days))
+    qpe = archive.load(PRODUCT, START, END).values
+    np.testing.assert_array_equal(qpe[:, 0, 0], (_expected_times(days) - np.datetime64(START, 's')).astype(np.int64) / 3600)
+
+
+def test_days_without_files_are_skipped(tmp_path):
+
+    archive = MRMSArchive(archive_dir=str(tmp_path / "mrms"))
+    days    = [START + timedelta(days=i) for i in range(4)]
+
+    n = archive.build(PRODUCT, START, END, mrms_client=FakeMRMSClient(empty_days=[days[1]]), to_dir=str(tmp_path / "tmp"))
+
+    assert n == 3 * 23
+    np.testing.assert_array_equal(archive.get_valid_times(PRODUCT), _expected_times([days[0], days[2], days[3]]))
+
+
+class FakeS3:
+
+    def __init__(self, missing=(), failing=()):
+        self.missing = set(missing)
+        self.failing = set(failing)
+
+    def ls(self, path: str):
+        yyyymmdd = path.rstrip("/").split("/")[-1]
+        if yyyymmdd in self.missing:
+            raise FileNotFoundError(path)
+        if yyyymmdd in self.failing:
+            raise TimeoutError(path)
+        return [f"{path}/MRMS_{PRODUCT}_{yyyymmdd}-010000.grib2.gz"]
+
+
+def _client(s3: FakeS3) -> MRMSQPEClient:
+    client             = MRMSQPEClient.__new__(MRMSQPEClient)
+    client.mrms_client = s3
+    return client
+
+
+def test_listing_missing_prefix_is_empty():
+
+    listings = _client(FakeS3(missing={"20230721"}))._list_product_files([PRODUCT], START, START + timedelta(days=1, hours=23))
+    assert [path.split("_")[-1][:8] for path in listings[PRODUCT]] == ["20230720"]
+
+
+def test_listing_errors_raise():
+
+    with pytest.raises(TimeoutError):
+        _client(FakeS3(failing={"20230721"}))._list_product_files([PRODUCT], START, START + timedelta(days=1, hours=23))
@@ -0,0 +1,133 @@
+"""
+``scripts/dl_asos.py`` against a local stand-in for the IEM endpoint (``asos_standin.py``).
+"""
+
+import urllib.error
+import pytest
+
+from pathlib import Path
+from datetime import datetime, timedelta
+
+from scripts import dl_asos
+from asos_standin import HEADER, ASOSStandIn, make_rows
+
+
+DAY = datetime(2023, 7, 20)
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(dl_asos, "BACKOFF_BASE", 0.0)
+
+
+def _days(start: datetime, n: int):
+    return [start + timedelta(days=i) for i in range(n)]
+
+
+def test_coalesce_days_groups_consecutive_days():
+
+    days   = _days(DAY, 3) + [DAY + timedelta(days=5)] + [DAY + timedelta(days=1)]
+    ranges = dl_asos.coalesce_days(days[::-1])
+    assert ranges == [(DAY, DAY + timedelta(days=3)), (DAY + timedelta(days=5), DAY + timedelta(days=6))]
+
+
+def test_coalesce_days_span_limit():
+
+    ranges = dl_asos.coalesce_days(_days(DAY, 40), max_span_days=31)
+    assert ranges == [(DAY, DAY + timedelta(days=31)), (DAY + timedelta(days=31), DAY + timedelta(days=40))]
+    assert all((end - start).days <= 31 for start, end in ranges)
+
+    assert dl_asos.coalesce_days(_days(DAY, 3), max_span_days=1) == [(d, d + timedelta(days=1)) for d in _days(DAY, 3)]
+
+
+def test_split_by_day():
+
+    rows         = make_rows(DAY, DAY + timedelta(days=2))
+    body         = "\n".join([HEADER, *rows, ""]).encode()
+    days, header = dl_asos.split_by_day(body)
+
+    assert header == HEADER
+    assert sorted(days) == ["2023-07-20", "2023-07-21"]
+    for day, csv in days.items():
+        lines = csv.decode().splitlines()
+        assert lines[0] == HEADER
+        assert lines[1:] == [row for row in rows if row.split(",")[1].startswith(day)]
+
+
+def test_split_by_day_header_only():
+
+    days, header = dl_asos.split_by_day(f"{HEADER}\n".encode())
+    assert days == {} and header == HEADER
+
+
+@pytest.mark.parametrize("code", [503, 429])
+def test_fetch_url_retries_throttling(code):
+
+    with ASOSStandIn(make_rows(DAY, DAY + timedelta(days=1)), fail_codes=[code, code]) as standin:
+        url  = dl_asos.build_url_for_day(dl_asos.with_endpoint(dl_asos.BASE_CMD, standin.endpoint), DAY)
+        body = dl_asos.fetch_url(url, max_retries=3)
+
+    assert body.decode().startswith(HEADER)
+    assert len(standin.requests) == 3
+
+
+def test_fetch_url_gives_up_after_max_retries():
+
+    with ASOSStandIn(fail_codes=[503] * 5) as standin:
+        url = dl_asos.build_url_for_day(dl_asos.with_endpoint(dl_asos.BASE_CMD, standin.endpoint), DAY)
+        with pytest.raises(urllib.error.HTTPError) as e:
+            dl_asos.fetch_url(url, max_retries=3)
+
+    assert e.value.code == 503
+    assert len(standin.requests) == 3
+
+
+def test_fetch_url_does_not_retry_client_errors():
+
+    with ASOSStandIn(fail_codes=[404]) as standin:
+        url = dl_asos.build_url_for_day(dl_asos.with_endpoint(dl_asos.BASE_CMD, standin.endpoint), DAY)
+        with pytest.raises(urllib.error.HTTPError) as e:
+            dl_asos.fetch_url(url, max_retries=3)
+
+    assert e.value.code == 404
+    assert len(standin.requests) == 1
+
+
+def test_fetch_range_writes_every_day(tmp_path):
+
+    days    = _days(DAY, 3)
+    out_fps = {day: [tmp_path / f"{day:%Y-%m-%d}_ASOS.csv"] for day in days}
+
+    # no reports on the last day
+    with ASOSStandIn(make_rows(DAY, DAY + timedelta(days=2)), fail_codes=[503]) as standin:
+        base_url  = dl_asos.with_endpoint(dl_asos.BASE_CMD, standin.endpoint)
+        n_written = dl_asos.fetch_range(base_url, days[0], days[-1] + timedelta(days=1), out_fps)
+
+    assert n_written == 3
+    assert len(standin.requests) == 2                     # one range request, retried once
+    assert out_fps[days[-1]][0].read_text() == f"{HEADER}\n"
+    assert len(out_fps[days[0]][0].read_text().splitlines()) > 1
+    assert sorted(p.name for p in tmp_path.iterdir()) == sorted(fps[0].name for fps in out_fps.values())
+
+
+def test_fetch_range_is_atomic(tmp_path, monkeypatch):
+
+    out_fp = tmp_path / f"{DAY:%Y-%m-%d}_ASOS.csv"
+
+    # a failed request writes nothing
+    with ASOSStandIn(fail_codes=[404]) as standin:
+        base_url = dl_asos.with_endpoint(dl_asos.BASE_CMD, standin.endpoint)
+        with pytest.raises(urllib.error.HTTPError):
+            dl_asos.fetch_range(base_url, DAY, DAY + timedelta(days=1), {DAY: [out_fp]})
+    assert list(tmp_path.iterdir()) == []
+
+    # a crash before the rename never leaves a (partial) file at the final path, so the day stays pending
+    def _crash(self, target):
+        raise OSError("crash")
+
+    monkeypatch.setattr(Path, "replace", _crash)
+    with ASOSStandIn(make_rows(DAY, DAY + timedelta(days=1))) as standin:
+        base_url = dl_asos.with_endpoint(dl_asos.BASE_CMD, standin.endpoint)
+        with pytest.raises(OSError):
+            dl_asos.fetch_range(base_url, DAY, DAY + timedelta(days=1), {DAY: [out_fp]})
+    assert not out_fp.exists()
@@ -0,0 +1,50 @@
+"""
+``scripts/gather_all_events.py`` candidate selection with a fake per-day screen that fails for one day.
+"""
+
+import pytest
+
+from datetime import datetime, timedelta
+
+pytest.importorskip("s3fs")
+
+from scripts import gather_all_events
+from src.mrms_qpe import rain_day_screen
+from src.mrms_qpe.rain_day_screen import RainDayScreen
+from src.pipeline.work_queue import WorkQueue
+
+
+DAYS    = [datetime(2023, 7, 20) + timedelta(days=i) for i in range(5)]
+FAILING = DAYS[1]
+
+
+def _fake_screen_day(day, bounds, wet_thresh):
+    if day == FAILING:
+        raise TimeoutError("S3 timeout")
+    return {"day": day.strftime("%Y-%m-%d"), "available": True, "max_in": 1.0, "mean_in": 0.2, "wet_frac": 0.5}
+
+
+def _fake_screen_day_ok(day, bounds, wet_thresh):
+    return {"day": day.strftime("%Y-%m-%d"), "available": True, "max_in": 1.0, "mean_in": 0.2, "wet_frac": 0.5}
+
+
+def _should_not_screen(*args, **kwargs):
+    raise AssertionError("enqueue must read the index only")
+
+
+def test_enqueue_skips_days_that_could_not_be_screened(tmp_path, monkeypatch):
+
+    screen = RainDayScreen(index_fp=str(tmp_path / "index.csv"))
+    monkeypatch.setattr(rain_day_screen, "_screen_day", _fake_screen_day)
+    monkeypatch.setattr(gather_all_events, "get_rain_day_screen", lambda: screen)
+    monkeypatch.setattr(gather_all_events, "DATERANGE", [DAYS[0], DAYS[-1] + timedelta(days=1)])
+    monkeypatch.setattr(gather_all_events, "CANDIDATE_SOURCE", "radar")
+    monkeypatch.setattr(RainDayScreen, "is_min_rain_day", _should_not_screen)
+
+    queue = WorkQueue(str(tmp_path / "queue.sqlite"))
+    assert gather_all_events.enqueue_candidate_days(queue) == len(DAYS) - 1
+    assert queue.lease(worker_id="test").task_id == str(DAYS[0])
+
+    # the failed day is picked up once it can be screened
+    monkeypatch.setattr(rain_day_screen, "_screen_day", _fake_screen_day_ok)
+    assert gather_all_events.enqueue_candidate_days(queue) == 1
@@ -0,0 +1,236 @@
+"""
+``src.utils.mrms.grib2`` against synthetic MRMS-like messages (no eccodes needed); the cfgrib parity
+test runs only where cfgrib is installed.
+"""
+
+import zlib
+import struct
+import pytest
+import numpy as np
+
+from datetime import datetime
+
+from src.utils.mrms import grib2
+from src.utils.mrms.grib2 import UnsupportedGrib2Error, read_mrms_grib2
+
+
+VALID_TIME = datetime(2024, 7, 20, 3, 0, 0)
+
+# MRMS-like grid: 0.01 deg, la1/lo1 at the NW corner, lons in 0-360
+LA1, LO1, DLAT, DLON = 36.4, 244.6, 0.01, 0.01
+
+
+def _sint_bytes(v: int, n: int) -> bytes:
+    """
+    Sign-magnitude, as GRIB2 stores signed integers.
+    """
+    return (abs(v) | ((1 << (8 * n - 1)) if v < 0 else 0)).to_bytes(n, "big")
+
+
+def _section(number: int, body: bytes) -> bytes:
+    return struct.pack(">IB", 5 + len(body), number) + body
+
+
+def _pack_bits(x: np.ndarray, nbits: int) -> bytes:
+    bits = ((x.astype(np.uint64)[:, None] >> np.arange(nbits - 1, -1, -1, dtype=np.uint64)) & 1).astype(np.uint8)
+    return np.packbits(bits.reshape(-1)).tobytes()
+
+
+def _png_chunk(kind: bytes, data: bytes) -> bytes:
+    return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data) & 0xFFFFFFFF)
+
+
+def _encode_png(x: np.ndarray, nbits: int, filters=(0, 1, 2)) -> bytes:
+    """
+    ``[H, W]`` integers -> PNG, as GRIB2 template 5.41 packs them (8/16-bit gray, 24-bit RGB, 32-bit RGBA);
+    row ``r`` uses ``filters[r % len(filters)]`` (0: None, 1: Sub, 2: Up).
+    """
+
+    color, depth, channels = {8: (0, 8, 1), 16: (0, 16, 1), 24: (2, 8, 3), 32: (6, 8, 4)}[nbits]
+    h, w = x.shape
+    bpp  = channels * depth // 8
+    raw  = x.astype(">u4").view(np.uint8).reshape(h, w, 4)[..., 4 - nbits // 8:].reshape(h, w * bpp)
+
+    rows, prev = [], np.zeros(w * bpp, dtype=np.uint8)
+    for r in range(h):
+        f   = filters[r % len(filters)]
+        row = raw[r]
+        if f == 1:
+            row = row - np.concatenate([np.zeros(bpp, dtype=np.uint8), row[:-bpp]])
+        elif f == 2:
+            row = row - prev
+        rows.append(bytes([f]) + row.astype(np.uint8).tobytes())
+        prev = raw[r]
+
+    ihdr = struct.pack(">IIBBBBB", w, h, depth, color, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + _png_chunk(b"IHDR", ihdr) + _png_chunk(b"IDAT", zlib.compress(b"".join(rows))) + _png_chunk(b"IEND", b"")
+
+
+def build_message(
+        packed: np.ndarray,
+        ni: int,
+        nj: int,
+        nbits: int,
+        template: int = 0,
+        ref: float = 0.0,
+        e: int = 0,
+        d: int = 0,
+        scan: int = 0x00,
+        bitmap: np.ndarray | None = None,
+    ) -> bytes:
+    """
+    One GRIB2 message (discipline 209, MRMS) on a regular lat/lon grid; ``packed`` are the integers in stream order.
+    """
+
+    s1 = _section(1, struct.pack(">HHBBB", 161, 0, 2, 1, 0) + struct.pack(">HBBBBB", *VALID_TIME.timetuple()[:6]) + bytes([0, 0]))
+
+    lat_span = int(round(DLAT * 1e6))
+    lon_span = int(round(DLON * 1e6))
+    s3_body  = (
+        bytes([0]) + struct.pack(">I", ni * nj) + bytes([0, 0]) + struct.pack(">H", 0)
+        + bytes([6]) + bytes(15)
+        + struct.pack(">II", ni, nj) + struct.pack(">II", 0, 0xFFFFFFFF)
+        + _sint_bytes(int(round(LA1 * 1e6)), 4) + _sint_bytes(int(round(LO1 * 1e6)), 4) + bytes([0x30])
+        + _sint_bytes(int(round(LA1 * 1e6)) - (nj - 1) * lat_span, 4) + _sint_bytes(int(round(LO1 * 1e6)) + (ni - 1) * lon_span, 4)
+        + struct.pack(">II", lon_span, lat_span) + bytes([scan])
+    )
+    s3 = _section(3, s3_body)
+    s4 = _section(4, struct.pack(">HH", 0, 0) + bytes(25))
+
+    n_values = ni * nj if bitmap is None else int(bitmap.sum())
+    s5 = _section(5, struct.pack(">IH", n_values, template) + struct.pack(">f", ref) + _sint_bytes(e, 2) + _sint_bytes(d, 2) + bytes([nbits, 0]))
+
+    if bitmap is None:
+        s6 = _section(6, bytes([255]))
+    else:
+        s6 = _section(6, bytes([0]) + np.packbits(bitmap.astype(np.uint8)).tobytes())
+
+    if nbits == 0:
+        data = b""
+    elif template == 0:
+        data = _pack_bits(packed, nbits)
+    else:
+        width = ni if bitmap is None else n_values
+        data  = _encode_png(packed.reshape(-1, width), nbits)
+    s7 = _section(7, data)
+
+    body  = s1 + s3 + s4 + s5 + s6 + s7 + b"7777"
+    total = 16 + len(body)
+    return b"GRIB" + bytes([0, 0, 209, 2]) + struct.pack(">Q", total) + body
+
+
+def _write(tmp_path, message: bytes) -> str:
+    fp = tmp_path / "MRMS_test.grib2"
+    fp.write_bytes(message)
+    return str(fp)
+
+
+def _expected(packed: np.ndarray, ref: float, e: int, d: int) -> np.ndarray:
+    return ((np.float64(np.float32(ref)) + packed.astype(np.float64) * 2.0 ** e) / 10.0 ** d).astype(np.float32)
+
+
+@pytest.mark.parametrize("nbits", [1, 5, 8, 12, 16, 21, 24, 32])
+def test_simple_packing(tmp_path, nbits):
+
+    ni, nj = 7, 5
+    rng    = np.random.default_rng(nbits)
+    packed = rng.integers(0, 2 ** nbits, size=ni * nj, dtype=np.uint64)
+    ref, e, d = -3.0, -2, 1
+
+    msg = read_mrms_grib2(_write(tmp_path, build_message(packed, ni, nj, nbits, ref=ref, e=e, d=d)))
+
+    assert msg.template == 0
+    assert msg.valid_time == VALID_TIME
+    assert msg.values.shape == (nj, ni)
+    np.testing.assert_array_equal(msg.values, _expected(packed, ref, e, d).reshape(nj, ni))
+    np.testing.assert_allclose(msg.lats, LA1 - DLAT * np.arange(nj), atol=1e-9)
+    np.testing.assert_allclose(msg.lons, LO1 + DLON * np.arange(ni), atol=1e-9)
+
+
+def test_constant_field(tmp_path):
+
+    msg = read_mrms_grib2(_write(tmp_path, build_message(np.zeros(12), 4, 3, 0, ref=1.5)))
+    np.testing.assert_array_equal(msg.values, np.full((3, 4), 1.5, dtype=np.float32))
+
+
+@pytest.mark.parametrize("nbits", [8, 16, 24, 32])
+def test_png_packing(tmp_path, nbits):
+
+    ni, nj = 9, 6
+    rng    = np.random.default_rng(nbits)
+    packed = rng.integers(0, 2 ** nbits, size=ni * nj, dtype=np.uint64)
+    ref, e, d = 0.0, 0, 1
+
+    msg = read_mrms_grib2(_write(tmp_path, build_message(packed, ni, nj, nbits, template=41, ref=ref, e=e, d=d)))
+
+    assert msg.template == 41
+    np.testing.assert_array_equal(msg.values, _expected(packed, ref, e, d).reshape(nj, ni))
+
+
+@pytest.mark.parametrize("nbits", [8, 16, 24, 32])
+def test_png_decoders_agree(nbits):
+
+    pytest.importorskip("PIL")
+
+    rng = np.random.default_rng(nbits)
+    x   = rng.integers(0, 2 ** nbits, size=(6, 9), dtype=np.uint64)
+    buf = _encode_png(x, nbits, filters=(1, 2, 0, 2, 1))
+
+    np.testing.assert_array_equal(grib2._decode_png_numpy(buf), x)
+    np.testing.assert_array_equal(grib2._decode_png(buf, nbits), grib2._decode_png_numpy(buf))
+
+
+@pytest.mark.parametrize("template, nbits", [(0, 12), (41, 16)])
+def test_bitmap(tmp_path, template, nbits):
+
+    ni, nj = 8, 4
+    rng    = np.random.default_rng(0)
+    bitmap = rng.random(ni * nj) < 0.6
+    packed = rng.integers(0, 2 ** nbits, size=int(bitmap.sum()), dtype=np.uint64)
+
+    msg = read_mrms_grib2(_write(tmp_path, build_message(packed, ni, nj, nbits, template=template, bitmap=bitmap)))
+
+    expected         = np.full(ni * nj, np.nan, dtype=np.float32)
+    expected[bitmap] = _expected(packed, 0.0, 0, 0)
+    np.testing.assert_array_equal(msg.values, expected.reshape(nj, ni))
+
+
+@pytest.mark.parametrize("scan", [0x00, 0x80, 0x40, 0x20, 0xE0])
+def test_scan_modes(tmp_path, scan):
+
+    ni, nj = 6, 4
+    grid   = np.arange(ni * nj, dtype=np.uint64).reshape(nj, ni)      # [j, i], as returned
+
+    # with 0x20, adjacent points in the stream are consecutive along j
+    stream = grid.T.reshape(-1) if scan & 0x20 else grid.reshape(-1)
+    msg    = read_mrms_grib2(_write(tmp_path, build_message(stream, ni, nj, 8, scan=scan)))
+
+    np.testing.assert_array_equal(msg.values, grid.astype(np.float32))
+    np.testing.assert_allclose(msg.lons, LO1 + (-1 if scan & 0x80 else 1) * DLON * np.arange(ni), atol=1e-9)
+    np.testing.assert_allclose(msg.lats, LA1 + (1 if scan & 0x40 else -1) * DLAT * np.arange(nj), atol=1e-9)
+
+
+@pytest.mark.parametrize("scan, template", [(0x10, 0), (0x00, 3)])
+def test_unsupported(tmp_path, scan, template):
+
+    message = build_message(np.zeros(4, dtype=np.uint64), 2, 2, 8, scan=scan, template=0)
+    if template != 0:
+        # patch the data representation template number in place
+        s5      = message.index(struct.pack(">IB", 21, 5))
+        message = message[:s5 + 9] + struct.pack(">H", template) + message[s5 + 11:]
+
+    with pytest.raises(UnsupportedGrib2Error):
+        read_mrms_grib2(_write(tmp_path, message))
+
+
+@pytest.mark.parametrize("template, nbits", [(0, 12), (41, 16)])
+def test_cfgrib_parity(tmp_path, template, nbits):
+
+    pytest.importorskip("cfgrib")
+
+    ni, nj = 10, 7
+    rng    = np.random.default_rng(1)
+    packed = rng.integers(0, 2 ** nbits, size=ni * nj, dtype=np.uint64)
+
+    result = grib2.check_parity(_write(tmp_path, build_message(packed, ni, nj, nbits, template=template, ref=-1.0, e=-3, d=0)))
+    assert result["time"] and result["lats"] and result["lons"] and result["values"], result
@@ -0,0 +1,46 @@
+"""
+``RainDayScreen`` with a fake per-day screen (no S3): failed days stay out of the index and are retried.
+"""
+
+
+from datetime import datetime, timedelta
+
+from src.mrms_qpe import rain_day_screen
+from src.mrms_qpe.rain_day_screen import RainDayScreen
+
+
+DAYS    = [datetime(2023, 7, 20) + timedelta(days=i) for i in range(4)]
+FAILING = DAYS[1]
+WET     = DAYS[2]
+
+
+def _fake_screen_day(day, bounds, wet_thresh):
+    if day == FAILING:
+        raise TimeoutError("S3 timeout")
+    max_in = 0.8 if day == WET else 0.0
+    return {"day": day.strftime("%Y-%m-%d"), "available": True, "max_in": max_in, "mean_in": max_in / 2, "wet_frac": float(max_in > 0)}
+
+
+def _fake_screen_day_ok(day, bounds, wet_thresh):
+    return {"day": day.strftime("%Y-%m-%d"), "available": True, "max_in": 0.5, "mean_in": 0.1, "wet_frac": 0.5}
+
+
+def test_failed_days_are_not_indexed(tmp_path, monkeypatch):
+
+    monkeypatch.setattr(rain_day_screen, "_screen_day", _fake_screen_day)
+    screen = RainDayScreen(index_fp=str(tmp_path / "index.csv"))
+    index  = screen.build(DAYS, max_workers=2)
+
+    assert len(index) == 3
+    assert screen.get_unscreened(DAYS) == [FAILING]
+    assert screen.days_exceeding(0.25) == [WET]
+
+    # persisted without the failed day; the next run screens only that day
+    monkeypatch.setattr(rain_day_screen, "_screen_day", _fake_screen_day_ok)
+    screen = RainDayScreen(index_fp=str(tmp_path / "index.csv"))
+    assert screen.get_unscreened(DAYS) == [FAILING]
+
+    index = screen.build(DAYS, max_workers=2)
+    assert screen.get_unscreened(DAYS) == []
+    assert screen.days_exceeding(0.25) == [FAILING, WET]
+    assert index.loc[DAYS[0], "max_in"] == 0.0